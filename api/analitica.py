@@ -0,0 +1,173 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Compra, MarcaResumen, ProductoComprado, VentaDiaria, VentaDiariaCategoria, VentaDiariaProducto,
+)
+
+
+MARCA_VENTAS = 'ventas'
+
+INGRESOS_LINEA = ExpressionWrapper(
+    F('precio') * F('cantidad'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+# (modelo, campos que identifican la fila, agrupación sobre ProductoComprado)
+RESUMENES_LINEAS = (
+    (VentaDiariaProducto, ('fecha', 'producto_id'), 'producto_id'),
+    (VentaDiariaCategoria, ('fecha', 'categoria_id'), 'producto__categoria_id'),
+)
+
+
+def _agregados_compras(filtro):
+    return (
+        Compra.objects.filter(**filtro)
+        .annotate(dia=TruncDate('fecha'))
+        .values('dia')
+        .annotate(pedidos=Count('id'))
+        .order_by()
+    )
+
+
+def _agregados_lineas(filtro, agrupacion=None):
+    campos = ['dia'] + ([agrupacion] if agrupacion else [])
+    return (
+        ProductoComprado.objects.filter(**{f'compra__{k}': v for k, v in filtro.items()})
+        .annotate(dia=TruncDate('compra__fecha'))
+        .values(*campos)
+        .annotate(unidades=Sum('cantidad'), ingresos=Sum(INGRESOS_LINEA))
+        .order_by()
+    )
+
+
+# Suma las filas nuevas a las existentes y las guarda con un solo upsert
+def _acumular(modelo, claves, filas):
+    if not filas:
+        return
+    fechas = {fila['fecha'] for fila in filas}
+    existentes = {
+        tuple(fila[clave] for clave in claves): fila
+        for fila in modelo.objects.filter(fecha__in=fechas).values(*claves, *(filas[0].keys() - set(claves)))
+    }
+
+    objetos = []
+    for fila in filas:
+        previo = existentes.get(tuple(fila[clave] for clave in claves), {})
+        valores = {
+            campo: (valor or 0) + (previo.get(campo) or 0)
+            for campo, valor in fila.items() if campo not in claves
+        }
+        objetos.append(modelo(**{clave: fila[clave] for clave in claves}, **valores))
+
+    metricas = [campo for campo in filas[0] if campo not in claves]
+    modelo.objects.bulk_create(
+        objetos,
+        update_conflicts=True,
+        unique_fields=[clave.removesuffix('_id') for clave in claves],
+        update_fields=metricas,
+    )
+
+
+def _procesar_rango(filtro):
+    # Totales por día
+    dias = {
+        fila['dia']: {'fecha': fila['dia'], 'pedidos': fila['pedidos'], 'unidades': 0, 'ingresos': Decimal('0')}
+        for fila in _agregados_compras(filtro)
+    }
+    for fila in _agregados_lineas(filtro):
+        dia = dias.setdefault(fila['dia'], {'fecha': fila['dia'], 'pedidos': 0, 'unidades': 0, 'ingresos': Decimal('0')})
+        dia['unidades'] = fila['unidades']
+        dia['ingresos'] = fila['ingresos']
+    _acumular(VentaDiaria, ('fecha',), list(dias.values()))
+
+    # Totales por día y producto / categoría
+    for modelo, claves, agrupacion in RESUMENES_LINEAS:
+        filas = [
+            {'fecha': fila['dia'], claves[1]: fila[agrupacion], 'unidades': fila['unidades'], 'ingresos': fila['ingresos']}
+            for fila in _agregados_lineas(filtro, agrupacion)
+        ]
+        _acumular(modelo, claves, filas)
+
+    return sum(dia['pedidos'] for dia in dias.values())
+
+
+# Procesa solo las compras posteriores a la marca de agua. Se dejan fuera las
+# de los últimos RESUMENES_MARGEN_SEGUNDOS para no saltarse compras cuya
+# transacción todavía no se había confirmado con un id menor.
+def actualizar_resumenes(lote=None):
+    with transaction.atomic():
+        marca, _ = MarcaResumen.objects.select_for_update().get_or_create(nombre=MARCA_VENTAS)
+
+        limite = timezone.now() - timedelta(seconds=settings.RESUMENES_MARGEN_SEGUNDOS)
+        hasta_id = Compra.objects.filter(
+            id__gt=marca.ultima_compra_id, fecha__lte=limite
+        ).aggregate(ultimo=Max('id'))['ultimo']
+        if hasta_id is None:
+            return 0
+        if lote:
+            hasta_id = min(hasta_id, marca.ultima_compra_id + lote)
+
+        procesadas = _procesar_rango({'id__gt': marca.ultima_compra_id, 'id__lte': hasta_id})
+
+        marca.ultima_compra_id = hasta_id
+        marca.save(update_fields=['ultima_compra_id', 'actualizado'])
+    return procesadas
+
+
+# Borra los resúmenes y los vuelve a calcular desde cero
+def reconstruir_resumenes():
+    with transaction.atomic():
+        marca, _ = MarcaResumen.objects.select_for_update().get_or_create(nombre=MARCA_VENTAS)
+        for modelo in (VentaDiaria, VentaDiariaProducto, VentaDiariaCategoria):
+            modelo.objects.all().delete()
+        marca.ultima_compra_id = 0
+        marca.save(update_fields=['ultima_compra_id', 'actualizado'])
+    return actualizar_resumenes()
+
+
+# Compara los resúmenes con las tablas de compras hasta la marca de agua.
+# Devuelve la lista de diferencias (vacía si todo coincide).
+def verificar_resumenes():
+    marca = MarcaResumen.objects.filter(nombre=MARCA_VENTAS).first()
+    filtro = {'id__lte': marca.ultima_compra_id if marca else 0}
+    diferencias = []
+
+    esperado = {fila['dia']: {'pedidos': fila['pedidos'], 'unidades': 0, 'ingresos': Decimal('0')} for fila in _agregados_compras(filtro)}
+    for fila in _agregados_lineas(filtro):
+        dia = esperado.setdefault(fila['dia'], {'pedidos': 0, 'unidades': 0, 'ingresos': Decimal('0')})
+        dia['unidades'] = fila['unidades']
+        dia['ingresos'] = fila['ingresos']
+    guardado = {
+        fila['fecha']: {'pedidos': fila['pedidos'], 'unidades': fila['unidades'], 'ingresos': fila['ingresos']}
+        for fila in VentaDiaria.objects.values('fecha', 'pedidos', 'unidades', 'ingresos')
+    }
+    diferencias += _comparar('ventas diarias', esperado, guardado)
+
+    for modelo, claves, agrupacion in RESUMENES_LINEAS:
+        esperado = {
+            (fila['dia'], fila[agrupacion]): {'unidades': fila['unidades'], 'ingresos': fila['ingresos']}
+            for fila in _agregados_lineas(filtro, agrupacion)
+        }
+        guardado = {
+            tuple(fila[clave] for clave in claves): {'unidades': fila['unidades'], 'ingresos': fila['ingresos']}
+            for fila in modelo.objects.values(*claves, 'unidades', 'ingresos')
+        }
+        diferencias += _comparar(modelo._meta.verbose_name, esperado, guardado)
+
+    return diferencias
+
+
+def _comparar(nombre, esperado, guardado):
+    diferencias = []
+    for clave in esperado.keys() | guardado.keys():
+        a, b = esperado.get(clave), guardado.get(clave)
+        if a is None or b is None or any(Decimal(a[campo] or 0) != Decimal(b[campo] or 0) for campo in a):
+            diferencias.append(f'{nombre} {clave}: esperado {a}, guardado {b}')
+    return diferencias
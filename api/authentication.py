@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+
+
+# Datos del usuario que viajan en el token; con ellos la mayoría de las vistas
+# no necesitan consultar la tabla de usuarios
+CLAIMS_USUARIO = ('rol', 'username', 'is_staff')
+
+
+def agregar_claims(token, usuario):
+    for claim in CLAIMS_USUARIO:
+        token[claim] = getattr(usuario, claim)
+    return token
+
+
+# CACHÉ LOCAL DE USUARIOS #
+
+# LRU por proceso con expiración: solo se usa cuando una vista necesita un
+# dato que no está en el token (p. ej. email). Las instancias son de solo lectura.
+_usuarios = OrderedDict()
+_lock = threading.Lock()
+
+
+def usuario_por_id(usuario_id):
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _usuarios.get(usuario_id)
+        if entrada is not None and entrada[0] > ahora:
+            _usuarios.move_to_end(usuario_id)
+            return entrada[1]
+
+    usuario = get_user_model().objects.filter(pk=usuario_id).first()
+    if usuario is None:
+        raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+
+    with _lock:
+        _usuarios[usuario_id] = (ahora + settings.USUARIOS_CACHE_TTL, usuario)
+        _usuarios.move_to_end(usuario_id)
+        while len(_usuarios) > settings.USUARIOS_CACHE_TAMANO:
+            _usuarios.popitem(last=False)
+    return usuario
+
+
+def olvidar_usuario(usuario_id):
+    with _lock:
+        _usuarios.pop(usuario_id, None)
+
+
+# Usuario construido a partir de los claims del token (sin consulta a la base
+# de datos). Los atributos que no vienen en el token, o los tokens emitidos
+# antes de agregar los claims, se resuelven con la fila de Usuario en caché.
+class UsuarioToken(TokenUser):
+    @property
+    def usuario(self):
+        return usuario_por_id(self.id)
+
+    def _claim(self, nombre):
+        if nombre in self.token:
+            return self.token[nombre]
+        return getattr(self.usuario, nombre)
+
+    @property
+    def username(self):
+        return self._claim('username')
+
+    @property
+    def is_staff(self):
+        return self._claim('is_staff')
+
+    def __getattr__(self, attr):
+        if attr.startswith('_') or attr == 'token':
+            raise AttributeError(attr)
+        return self._claim(attr)
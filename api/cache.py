@@ -0,0 +1,228 @@
+import gzip
+import hashlib
+import re
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from .db_routers import lectura_en_primario, replicas
+
+
+VERSION_CATALOGO_KEY = 'catalogo:version'
+CAMBIO_RECIENTE_KEY = 'catalogo:cambio_reciente'
+HITS_KEY = 'catalogo:hits'
+MISSES_KEY = 'catalogo:misses'
+
+_acepta_gzip = re.compile(r'\bgzip\b')
+
+
+# Con LocMem (o Dummy) cada worker tiene su propia caché: la versión del
+# catálogo y los demás estados compartidos solo los ve el proceso que los
+# escribió. Ver api/checks.py.
+def cache_compartida():
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+# VERSIÓN DEL CATÁLOGO #
+
+# Las respuestas cacheadas se guardan bajo la versión actual del catálogo;
+# al cambiar un producto o una categoría basta con subir la versión para que
+# todas las entradas anteriores dejen de usarse (y expiren solas).
+def version_catalogo():
+    version = cache.get(VERSION_CATALOGO_KEY)
+    if version is None:
+        # Se inicializa con el reloj para no reutilizar versiones si la llave se pierde
+        cache.add(VERSION_CATALOGO_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_CATALOGO_KEY, 0)
+    return version
+
+
+def incrementar_version_catalogo():
+    # Durante REPLICA_FIJAR_SEGUNDOS las réplicas pueden no tener el cambio
+    # todavía: lo que se guarde bajo la versión nueva se lee del primario
+    if replicas():
+        cache.set(CAMBIO_RECIENTE_KEY, True, settings.REPLICA_FIJAR_SEGUNDOS)
+    try:
+        return cache.incr(VERSION_CATALOGO_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.add(VERSION_CATALOGO_KEY, version, None)
+        return version
+
+
+def _contar(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def estadisticas_cache():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': version_catalogo(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+# CACHÉ DE RESPUESTAS #
+
+# Mixin para vistas de solo lectura del catálogo: guarda los bytes ya
+# renderizados (y comprimidos con gzip) de las respuestas GET exitosas.
+class CatalogoCacheMixin:
+    # Acciones del ViewSet que se cachean (None = todos los GET de la vista)
+    cache_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self._es_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self._cache_key(request)
+        entrada = cache.get(key)
+        if entrada is not None:
+            _contar(HITS_KEY)
+            return self._respuesta_desde_cache(request, entrada, 'HIT')
+
+        _contar(MISSES_KEY)
+        with lectura_en_primario() if cache.get(CAMBIO_RECIENTE_KEY) else nullcontext():
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+
+        response.render()
+        entrada = {
+            'content': response.content,
+            'gzip': gzip.compress(response.content),
+            'content_type': response['Content-Type'],
+            # ETag y Last-Modified de CondicionalMixin: siguen valiendo mientras no cambie la versión
+            'validadores': {
+                header: response[header] for header in ('ETag', 'Last-Modified', 'Cache-Control') if response.has_header(header)
+            },
+        }
+        cache.set(key, entrada, settings.CATALOGO_CACHE_TIMEOUT)
+        return self._respuesta_desde_cache(request, entrada, 'MISS')
+
+    def _es_cacheable(self, request):
+        if request.method != 'GET':
+            return False
+        if self.cache_actions is None:
+            return True
+        action_map = getattr(self, 'action_map', None) or {}
+        return action_map.get('get') in self.cache_actions
+
+    def _cache_key(self, request):
+        # La llave depende del esquema y el host (los enlaces 'next' y las URLs de
+        # imágenes son absolutos), la ruta, los parámetros (ordenados) y el tipo
+        # de contenido pedido
+        query = self._parametros_cache(request)
+        base = f"{request.scheme}://{request.get_host()}{request.path}|{query}|{request.META.get('HTTP_ACCEPT', '')}"
+        digest = hashlib.sha1(base.encode('utf-8')).hexdigest()
+        return f'catalogo:{version_catalogo()}:{digest}'
+
+    def _parametros_cache(self, request):
+        return sorted(request.GET.lists())
+
+    def _respuesta_desde_cache(self, request, entrada, estado):
+        validadores = entrada.get('validadores', {})
+        if 'ETag' in validadores:
+            no_modificado = get_conditional_response(
+                request, etag=validadores['ETag'], last_modified=parse_http_date_safe(validadores.get('Last-Modified', '')),
+            )
+            if no_modificado is not None:
+                return self._con_headers(no_modificado, validadores, estado)
+
+        if _acepta_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = HttpResponse(entrada['gzip'], content_type=entrada['content_type'])
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(entrada['content'], content_type=entrada['content_type'])
+        return self._con_headers(response, validadores, estado)
+
+    def _con_headers(self, response, validadores, estado):
+        for header, valor in validadores.items():
+            response[header] = valor
+        response['X-Cache'] = estado
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+
+# VALIDACIÓN CONDICIONAL #
+
+# Validadores baratos de un listado: la última modificación y el número de
+# filas (un borrado no cambia MAX(actualizado) pero sí el conteo)
+def validadores_lista(queryset):
+    datos = queryset.order_by().aggregate(ultimo=Max('actualizado'), total=Count('pk'))
+    return datos['ultimo'], datos['total']
+
+
+# ETag débil: depende de la ruta, los parámetros, el tipo de contenido pedido
+# (la representación cambia con ellos) y de los validadores de los datos
+def etag_para(request, *validadores):
+    query = sorted(request.GET.lists())
+    base = f"{request.path}|{query}|{request.META.get('HTTP_ACCEPT', '')}|{validadores}"
+    return f'W/"{hashlib.sha1(base.encode("utf-8")).hexdigest()}"'
+
+
+def marcar_validadores(response, etag, ultimo):
+    response['ETag'] = etag
+    if ultimo is not None:
+        response['Last-Modified'] = http_date(ultimo.timestamp())
+    # El cliente puede guardar la respuesta pero debe revalidarla siempre
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
+
+
+# 304 (o 412) si el cliente ya tiene esta versión; None si hay que generar la respuesta
+def respuesta_no_modificada(request, etag, ultimo):
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(ultimo.timestamp()) if ultimo is not None else None,
+    )
+    if response is None:
+        return None
+    return marcar_validadores(response, etag, ultimo)
+
+
+# Mixin para ViewSets de modelos con campo `actualizado`: responde
+# If-None-Match / If-Modified-Since con 304 antes de serializar. Las
+# consultas corren después de initial(), así que usan la misma base (réplica
+# o primario) que la respuesta completa.
+class CondicionalMixin:
+    def list(self, request, *args, **kwargs):
+        ultimo, total = validadores_lista(self.filter_queryset(self.get_queryset()))
+        etag = etag_para(request, ultimo, total)
+        response = respuesta_no_modificada(request, etag, ultimo)
+        if response is not None:
+            return response
+        return marcar_validadores(super().list(request, *args, **kwargs), etag, ultimo)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        try:
+            ultimo = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list('actualizado', flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            ultimo = None
+        if ultimo is None:
+            # get_object() responde el 404
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = etag_para(request, ultimo)
+        response = respuesta_no_modificada(request, etag, ultimo)
+        if response is not None:
+            return response
+        return marcar_validadores(super().retrieve(request, *args, **kwargs), etag, ultimo)
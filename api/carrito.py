@@ -0,0 +1,207 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, PositiveIntegerField, Sum, Value, When, Window
+
+from .models import Carrito, Producto, ProductoEnCarrito
+
+
+AGREGAR = 'agregar'
+ACTUALIZAR = 'actualizar'
+ELIMINAR = 'eliminar'
+ACCIONES = (AGREGAR, ACTUALIZAR, ELIMINAR)
+
+
+# precio * cantidad calculado en la base de datos
+TOTAL_LINEA = ExpressionWrapper(
+    F('producto__precio') * F('cantidad'),
+    output_field=DecimalField(max_digits=20, decimal_places=3),
+)
+
+
+class ProductosNoEncontrados(Exception):
+    def __init__(self, ids):
+        super().__init__('Producto no encontrado')
+        self.ids = sorted(ids)
+
+
+# Reduce la lista de operaciones a una sola por producto, respetando el orden:
+# agregar suma, actualizar fija la cantidad y eliminar quita la línea.
+def _consolidar(operaciones):
+    estado = {}
+    for operacion in operaciones:
+        producto_id = operacion['producto']
+        accion = operacion['accion']
+        cantidad = operacion.get('cantidad')
+        previo = estado.get(producto_id)
+
+        if accion == AGREGAR and previo is not None:
+            if previo[0] == ELIMINAR:
+                estado[producto_id] = (ACTUALIZAR, cantidad)
+            else:
+                estado[producto_id] = (previo[0], previo[1] + cantidad)
+        else:
+            estado[producto_id] = (accion, cantidad)
+    return estado
+
+
+# Aplica un lote de operaciones sobre el carrito con un número fijo de
+# consultas: un DELETE para las eliminaciones, un upsert para las cantidades
+# fijas y, para los incrementos, un INSERT que ignora conflictos seguido de un
+# único UPDATE con F() (el incremento es atómico aunque haya peticiones simultáneas).
+def aplicar_operaciones(carrito, operaciones):
+    estado = _consolidar(operaciones)
+
+    requeridos = {producto_id for producto_id, (accion, _) in estado.items() if accion != ELIMINAR}
+    if requeridos:
+        existentes = set(Producto.objects.filter(id__in=requeridos).values_list('id', flat=True))
+        if existentes != requeridos:
+            raise ProductosNoEncontrados(requeridos - existentes)
+
+    eliminar = [producto_id for producto_id, (accion, _) in estado.items() if accion == ELIMINAR]
+    actualizar = {producto_id: cantidad for producto_id, (accion, cantidad) in estado.items() if accion == ACTUALIZAR}
+    agregar = {producto_id: cantidad for producto_id, (accion, cantidad) in estado.items() if accion == AGREGAR}
+
+    with transaction.atomic():
+        if eliminar:
+            ProductoEnCarrito.objects.filter(carrito=carrito, producto_id__in=eliminar).delete()
+
+        if actualizar:
+            ProductoEnCarrito.objects.bulk_create(
+                [
+                    ProductoEnCarrito(carrito=carrito, producto_id=producto_id, cantidad=cantidad)
+                    for producto_id, cantidad in actualizar.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['carrito', 'producto'],
+                update_fields=['cantidad'],
+            )
+
+        if agregar:
+            ProductoEnCarrito.objects.bulk_create(
+                [
+                    ProductoEnCarrito(carrito=carrito, producto_id=producto_id, cantidad=0)
+                    for producto_id in agregar
+                ],
+                ignore_conflicts=True,
+            )
+            ProductoEnCarrito.objects.filter(carrito=carrito, producto_id__in=agregar).update(
+                cantidad=F('cantidad') + Case(
+                    *[When(producto_id=producto_id, then=Value(cantidad)) for producto_id, cantidad in agregar.items()],
+                    output_field=PositiveIntegerField(),
+                )
+            )
+
+        programar_actualizacion_snapshot(carrito.usuario_id)
+
+    return len(estado)
+
+
+# Líneas del carrito del usuario con el total por línea y el total general
+# (función de ventana), todo en una sola consulta con JOIN a Producto.
+def lineas_carrito(usuario_id):
+    return (
+        ProductoEnCarrito.objects.filter(carrito__usuario_id=usuario_id)
+        .annotate(total_precio=TOTAL_LINEA, total_carrito=Window(Sum(TOTAL_LINEA)))
+        .order_by('id')
+        .values('producto_id', 'producto__nombre', 'producto__precio', 'cantidad', 'total_precio', 'total_carrito')
+    )
+
+
+# SNAPSHOT DEL CARRITO EN CACHÉ #
+
+# ver_carrito se consulta constantemente desde el frontend; se sirve desde una
+# copia en caché que cada vista que modifica el carrito vuelve a escribir.
+# Requiere una caché compartida: con LocMem los demás workers no ven la
+# copia nueva (ver api/checks.py).
+#
+# Como el catálogo, cada carrito tiene una versión y el snapshot se guarda
+# bajo la versión vigente. Cada escritura confirmada sube la versión antes de
+# leer la base: un snapshot leído antes (por otra escritura o por una lectura
+# lenta) queda bajo una versión vieja y nadie lo vuelve a leer, aunque se
+# guarde después.
+def version_key(usuario_id):
+    return f'carrito:{usuario_id}:version'
+
+
+def version_carrito(usuario_id):
+    key = version_key(usuario_id)
+    version = cache.get(key)
+    if version is None:
+        # Se inicializa con el reloj para no reutilizar versiones si la llave se pierde
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def subir_version_carrito(usuario_id):
+    key = version_key(usuario_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+        return cache.incr(key)
+
+
+def snapshot_key(usuario_id, version=None):
+    if version is None:
+        version = version_carrito(usuario_id)
+    return f'carrito:{usuario_id}:{version}'
+
+
+# Llaves vigentes de varios carritos (los que no tienen versión no tienen snapshot)
+def snapshot_keys(usuario_ids):
+    versiones = cache.get_many([version_key(usuario_id) for usuario_id in usuario_ids])
+    return {
+        snapshot_key(usuario_id, versiones[version_key(usuario_id)]): usuario_id
+        for usuario_id in usuario_ids if version_key(usuario_id) in versiones
+    }
+
+
+def snapshot_desde_bd(usuario_id):
+    lineas = list(lineas_carrito(usuario_id))
+
+    # Sin líneas hay que distinguir un carrito vacío de uno que no existe
+    if not lineas and not Carrito.objects.filter(usuario_id=usuario_id).exists():
+        return {'existe': False}
+
+    productos = [
+        {
+            'id': linea['producto_id'],
+            'producto': linea['producto__nombre'],
+            'precio': linea['producto__precio'],
+            'cantidad': linea['cantidad'],
+            'total_precio': linea['total_precio'],
+        }
+        for linea in lineas
+    ]
+    total = lineas[0]['total_carrito'] if lineas else 0
+    return {'existe': True, 'productos': productos, 'total': total}
+
+
+def snapshot_carrito(usuario_id):
+    key = snapshot_key(usuario_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = snapshot_desde_bd(usuario_id)
+        cache.add(key, snapshot, settings.CARRITO_CACHE_TIMEOUT)
+    return snapshot
+
+
+def actualizar_snapshot_carrito(usuario_id):
+    version = subir_version_carrito(usuario_id)
+    snapshot = snapshot_desde_bd(usuario_id)
+    cache.set(snapshot_key(usuario_id, version), snapshot, settings.CARRITO_CACHE_TIMEOUT)
+    return snapshot
+
+
+# Reescribe el snapshot cuando se confirme la transacción en curso (o de inmediato si no hay)
+def programar_actualizacion_snapshot(usuario_id):
+    transaction.on_commit(lambda: actualizar_snapshot_carrito(usuario_id))
+
+
+def invalidar_snapshots(usuario_ids):
+    for usuario_id in set(usuario_ids):
+        subir_version_carrito(usuario_id)
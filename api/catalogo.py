@@ -0,0 +1,167 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.utils.text import slugify
+
+from .cache import incrementar_version_catalogo
+from .carrito import invalidar_snapshots
+from .models import Categoria, Producto, ProductoEnCarrito
+
+
+# Columnas de importación/exportación del catálogo
+CAMPOS = ['slug', 'nombre', 'descripcion', 'precio', 'stock', 'categoria', 'imagen']
+FORMATOS = ('csv', 'jsonl')
+
+# Tope de PositiveIntegerField en todas las bases soportadas
+STOCK_MAXIMO = 2147483647
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+# LECTURA #
+
+# Lee el archivo fila por fila (nunca lo carga completo) y devuelve (número de línea, fila)
+def leer_filas(archivo, formato):
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+    else:
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError as e:
+                yield numero, FilaInvalida(f'JSON inválido: {e}')
+                continue
+            yield numero, fila
+
+
+def validar_fila(fila, categorias):
+    if isinstance(fila, FilaInvalida):
+        raise fila
+    if not isinstance(fila, dict):
+        raise FilaInvalida('La fila debe ser un objeto')
+
+    nombre = (fila.get('nombre') or '').strip()
+    if not nombre:
+        raise FilaInvalida('El nombre es requerido')
+    if len(nombre) > 255:
+        raise FilaInvalida('El nombre supera los 255 caracteres')
+
+    try:
+        precio = Decimal(str(fila.get('precio', '')).strip())
+    except InvalidOperation:
+        raise FilaInvalida(f"Precio inválido: {fila.get('precio')!r}")
+    if not precio.is_finite() or precio < 0 or precio >= Decimal('10000000'):
+        raise FilaInvalida(f'Precio fuera de rango: {precio}')
+
+    try:
+        stock = int(str(fila.get('stock', '')).strip())
+    except ValueError:
+        raise FilaInvalida(f"Stock inválido: {fila.get('stock')!r}")
+    if stock < 0:
+        raise FilaInvalida('El stock no puede ser negativo')
+    if stock > STOCK_MAXIMO:
+        raise FilaInvalida(f'El stock supera el máximo ({STOCK_MAXIMO})')
+
+    categoria = (fila.get('categoria') or '').strip()
+    if categoria not in categorias:
+        raise FilaInvalida(f'Categoría desconocida: {categoria!r}')
+
+    # El slug identifica al producto en el upsert: uno vacío (un nombre solo
+    # con símbolos) pisaría siempre al mismo, y uno largo haría fallar el lote
+    slug = (fila.get('slug') or '').strip() or slugify(nombre)
+    if not slug:
+        raise FilaInvalida('No se pudo generar un slug a partir del nombre; indique la columna slug')
+    try:
+        Producto._meta.get_field('slug').run_validators(slug)
+    except ValidationError as e:
+        raise FilaInvalida(f"Slug inválido {slug!r}: {' '.join(e.messages)}")
+
+    producto = Producto(
+        slug=slug,
+        nombre=nombre,
+        descripcion=fila.get('descripcion') or '',
+        precio=precio.quantize(Decimal('0.001')),
+        stock=stock,
+        categoria_id=categorias[categoria],
+    )
+    if fila.get('imagen'):
+        producto.imagen = fila['imagen']
+    return producto
+
+
+# ESCRITURA #
+
+# Inserta o actualiza un lote de productos (identificados por slug) con un solo upsert
+def guardar_lote(productos, actualizar_imagen=False):
+    # Si un slug se repite dentro del lote gana la última fila
+    por_slug = {producto.slug: producto for producto in productos}
+    campos = ['nombre', 'descripcion', 'precio', 'stock', 'categoria', 'actualizado']
+    if actualizar_imagen:
+        campos.append('imagen')
+
+    Producto.objects.bulk_create(
+        list(por_slug.values()),
+        update_conflicts=True,
+        unique_fields=['slug'],
+        update_fields=campos,
+    )
+
+    # bulk_create no dispara señales: se invalidan a mano los carritos con esos productos
+    usuario_ids = ProductoEnCarrito.objects.filter(producto__slug__in=por_slug).values_list(
+        'carrito__usuario_id', flat=True
+    )
+    invalidar_snapshots(list(usuario_ids))
+    return len(por_slug)
+
+
+def mapa_categorias():
+    return dict(Categoria.objects.exclude(slug=None).values_list('slug', 'id'))
+
+
+def finalizar_importacion():
+    incrementar_version_catalogo()
+
+
+# EXPORTACIÓN #
+
+def filas_exportacion(chunk_size=2000):
+    productos = (
+        Producto.objects.order_by('id')
+        .values('slug', 'nombre', 'descripcion', 'precio', 'stock', 'categoria__slug', 'imagen')
+        .iterator(chunk_size=chunk_size)
+    )
+    for producto in productos:
+        yield {
+            'slug': producto['slug'],
+            'nombre': producto['nombre'],
+            'descripcion': producto['descripcion'],
+            'precio': str(producto['precio']),
+            'stock': producto['stock'],
+            'categoria': producto['categoria__slug'],
+            'imagen': producto['imagen'],
+        }
+
+
+class _Eco:
+    # Pseudo-archivo para que csv.writer devuelva cada línea en vez de guardarla
+    def write(self, valor):
+        return valor
+
+
+def lineas_exportacion(formato, chunk_size=2000):
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(CAMPOS)
+        for fila in filas_exportacion(chunk_size):
+            yield escritor.writerow([fila[campo] for campo in CAMPOS])
+    else:
+        for fila in filas_exportacion(chunk_size):
+            yield json.dumps(fila, ensure_ascii=False) + '\n'
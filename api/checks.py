@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import cache_compartida
+
+
+# Lo que deja de funcionar entre workers si la caché no es compartida
+USOS_CACHE_COMPARTIDA = [
+    'la versión del catálogo (las demás copias sirven datos viejos hasta CATALOGO_CACHE_TIMEOUT)',
+    'los snapshots del carrito (los demás workers muestran carritos viejos hasta CARRITO_CACHE_TIMEOUT)',
+    'el fijado al primario tras una escritura (los demás workers leen de una réplica atrasada)',
+    'los límites de login y registro (cada worker tiene su propio cupo)',
+    'las ranuras de hash de contraseñas (HASH_CONCURRENCIA pasa a ser por worker)',
+]
+
+
+@register(Tags.caches)
+def verificar_cache_compartida(app_configs, **kwargs):
+    if settings.DEBUG or cache_compartida():
+        return []
+    return [Warning(
+        'La caché por defecto es local a cada proceso.',
+        hint=(
+            'En producción configure CACHE_BACKEND con Redis o Memcached; sin ella no se comparten '
+            + '; '.join(USOS_CACHE_COMPARTIDA) + '.'
+        ),
+        id='api.W001',
+    )]
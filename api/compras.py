@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, PositiveIntegerField, Subquery, Sum, When
+from django.db.models.functions import Now
+
+from .cache import incrementar_version_catalogo
+from .carrito import programar_actualizacion_snapshot
+from .models import Carrito, Compra, Producto, ProductoComprado, ProductoEnCarrito
+from .tareas import TAREA_RESUMENES, encolar
+
+
+class CarritoVacio(Exception):
+    pass
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, productos):
+        super().__init__('Stock insuficiente')
+        self.productos = productos
+
+
+# Convierte el carrito en una Compra dentro de una sola transacción.
+# El número de consultas no depende de la cantidad de productos del carrito:
+# los productos se bloquean en orden de id (evita deadlocks entre compras
+# simultáneas), el stock se descuenta con un único UPDATE y el total se
+# calcula en la base de datos. El carrito se bloquea antes de leer sus
+# líneas: dos compras simultáneas del mismo carrito (doble clic, reintento sin
+# Idempotency-Key) se ejecutan una tras otra y la segunda lo encuentra vacío.
+def registrar_compra_carrito(carrito):
+    with transaction.atomic():
+        carrito = Carrito.objects.select_for_update().get(pk=carrito.pk)
+        lineas = dict(
+            ProductoEnCarrito.objects.filter(carrito=carrito).values_list('producto_id', 'cantidad')
+        )
+        if not lineas:
+            raise CarritoVacio()
+
+        productos = list(
+            Producto.objects.select_for_update()
+            .filter(id__in=lineas)
+            .order_by('id')
+            .values('id', 'nombre', 'precio', 'stock')
+        )
+
+        # Con las filas bloqueadas, el stock leído no puede cambiar hasta el commit
+        disponibles = {producto['id']: producto for producto in productos}
+        faltantes = []
+        for producto_id, cantidad in lineas.items():
+            producto = disponibles.get(producto_id)
+            stock = producto['stock'] if producto else 0
+            if stock < cantidad:
+                faltantes.append({
+                    'id': producto_id,
+                    'nombre': producto['nombre'] if producto else None,
+                    'disponible': stock,
+                    'solicitado': cantidad,
+                })
+        if faltantes:
+            raise StockInsuficiente(faltantes)
+
+        Producto.objects.filter(id__in=lineas).update(
+            stock=Case(
+                *[When(id=producto_id, then=F('stock') - cantidad) for producto_id, cantidad in lineas.items()],
+                output_field=PositiveIntegerField(),
+            ),
+            actualizado=Now(),
+        )
+
+        compra = Compra.objects.create(cliente_id=carrito.usuario_id)
+        ProductoComprado.objects.bulk_create([
+            ProductoComprado(
+                compra=compra,
+                producto_id=producto['id'],
+                nombre=producto['nombre'],
+                precio=producto['precio'],
+                cantidad=lineas[producto['id']],
+            )
+            for producto in productos
+        ])
+
+        total = (
+            ProductoComprado.objects.filter(compra=OuterRef('pk'))
+            .values('compra')
+            .annotate(total=Sum(F('precio') * F('cantidad')))
+            .values('total')
+        )
+        Compra.objects.filter(pk=compra.pk).update(total=Subquery(total))
+        compra.refresh_from_db(fields=['total'])
+
+        ProductoEnCarrito.objects.filter(carrito=carrito).delete()
+        programar_actualizacion_snapshot(carrito.usuario_id)
+
+        # Los resúmenes de ventas se actualizan en el worker; se espera el margen
+        # con el que actualizar_resumenes deja fuera las compras recientes
+        encolar(TAREA_RESUMENES, retraso=settings.RESUMENES_MARGEN_SEGUNDOS)
+
+        # El stock cambió: las respuestas cacheadas del catálogo ya no sirven
+        transaction.on_commit(incrementar_version_catalogo)
+
+    return compra
@@ -0,0 +1,119 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Solo las vistas que lo piden explícitamente leen de las réplicas
+_leer_de_replica = ContextVar('leer_de_replica', default=False)
+# ... salvo dentro de lectura_en_primario(), que manda aunque la vista pida réplica
+_solo_primario = ContextVar('solo_primario', default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+# FIJAR AL PRIMARIO #
+
+# Después de que un usuario modifica algo (carrito, compra) sus lecturas van
+# al primario durante REPLICA_FIJAR_SEGUNDOS, para que vea sus propios cambios
+# aunque la réplica vaya atrasada.
+def fijado_key(usuario_id):
+    return f'replica:fijado:{usuario_id}'
+
+
+def fijar_a_primario(usuario_id):
+    cache.set(fijado_key(usuario_id), True, settings.REPLICA_FIJAR_SEGUNDOS)
+
+
+def fijado_a_primario(usuario_id):
+    return usuario_id is not None and bool(cache.get(fijado_key(usuario_id)))
+
+
+@contextmanager
+def lectura_en_replica(usuario_id=None):
+    if not replicas() or fijado_a_primario(usuario_id):
+        yield
+        return
+    token = _leer_de_replica.set(True)
+    try:
+        yield
+    finally:
+        _leer_de_replica.reset(token)
+
+
+@contextmanager
+def lectura_en_primario():
+    token = _solo_primario.set(True)
+    try:
+        yield
+    finally:
+        _solo_primario.reset(token)
+
+
+def _usuario_id(request):
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        return None
+    return usuario.id
+
+
+# Decorador para vistas función (va debajo de @api_view para recibir el request autenticado)
+def leer_de_replica(vista):
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        with lectura_en_replica(_usuario_id(request)):
+            return vista(request, *args, **kwargs)
+    return envoltura
+
+
+# Mixin para vistas de DRF: las acciones en `replica_actions` (None = todos
+# los GET) leen de una réplica. Se activa después de autenticar.
+class LecturaReplicaMixin:
+    replica_actions = ('list', 'retrieve')
+
+    def _lee_de_replica(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if self.replica_actions is None:
+            return True
+        return getattr(self, 'action', None) in self.replica_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self._lee_de_replica(request):
+            self._replica = lectura_en_replica(_usuario_id(request))
+            self._replica.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = getattr(self, '_replica', None)
+        if replica is not None:
+            self._replica = None
+            replica.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _leer_de_replica.get() or _solo_primario.get():
+            return DEFAULT_DB_ALIAS
+        # Dentro de una transacción se lee lo que la transacción ve
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        disponibles = replicas()
+        return random.choice(disponibles) if disponibles else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todas las bases tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,96 @@
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Value
+from django.db.models.functions import Floor
+
+
+# Serie 1-2-5 (… 0.5, 1, 2, 5, 10, 20 …)
+def _serie(valor):
+    exponente = math.floor(math.log10(valor))
+    for factor in (1, 2, 5, 10):
+        candidato = Decimal(factor) * Decimal(10) ** exponente
+        if candidato >= valor:
+            return candidato
+
+
+# El ancho pedido se redondea hacia arriba a la serie 1-2-5 y queda entre la
+# precisión de la columna y el mayor precio posible: así hay pocos valores
+# distintos (y pocas entradas en la caché) por más anchos que pidan los clientes.
+def normalizar_ancho(ancho, modelo):
+    campo = modelo._meta.get_field('precio')
+    minimo = Decimal(1).scaleb(-campo.decimal_places)
+    maximo = Decimal(10) ** (campo.max_digits - campo.decimal_places)
+    return min(_serie(max(Decimal(ancho), minimo)), maximo)
+
+
+# Facetas del catálogo (conteos por categoría, rango e histograma de precios y
+# productos con stock) calculadas con una sola consulta agrupada por
+# categoría y tramo de precio; el resto se combina en Python.
+def calcular_facetas(queryset, ancho_precio):
+    ancho = Decimal(ancho_precio)
+    grupos = (
+        queryset.order_by()
+        .annotate(tramo=Floor(F('precio') / Value(ancho, output_field=DecimalField(max_digits=12, decimal_places=3))))
+        .values('categoria_id', 'categoria__nombre', 'tramo')
+        .annotate(
+            productos=Count('id'),
+            en_stock=Count('id', filter=Q(stock__gt=0)),
+            minimo=Min('precio'),
+            maximo=Max('precio'),
+        )
+    )
+
+    categorias = {}
+    tramos = {}
+    minimo = maximo = None
+    total = en_stock = 0
+    for grupo in grupos:
+        categoria = categorias.setdefault(grupo['categoria_id'], {
+            'id': grupo['categoria_id'], 'nombre': grupo['categoria__nombre'], 'productos': 0, 'en_stock': 0,
+        })
+        categoria['productos'] += grupo['productos']
+        categoria['en_stock'] += grupo['en_stock']
+
+        tramo = int(grupo['tramo'])
+        tramos[tramo] = tramos.get(tramo, 0) + grupo['productos']
+
+        total += grupo['productos']
+        en_stock += grupo['en_stock']
+        minimo = grupo['minimo'] if minimo is None else min(minimo, grupo['minimo'])
+        maximo = grupo['maximo'] if maximo is None else max(maximo, grupo['maximo'])
+
+    # Algunos motores devuelven Min/Max sin los decimales de la columna
+    exponente = Decimal(1).scaleb(-queryset.model._meta.get_field('precio').decimal_places)
+
+    def precio(valor):
+        return str(valor.quantize(exponente)) if valor is not None else None
+
+    # El histograma es denso: con un ancho muy chico para el rango de precios
+    # se agrandan los tramos (por un factor entero de la serie 1-2-5, así cada
+    # tramo nuevo agrupa tramos enteros) hasta no pasar de FACETAS_MAX_TRAMOS
+    if tramos and max(tramos) - min(tramos) + 1 > settings.FACETAS_MAX_TRAMOS:
+        factor = int(_serie((max(tramos) - min(tramos) + 1) / settings.FACETAS_MAX_TRAMOS))
+        while max(tramos) // factor - min(tramos) // factor + 1 > settings.FACETAS_MAX_TRAMOS:
+            factor = int(_serie(factor + 1))
+        agrupados = {}
+        for tramo, cantidad in tramos.items():
+            agrupados[tramo // factor] = agrupados.get(tramo // factor, 0) + cantidad
+        tramos, ancho = agrupados, ancho * factor
+
+    histograma = [
+        {'desde': str(tramo * ancho), 'hasta': str((tramo + 1) * ancho), 'productos': tramos.get(tramo, 0)}
+        for tramo in (range(min(tramos), max(tramos) + 1) if tramos else ())
+    ]
+    return {
+        'total': total,
+        'en_stock': en_stock,
+        'categorias': sorted(categorias.values(), key=lambda categoria: categoria['id']),
+        'precio': {
+            'min': precio(minimo),
+            'max': precio(maximo),
+            'ancho': str(ancho),
+            'histograma': histograma,
+        },
+    }
@@ -0,0 +1,149 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import ClaveIdempotencia
+
+
+CABECERA = 'Idempotency-Key'
+CABECERA_REPETIDA = 'Idempotent-Replayed'
+
+# Cada cuánto revisa una petición duplicada si la original ya terminó: el
+# intervalo se duplica en cada vuelta, hasta _INTERVALO_MAXIMO
+_INTERVALO_INICIAL = 0.02
+_INTERVALO_MAXIMO = 0.2
+
+
+def _huella(request):
+    sha = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    sha.update(request.body)
+    return sha.hexdigest()
+
+
+# Una clave vencida, o en curso desde hace demasiado (el proceso que la
+# reservó murió), se puede volver a usar
+def _vencida(registro, ahora):
+    if registro.expira <= ahora:
+        return True
+    abandono = timedelta(seconds=settings.IDEMPOTENCIA_ABANDONO)
+    return registro.estado == ClaveIdempotencia.EN_CURSO and registro.creada <= ahora - abandono
+
+
+# Devuelve (registro, propio). Con propio=True la petición reservó la clave y
+# debe ejecutarse; si no, el registro es de otra petición (o None si esta lo
+# liberó mientras tanto).
+def _reservar(usuario_id, clave, huella):
+    ahora = timezone.now()
+    registro = ClaveIdempotencia.objects.filter(usuario_id=usuario_id, clave=clave).first()
+    if registro is not None:
+        if not _vencida(registro, ahora):
+            return registro, False
+        ClaveIdempotencia.objects.filter(pk=registro.pk, estado=registro.estado).delete()
+
+    try:
+        with transaction.atomic():
+            return ClaveIdempotencia.objects.create(
+                usuario_id=usuario_id,
+                clave=clave,
+                huella=huella,
+                expira=ahora + timedelta(seconds=settings.IDEMPOTENCIA_TTL),
+            ), True
+    except IntegrityError:
+        # Un duplicado simultáneo la reservó primero
+        return ClaveIdempotencia.objects.filter(usuario_id=usuario_id, clave=clave).first(), False
+
+
+# Espera un momento (IDEMPOTENCIA_ESPERA, para el doble clic típico) a que la
+# petición original termine; si no, el duplicado recibe 409 y no ocupa el
+# worker. Devuelve None si la original falló y liberó la clave.
+def _esperar(registro):
+    esperado, intervalo = 0.0, _INTERVALO_INICIAL
+    while registro.estado == ClaveIdempotencia.EN_CURSO and esperado < settings.IDEMPOTENCIA_ESPERA:
+        pausa = min(intervalo, settings.IDEMPOTENCIA_ESPERA - esperado)
+        time.sleep(pausa)
+        esperado += pausa
+        intervalo = min(intervalo * 2, _INTERVALO_MAXIMO)
+        registro = ClaveIdempotencia.objects.filter(pk=registro.pk).first()
+        if registro is None:
+            return None
+    return registro
+
+
+def _ejecutar(registro, vista, request, args, kwargs):
+    try:
+        response = vista(request, *args, **kwargs)
+    except Exception:
+        registro.delete()
+        raise
+
+    # Los errores del servidor no se guardan: el reintento vuelve a ejecutarse
+    if response.status_code >= 500:
+        registro.delete()
+        return response
+
+    cuerpo = JSONRenderer().render(response.data) if isinstance(response, Response) else response.content
+    ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+        estado=ClaveIdempotencia.COMPLETADA, status=response.status_code, cuerpo=cuerpo.decode(),
+    )
+    return response
+
+
+def _repetir(registro):
+    response = HttpResponse(registro.cuerpo, status=registro.status, content_type='application/json')
+    response[CABECERA_REPETIDA] = 'true'
+    return response
+
+
+# Decorador para vistas que modifican el carrito o registran compras (va
+# debajo de @api_view, o con method_decorator en un APIView). Con la cabecera
+# Idempotency-Key la primera respuesta se guarda y los reintentos con la misma
+# clave la reciben tal cual, sin volver a tocar el carrito. Un duplicado que
+# llega mientras la original está en curso espera su respuesta un momento;
+# si no llega, recibe 409 con Retry-After.
+def idempotente(vista):
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if not clave:
+            return vista(request, *args, **kwargs)
+        if len(clave) > ClaveIdempotencia._meta.get_field('clave').max_length:
+            return Response({'message': f'{CABECERA} inválida'}, status=status.HTTP_400_BAD_REQUEST)
+
+        huella = _huella(request)
+        for _ in range(3):
+            registro, propio = _reservar(request.user.id, clave, huella)
+            if propio:
+                return _ejecutar(registro, vista, request, args, kwargs)
+            if registro is None:
+                continue
+            if registro.huella != huella:
+                return Response(
+                    {'message': f'La {CABECERA} ya se usó con otra petición'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            registro = _esperar(registro)
+            if registro is None:
+                continue
+            if registro.estado == ClaveIdempotencia.COMPLETADA:
+                return _repetir(registro)
+            break
+
+        return Response(
+            {'message': 'La petición original sigue en curso'},
+            status=status.HTTP_409_CONFLICT,
+            headers={'Retry-After': '1'},
+        )
+    return envoltura
+
+
+def purgar_claves_vencidas():
+    return ClaveIdempotencia.objects.filter(expira__lt=timezone.now()).delete()[0]
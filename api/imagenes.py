@@ -0,0 +1,93 @@
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# Anchos (px) y formatos de las versiones reducidas de cada imagen de producto
+ANCHOS_DERIVADOS = (200, 480, 1024)
+FORMATOS_DERIVADOS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+CARPETA_DERIVADOS = 'derivados'
+
+
+# 'productos/foto.jpeg' -> 'productos/derivados/foto_480.webp'
+def ruta_derivado(nombre, ancho, formato):
+    carpeta, archivo = posixpath.split(nombre)
+    base = posixpath.splitext(archivo)[0]
+    extension = FORMATOS_DERIVADOS[formato][0]
+    return posixpath.join(carpeta, CARPETA_DERIVADOS, f'{base}_{ancho}.{extension}')
+
+
+def es_derivado(nombre):
+    return CARPETA_DERIVADOS in nombre.split('/')
+
+
+# generar_derivados() escribe los derivados en este orden: si existe el último,
+# existen todos (la imagen por defecto o una tarea que falló no los tienen)
+def derivados_listos(storage, nombre):
+    ultimo = ruta_derivado(nombre, ANCHOS_DERIVADOS[-1], list(FORMATOS_DERIVADOS)[-1])
+    return storage.exists(ultimo)
+
+
+# URLs de todas las versiones de una imagen: {'200': {'jpeg': url, 'webp': url}, ...}.
+# None si aún no se generaron: el cliente usa `imagen`.
+def urls_derivados(nombre, request=None):
+    if not nombre or not derivados_listos(default_storage, nombre):
+        return None
+    urls = {}
+    for ancho in ANCHOS_DERIVADOS:
+        urls[str(ancho)] = {}
+        for formato in FORMATOS_DERIVADOS:
+            url = default_storage.url(ruta_derivado(nombre, ancho, formato))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[str(ancho)][formato] = url
+    return urls
+
+
+# Genera los derivados de una imagen. Solo usa Pillow y rutas del disco para
+# poder ejecutarse en otro proceso sin depender del estado de Django.
+def generar_derivados(media_root, nombre, forzar=False):
+    origen = os.path.join(media_root, nombre)
+    pendientes = []
+    for ancho in ANCHOS_DERIVADOS:
+        for formato in FORMATOS_DERIVADOS:
+            destino = os.path.join(media_root, ruta_derivado(nombre, ancho, formato))
+            if forzar or not os.path.exists(destino):
+                pendientes.append((ancho, formato, destino))
+    if not pendientes:
+        return []
+
+    generados = []
+    with Image.open(origen) as original:
+        imagen = ImageOps.exif_transpose(original)
+        # WebP conserva la transparencia; JPEG no la tiene y se pinta sobre blanco
+        if imagen.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagen.info:
+            imagen = imagen.convert('RGBA')
+            opaca = Image.new('RGB', imagen.size, 'white')
+            opaca.paste(imagen, mask=imagen.getchannel('A'))
+        else:
+            imagen = opaca = imagen.convert('RGB')
+        for ancho, formato, destino in pendientes:
+            copia = (imagen if formato == 'webp' else opaca).copy()
+            # Nunca se amplía: si la imagen es más angosta se conserva su tamaño
+            copia.thumbnail((ancho, ancho * 10), Image.LANCZOS)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            opciones = FORMATOS_DERIVADOS[formato][1]
+            # Se escribe en un temporal y se renombra para no servir archivos a medias
+            descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino))
+            try:
+                with os.fdopen(descriptor, 'wb') as archivo:
+                    copia.save(archivo, format=formato.upper(), **opciones)
+                os.chmod(temporal, 0o644)
+                os.replace(temporal, destino)
+            except Exception:
+                os.unlink(temporal)
+                raise
+            generados.append(destino)
+    return generados
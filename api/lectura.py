@@ -0,0 +1,158 @@
+import decimal
+import re
+
+from django.core.files.storage import FileSystemStorage
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .imagenes import ANCHOS_DERIVADOS, FORMATOS_DERIVADOS, derivados_listos, ruta_derivado
+
+
+# Serialización de solo lectura a partir de filas .values().
+# Los campos del serializer se convierten una vez en funciones simples
+# (columna -> valor JSON) y luego se aplican a cada fila, sin crear instancias
+# del modelo ni pasar por get_attribute/to_representation de DRF campo por
+# campo. La salida es idéntica a la del ModelSerializer correspondiente.
+class SerializadorLectura:
+    # Campos calculados: nombre -> (columnas que necesita, función(fila, request))
+    metodos = {}
+
+    def __init__(self, serializer_class, request=None):
+        self.request = request
+        self.mapeadores = []
+        columnas = []
+        campos = serializer_class(context={'request': request}).fields
+        for nombre, campo in campos.items():
+            if campo.write_only:
+                continue
+            if nombre in self.metodos:
+                requeridas, funcion = self.metodos[nombre]
+                columnas.extend(requeridas)
+                self.mapeadores.append((nombre, None, funcion))
+            else:
+                columnas.append(campo.source)
+                self.mapeadores.append((nombre, campo.source, self._compilar(campo)))
+        self.columnas = list(dict.fromkeys(columnas))
+
+    def _compilar(self, campo):
+        if isinstance(campo, (serializers.RelatedField, serializers.BaseSerializer, serializers.SerializerMethodField)):
+            raise TypeError(f'Campo sin versión de solo lectura: {campo.field_name}')
+        if isinstance(campo, serializers.DecimalField):
+            return _compilar_decimal(campo)
+        if isinstance(campo, serializers.FileField):
+            return self._compilar_archivo(campo)
+        if isinstance(campo, serializers.IntegerField):
+            return int
+        if isinstance(campo, serializers.ChoiceField):
+            opciones = campo.choice_strings_to_values
+            return lambda valor: valor if valor in ('', None) else opciones.get(str(valor), valor)
+        if type(campo) in (serializers.CharField, serializers.EmailField, serializers.SlugField):
+            return str
+        return campo.to_representation
+
+    def _compilar_archivo(self, campo):
+        if not getattr(campo, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return lambda nombre: nombre or None
+        storage = campo.parent.Meta.model._meta.get_field(campo.source).storage
+        url = compilar_url(storage, self.request)
+        return lambda nombre: url(nombre) if nombre else None
+
+    def fila(self, fila):
+        datos = {}
+        for nombre, columna, funcion in self.mapeadores:
+            if columna is None:
+                datos[nombre] = funcion(fila, self.request)
+            else:
+                valor = fila[columna]
+                datos[nombre] = None if valor is None else funcion(valor)
+        return datos
+
+    def filas(self, filas):
+        return [self.fila(fila) for fila in filas]
+
+
+# Mismo resultado que DecimalField.to_representation, con el contexto y el
+# exponente calculados una sola vez
+def _compilar_decimal(campo):
+    coerce_to_string = getattr(campo, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or campo.localize or campo.normalize_output or campo.decimal_places is None:
+        return campo.to_representation
+
+    contexto = decimal.getcontext().copy()
+    if campo.max_digits is not None:
+        contexto.prec = campo.max_digits
+    exponente = decimal.Decimal('.1') ** campo.decimal_places
+    redondeo = campo.rounding
+
+    def convertir(valor):
+        if not isinstance(valor, decimal.Decimal):
+            valor = decimal.Decimal(str(valor).strip())
+        return '{:f}'.format(valor.quantize(exponente, rounding=redondeo, context=contexto))
+    return convertir
+
+
+# Nombres de archivo que storage.url y build_absolute_uri dejan tal cual
+_nombre_simple = re.compile(r'^(?!/)(?!.*//)(?!.*(^|/)\.\.?(/|$))[A-Za-z0-9_.\-/]+$')
+
+
+# Devuelve una función nombre -> URL (absoluta si hay request) equivalente a
+# request.build_absolute_uri(storage.url(nombre)). Con FileSystemStorage y
+# nombres simples basta concatenar el prefijo calculado una vez; cualquier otro
+# caso pasa por el camino normal de Django.
+def compilar_url(storage, request=None):
+    def completa(nombre):
+        url = storage.url(nombre)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    base = storage.base_url if isinstance(storage, FileSystemStorage) else None
+    if not base or not _nombre_simple.match(base.lstrip('/') or 'x') or not base.startswith('/') or not base.endswith('/'):
+        return completa
+
+    prefijo = request.build_absolute_uri(base) if request is not None else base
+    return lambda nombre: prefijo + nombre if _nombre_simple.match(nombre) else completa(nombre)
+
+
+class ProductoLectura(SerializadorLectura):
+    def __init__(self, serializer_class, request=None):
+        campo = serializer_class.Meta.model._meta.get_field('imagen')
+        self.storage = campo.storage
+        self.url_imagen = compilar_url(campo.storage, request)
+        self.metodos = {'imagenes': (['imagen'], self._imagenes)}
+        super().__init__(serializer_class, request)
+
+    # Igual que urls_derivados(), con la URL precompilada
+    def _imagenes(self, fila, request):
+        nombre = fila['imagen']
+        if not nombre or not derivados_listos(self.storage, nombre):
+            return None
+        url = self.url_imagen
+        return {
+            str(ancho): {formato: url(ruta_derivado(nombre, ancho, formato)) for formato in FORMATOS_DERIVADOS}
+            for ancho in ANCHOS_DERIVADOS
+        }
+
+
+# Mixin para ViewSets: la acción list se sirve con `lectura_class` desde filas
+# .values() (incluye las columnas que la paginación necesita para el cursor)
+class LecturaListMixin:
+    lectura_class = SerializadorLectura
+
+    def get_lectura(self):
+        return self.lectura_class(self.get_serializer_class(), self.request)
+
+    def list(self, request, *args, **kwargs):
+        lectura = self.get_lectura()
+        queryset = self.filter_queryset(self.get_queryset())
+        # El ordering puede venir de ?ordering= (ver OrdenamientoEstable)
+        if hasattr(self.paginator, 'get_ordering'):
+            ordering = self.paginator.get_ordering(request, queryset, self)
+        else:
+            ordering = getattr(self.paginator, 'ordering', None) or ()
+        columnas = dict.fromkeys(lectura.columnas + [campo.lstrip('-') for campo in ordering])
+        queryset = queryset.values(*columnas)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(lectura.filas(page))
+        return Response(lectura.filas(queryset))
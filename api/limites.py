@@ -0,0 +1,131 @@
+import hashlib
+import math
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import SimpleRateThrottle
+
+
+# VENTANA DESLIZANTE #
+
+# Cada clave cuenta sus peticiones en la ventana actual de `duration`
+# segundos y en la anterior (tasas de DEFAULT_THROTTLE_RATES, p. ej.
+# '10/min'); la anterior pesa según lo que falta de la actual, así el cupo se
+# renueva de a poco y admite ráfagas cortas. Los contadores se suben con
+# add() + incr(), atómicos en la caché: dos peticiones simultáneas no gastan
+# el mismo cupo. Rechaza con Retry-After antes de llegar a la vista.
+class VentanaDeslizanteThrottle(SimpleRateThrottle):
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        ventana, transcurrido = divmod(self.timer(), self.duration)
+        anterior = self.cache.get(f'{self.key}:{int(ventana) - 1}', 0)
+        clave = f'{self.key}:{int(ventana)}'
+        actual = self._incrementar(clave)
+        if anterior * (1 - transcurrido / self.duration) + actual <= self.num_requests:
+            return True
+
+        # La petición rechazada no gasta cupo
+        try:
+            self.cache.decr(clave)
+        except ValueError:
+            pass
+        self.espera = self._espera(anterior, actual - 1, transcurrido)
+        return False
+
+    def _incrementar(self, clave):
+        # La ventana se sigue leyendo como "anterior" durante otro `duration`
+        self.cache.add(clave, 0, 2 * self.duration)
+        try:
+            return self.cache.incr(clave)
+        except ValueError:
+            # Expiró entre add() e incr()
+            self.cache.add(clave, 1, 2 * self.duration)
+            return 1
+
+    # Segundos hasta que entra una petición más
+    def _espera(self, anterior, actual, transcurrido):
+        libres = self.num_requests - actual - 1
+        if libres >= 0:
+            return self.duration * (1 - libres / anterior) - transcurrido
+        # Hay que pasar a la ventana siguiente, donde la actual pasa a ser la anterior
+        return self.duration - transcurrido + self.duration * max(0, 1 - (self.num_requests - 1) / actual)
+
+    def wait(self):
+        return max(1, math.ceil(self.espera))
+
+
+# La IP sale de REMOTE_ADDR o, detrás de un proxy, de X-Forwarded-For según
+# NUM_PROXIES (ver REST_FRAMEWORK en settings)
+class PorIPThrottle(VentanaDeslizanteThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+# El correo se normaliza y se guarda como hash (las claves de la caché no
+# admiten cualquier carácter)
+class PorEmailThrottle(VentanaDeslizanteThrottle):
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginIPThrottle(PorIPThrottle):
+    scope = 'login_ip'
+
+
+class LoginEmailThrottle(PorEmailThrottle):
+    scope = 'login_email'
+
+
+class RegistroIPThrottle(PorIPThrottle):
+    scope = 'registro_ip'
+
+
+class RegistroEmailThrottle(PorEmailThrottle):
+    scope = 'registro_email'
+
+
+# CONCURRENCIA DEL HASH DE CONTRASEÑAS #
+
+class ServidorOcupado(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'El servidor está ocupado, intente de nuevo en unos segundos.'
+    default_code = 'servidor_ocupado'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+# Cada hash de contraseña (PBKDF2) ocupa una CPU casi medio segundo. Como
+# mucho HASH_CONCURRENCIA se calculan a la vez; el resto se rechaza en el
+# acto con 503 y Retry-After en lugar de acaparar todos los workers. Las
+# ranuras son claves de la caché tomadas con add() (atómico); si un proceso
+# muere con una tomada, se libera sola a los HASH_RANURA_TTL segundos.
+@contextmanager
+def ranura_hash():
+    total = settings.HASH_CONCURRENCIA
+    inicio = random.randrange(total)
+    for desplazamiento in range(total):
+        clave = f'hash:ranura:{(inicio + desplazamiento) % total}'
+        if cache.add(clave, 1, settings.HASH_RANURA_TTL):
+            break
+    else:
+        raise ServidorOcupado(settings.HASH_RETRY_AFTER)
+
+    try:
+        yield
+    finally:
+        cache.delete(clave)
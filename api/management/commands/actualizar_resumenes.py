@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.analitica import actualizar_resumenes, reconstruir_resumenes, verificar_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Actualiza los resúmenes diarios de ventas con las compras nuevas desde la última ejecución'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true', help='Borra los resúmenes y los recalcula desde cero')
+        parser.add_argument('--verificar', action='store_true', help='Compara los resúmenes con las tablas de compras')
+        parser.add_argument('--lote', type=int, default=None, help='Máximo de compras (por id) a procesar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['reconstruir']:
+            procesadas = reconstruir_resumenes()
+        elif not options['verificar']:
+            procesadas = actualizar_resumenes(lote=options['lote'])
+        else:
+            procesadas = None
+
+        if procesadas is not None:
+            duracion = time.perf_counter() - inicio
+            self.stdout.write(self.style.SUCCESS(f'{procesadas} compras procesadas en {duracion:.2f}s'))
+
+        if options['verificar']:
+            diferencias = verificar_resumenes()
+            for diferencia in diferencias:
+                self.stderr.write(diferencia)
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} diferencias entre los resúmenes y las compras')
+            self.stdout.write(self.style.SUCCESS('Los resúmenes coinciden con las compras'))
@@ -0,0 +1,308 @@
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.utils import timezone
+
+from api.models import Producto
+from api.semilla import CLAVE_SEMILLA, PREFIJO_SEMILLA
+
+
+# Cliente que llama directamente a la aplicación WSGI (el mismo camino que
+# recorre una petición en gunicorn, sin la red) y registra latencia, código
+# de estado y consultas SQL de cada petición.
+class ClienteWSGI:
+    def __init__(self, app, host, email, resultados, ip='127.0.0.1', token=None):
+        self.app = app
+        self.host = host
+        self.email = email
+        self.resultados = resultados
+        self.ip = ip
+        self.token = token
+
+    def login(self, intentos=5):
+        datos = {'email': self.email, 'password': CLAVE_SEMILLA}
+        estado, contenido = self.peticion('POST', '/api/token/', datos, registrar=False)
+        # Límites de login ocupados (429/503, ver api/limites.py): se espera y se reintenta
+        while estado in (429, 503) and intentos > 1:
+            intentos -= 1
+            time.sleep(1)
+            estado, contenido = self.peticion('POST', '/api/token/', datos, registrar=False)
+        if estado != 200:
+            raise CommandError(f'No se pudo iniciar sesión con {self.email}; ejecute primero "manage.py seed"')
+        self.token = json.loads(contenido)['access']
+
+    def _environ(self, metodo, ruta, cuerpo, ip):
+        partes = urlsplit(ruta)
+        environ = {
+            'REQUEST_METHOD': metodo, 'PATH_INFO': partes.path, 'QUERY_STRING': partes.query,
+            'SCRIPT_NAME': '', 'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'HTTP_HOST': self.host,
+            'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': ip,
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(cuerpo),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(cuerpo)),
+        }
+        if self.token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {self.token}'
+        return environ
+
+    def peticion(self, metodo, ruta, datos=None, registrar=True, ip=None, renovar=True):
+        cuerpo = json.dumps(datos).encode() if datos is not None else b''
+        estado = {}
+
+        def start_response(status, headers, exc_info=None):
+            estado['codigo'] = int(status.split()[0])
+
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        conexiones = connections.all()
+        for conexion in conexiones:
+            conexion.execute_wrappers.append(contar)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.app(self._environ(metodo, ruta, cuerpo, ip or self.ip), start_response)
+            try:
+                contenido = b''.join(respuesta)
+            finally:
+                if hasattr(respuesta, 'close'):
+                    respuesta.close()
+        finally:
+            for conexion in conexiones:
+                conexion.execute_wrappers.remove(contar)
+        duracion = time.perf_counter() - inicio
+
+        # El token de acceso dura pocos minutos: se renueva y se repite la
+        # petición una sola vez; si vuelve a dar 401 se registra como tal
+        if estado['codigo'] == 401 and registrar and renovar and self.token:
+            self.login()
+            return self.peticion(metodo, ruta, datos, registrar, ip, renovar=False)
+
+        if registrar:
+            self.resultados.append((duracion, estado['codigo'], consultas[0]))
+        return estado['codigo'], contenido
+
+
+# ESCENARIOS #
+# Cada uno recibe el cliente y los ids de productos con stock disponible.
+
+TERMINOS = ('camisa', 'jean', 'chaqueta', 'gorra', 'vestido', 'clasico')
+
+
+def escenario_catalogo(cliente, productos, aleatorio):
+    _, contenido = cliente.peticion('GET', '/api/productos/')
+    siguiente = json.loads(contenido).get('next')
+    if siguiente:
+        cliente.peticion('GET', siguiente)
+    cliente.peticion('GET', '/api/categorias/')
+    cliente.peticion('GET', f'/api/productos/?q={aleatorio.choice(TERMINOS)}')
+
+
+def escenario_carrito(cliente, productos, aleatorio):
+    cliente.peticion('POST', f'/api/agregar_al_carrito/{aleatorio.choice(productos)}/')
+    cliente.peticion('GET', '/api/ver-carrito/')
+
+
+def escenario_checkout(cliente, productos, aleatorio):
+    for producto in aleatorio.sample(productos, 2):
+        cliente.peticion('POST', f'/api/agregar_al_carrito/{producto}/')
+    cliente.peticion('POST', '/api/registrar-compra/')
+
+
+def escenario_historial(cliente, productos, aleatorio):
+    cliente.peticion('GET', '/api/historial-compras/')
+
+
+# Ataque de credenciales contra usuarios sembrados que no usan los usuarios
+# virtuales, desde muchas IPs (TEST-NET-3)
+VICTIMAS_LOGIN = range(50, 100)
+
+
+def intento_login_fallido(cliente, aleatorio):
+    datos = {'email': f'{PREFIJO_SEMILLA}{aleatorio.choice(VICTIMAS_LOGIN)}@example.com', 'password': 'incorrecta'}
+    cliente.peticion('POST', '/api/token/', datos, ip=f'203.0.113.{aleatorio.randrange(1, 255)}')
+
+
+# Los usuarios virtuales navegan el catálogo mientras otros tantos hilos
+# atacan el login: se compara contra el escenario 'catalogo'
+def escenario_login_masivo(cliente, productos, aleatorio):
+    escenario_catalogo(cliente, productos, aleatorio)
+
+
+# Función que ejecutan los hilos atacantes de un escenario (se miden aparte)
+escenario_login_masivo.ataque = intento_login_fallido
+
+
+ESCENARIOS = {
+    'catalogo': escenario_catalogo,
+    'carrito': escenario_carrito,
+    'checkout': escenario_checkout,
+    'historial': escenario_historial,
+    'login_masivo': escenario_login_masivo,
+}
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumir(resultados, duracion):
+    latencias = sorted(resultado[0] for resultado in resultados)
+    peticiones = len(resultados)
+    return {
+        'peticiones': peticiones,
+        'errores': sum(1 for _, estado, _ in resultados if estado >= 500),
+        'rechazos': sum(1 for _, estado, _ in resultados if 400 <= estado < 500),
+        'rps': round(peticiones / duracion, 2) if duracion else 0.0,
+        'p50_ms': round(_percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(_percentil(latencias, 95) * 1000, 2),
+        'p99_ms': round(_percentil(latencias, 99) * 1000, 2),
+        'consultas_promedio': round(sum(resultado[2] for resultado in resultados) / peticiones, 2) if peticiones else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta escenarios de carga concurrentes contra la aplicación WSGI y guarda los resultados en JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escenarios', nargs='+', choices=list(ESCENARIOS), default=list(ESCENARIOS))
+        parser.add_argument('--concurrencia', type=int, default=8)
+        parser.add_argument('--duracion', type=float, default=10, help='Segundos por escenario')
+        parser.add_argument('--atacantes', type=int, default=16, help='Hilos atacantes en los escenarios con ataque')
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--semilla', type=int, default=None)
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmark_<fecha>.json)')
+        parser.add_argument('--comparar', help='Resultados anteriores para detectar regresiones')
+        parser.add_argument('--tolerancia', type=float, default=0.10, help='Empeoramiento máximo aceptado (0.10 = 10%%)')
+
+    def handle(self, *args, **options):
+        app = get_wsgi_application()
+        # Los tokens se reutilizan entre escenarios para no gastar los límites
+        # de login (api/limites.py)
+        self.tokens = {}
+        productos = list(
+            Producto.objects.filter(slug__startswith=PREFIJO_SEMILLA, stock__gte=100).values_list('id', flat=True)[:500]
+        )
+        if len(productos) < 2:
+            raise CommandError('No hay productos sembrados con stock; ejecute primero "manage.py seed"')
+
+        resultados = {
+            'fecha': timezone.now().isoformat(),
+            'configuracion': {clave: options[clave] for clave in ('escenarios', 'concurrencia', 'duracion', 'semilla')},
+            'escenarios': {},
+        }
+        for nombre in options['escenarios']:
+            resumen = self._ejecutar(app, nombre, productos, options)
+            resultados['escenarios'][nombre] = resumen
+            self.stdout.write(
+                f"{nombre:>10}: {resumen['peticiones']:>6} peticiones {resumen['rps']:>8.1f} req/s  "
+                f"p50 {resumen['p50_ms']:>7.1f} ms  p95 {resumen['p95_ms']:>7.1f} ms  p99 {resumen['p99_ms']:>7.1f} ms  "
+                f"{resumen['consultas_promedio']:>5.1f} consultas/pet  {resumen['errores']} errores"
+            )
+            if 'ataque' in resumen:
+                ataque = resumen['ataque']
+                codigos = ', '.join(f'{codigo}: {total}' for codigo, total in ataque['codigos'].items())
+                self.stdout.write(
+                    f"{'ataque':>10}: {ataque['peticiones']:>6} peticiones {ataque['rps']:>8.1f} req/s  "
+                    f"p50 {ataque['p50_ms']:>7.1f} ms  p95 {ataque['p95_ms']:>7.1f} ms  ({codigos})"
+                )
+
+        salida = options['salida'] or f"benchmark_{timezone.now():%Y%m%d_%H%M%S}.json"
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida}'))
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados, options['tolerancia'])
+
+    def _ejecutar(self, app, nombre, productos, options):
+        escenario = ESCENARIOS[nombre]
+        semilla = options['semilla']
+        fin = None
+        lock = threading.Lock()
+        todos = []
+
+        def usuario_virtual(numero):
+            aleatorio = random.Random(None if semilla is None else semilla + numero)
+            registro = []
+            email = f'{PREFIJO_SEMILLA}{numero}@example.com'
+            # Una IP por usuario virtual, como clientes reales
+            ip = f'10.0.{numero // 250}.{numero % 250 + 1}'
+            cliente = ClienteWSGI(app, options['host'], email, registro, ip, self.tokens.get(email))
+            try:
+                if not cliente.token:
+                    cliente.login()
+                while time.perf_counter() < fin:
+                    escenario(cliente, productos, aleatorio)
+            finally:
+                connections.close_all()
+                with lock:
+                    todos.extend(registro)
+                    self.tokens[email] = cliente.token
+
+        ataque = getattr(escenario, 'ataque', None)
+        intentos = []
+
+        def atacante(numero):
+            aleatorio = random.Random(None if semilla is None else semilla - numero - 1)
+            registro = []
+            cliente = ClienteWSGI(app, options['host'], None, registro)
+            try:
+                while time.perf_counter() < fin:
+                    ataque(cliente, aleatorio)
+            finally:
+                connections.close_all()
+                with lock:
+                    intentos.extend(registro)
+
+        hilos = options['concurrencia'] + (options['atacantes'] if ataque else 0)
+        inicio = time.perf_counter()
+        fin = inicio + options['duracion']
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            futuros = [pool.submit(usuario_virtual, numero) for numero in range(options['concurrencia'])]
+            if ataque:
+                futuros += [pool.submit(atacante, numero) for numero in range(options['atacantes'])]
+            for futuro in futuros:
+                futuro.result()
+        duracion = time.perf_counter() - inicio
+        resumen = resumir(todos, duracion)
+        if ataque:
+            resumen['ataque'] = {
+                **resumir(intentos, duracion),
+                'codigos': {str(codigo): sum(1 for _, estado, _ in intentos if estado == codigo)
+                            for codigo in sorted({estado for _, estado, _ in intentos})},
+            }
+        return resumen
+
+    def _comparar(self, ruta, resultados, tolerancia):
+        with open(ruta, encoding='utf-8') as archivo:
+            anteriores = json.load(archivo)['escenarios']
+
+        regresiones = []
+        for nombre, actual in resultados['escenarios'].items():
+            anterior = anteriores.get(nombre)
+            if not anterior:
+                continue
+            cambio_p95 = actual['p95_ms'] / anterior['p95_ms'] - 1 if anterior['p95_ms'] else 0.0
+            cambio_rps = actual['rps'] / anterior['rps'] - 1 if anterior['rps'] else 0.0
+            self.stdout.write(f'{nombre:>10}: p95 {cambio_p95:+.1%}  req/s {cambio_rps:+.1%}')
+            if cambio_p95 > tolerancia or -cambio_rps > tolerancia:
+                regresiones.append(nombre)
+
+        if regresiones:
+            raise CommandError(f"Regresión en: {', '.join(regresiones)}")
+        self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la ejecución anterior'))
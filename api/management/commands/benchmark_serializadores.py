@@ -0,0 +1,74 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.lectura import ProductoLectura
+from api.models import Categoria, Producto
+from api.serializers import ProductoSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara ProductoSerializer con la serialización de solo lectura sobre filas .values()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Los productos de prueba se crean dentro de una transacción que se revierte al final
+        try:
+            with transaction.atomic():
+                self._ejecutar(options['productos'], options['repeticiones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _ejecutar(self, cantidad, repeticiones):
+        categoria = Categoria.objects.first() or Categoria.objects.create(nombre='hombre')
+        inicio = Producto.objects.count()
+        Producto.objects.bulk_create(
+            [
+                Producto(
+                    nombre=f'Benchmark {i}', slug=f'benchmark-{i}', descripcion='Descripción de prueba',
+                    precio=Decimal('19.990'), stock=i % 50, categoria=categoria,
+                    imagen=f'productos/benchmark_{i}.jpg',
+                )
+                for i in range(inicio, inicio + cantidad)
+            ],
+            batch_size=2000,
+        )
+        queryset = Producto.objects.filter(slug__startswith='benchmark-').order_by('id')
+        request = APIRequestFactory().get('/api/productos/', HTTP_HOST='localhost')
+        renderer = JSONRenderer()
+
+        def completo():
+            return renderer.render(ProductoSerializer(queryset, many=True, context={'request': request}).data)
+
+        def rapido():
+            lectura = ProductoLectura(ProductoSerializer, request)
+            return renderer.render(lectura.filas(queryset.values(*lectura.columnas)))
+
+        if completo() != rapido():
+            raise CommandError('Las dos rutas no producen el mismo JSON')
+
+        tiempos = {}
+        for nombre, funcion in (('ModelSerializer', completo), ('lectura .values()', rapido)):
+            mejores = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                funcion()
+                mejores.append(time.perf_counter() - inicio)
+            tiempos[nombre] = min(mejores)
+            self.stdout.write(f'{nombre:>18}: {tiempos[nombre] * 1000:8.1f} ms ({cantidad / tiempos[nombre]:,.0f} productos/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"JSON idéntico; {tiempos['ModelSerializer'] / tiempos['lectura .values()']:.1f}x más rápido"
+        ))
@@ -0,0 +1,107 @@
+import json
+import os
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Usuario
+from api.views import UsuarioViewSet
+
+
+# Se ejecuta la vista real (UsuarioViewSet.list) sobre las primeras
+# `cantidad` filas de la tabla: streaming lee con .iterator(), clásico arma
+# la lista completa y la renderiza de una vez
+def _vista(cantidad, streaming):
+    vista = type('UsuariosBenchmark', (UsuarioViewSet,), {
+        'queryset': Usuario.objects.order_by('id')[:cantidad],
+        'streaming_actions': ('list',) if streaming else (),
+    })
+    request = APIRequestFactory().get('/api/usuarios/', HTTP_ACCEPT='application/json')
+    force_authenticate(request, user=Usuario(id=0, is_staff=True))
+    return vista.as_view({'get': 'list'})(request)
+
+
+def _rss_actual_kb():
+    with open('/proc/self/status') as status:
+        for linea in status:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1])
+    return 0
+
+
+def _streaming(cantidad):
+    return sum(len(bloque) for bloque in _vista(cantidad, streaming=True).streaming_content)
+
+
+def _clasico(cantidad):
+    return len(_vista(cantidad, streaming=False).render().content)
+
+
+MODOS = {'streaming': _streaming, 'clasico': _clasico}
+
+
+# Ejecuta la medición en un proceso hijo para que el pico de memoria de una
+# corrida no contamine la siguiente
+def _medir(modo, cantidad):
+    lectura, escritura = os.pipe()
+    # El hijo abre su propia conexión; compartir el socket del padre la corrompe
+    connections.close_all()
+    pid = os.fork()
+    if pid == 0:
+        os.close(lectura)
+        try:
+            base = _rss_actual_kb()
+            inicio = time.perf_counter()
+            tamano = MODOS[modo](cantidad)
+            duracion = time.perf_counter() - inicio
+            pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            resultado = {'bytes': tamano, 'segundos': duracion, 'pico_kb': max(pico - base, 0)}
+        except Exception as e:
+            resultado = {'error': str(e)}
+        with os.fdopen(escritura, 'w') as salida:
+            json.dump(resultado, salida)
+        os._exit(0)
+
+    os.close(escritura)
+    with os.fdopen(lectura) as entrada:
+        datos = entrada.read()
+    os.waitpid(pid, 0)
+    return json.loads(datos)
+
+
+class Command(BaseCommand):
+    help = 'Compara el pico de memoria de la lista transmitida por partes frente al render completo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument(
+            '--max-clasico', type=int, default=100000,
+            help='Tamaño máximo para el modo clásico (su memoria crece con la tabla)',
+        )
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError('Este benchmark necesita os.fork (Linux/macOS)')
+        disponibles = Usuario.objects.count()
+        if disponibles < min(options['tamanos']):
+            raise CommandError(f'Solo hay {disponibles} usuarios; ejecute primero "manage.py seed --usuarios N"')
+
+        self.stdout.write(f"{'filas':>10} {'modo':>10} {'pico RSS':>12} {'tiempo':>9} {'tamaño':>12}")
+        for cantidad in options['tamanos']:
+            if cantidad > disponibles:
+                self.stderr.write(f'{cantidad:>10} omitido: solo hay {disponibles} usuarios sembrados')
+                continue
+            for modo in MODOS:
+                if modo == 'clasico' and cantidad > options['max_clasico']:
+                    continue
+                resultado = _medir(modo, cantidad)
+                if 'error' in resultado:
+                    self.stderr.write(f"{cantidad:>10} {modo:>10} error: {resultado['error']}")
+                    continue
+                self.stdout.write(
+                    f"{cantidad:>10} {modo:>10} {resultado['pico_kb'] / 1024:>9.1f} MB "
+                    f"{resultado['segundos']:>8.2f}s {resultado['bytes'] / 1024 / 1024:>9.1f} MB"
+                )
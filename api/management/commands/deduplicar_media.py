@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.media import deduplicar, recolectar_huerfanos
+
+
+def _legible(tamano):
+    for unidad in ('B', 'KB', 'MB'):
+        if tamano < 1024:
+            return f'{tamano:.1f} {unidad}'
+        tamano /= 1024
+    return f'{tamano:.1f} GB'
+
+
+class Command(BaseCommand):
+    help = 'Renombra las imágenes de productos por el hash de su contenido, junta los duplicados y libera espacio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carpeta', default='productos', help='Carpeta dentro de MEDIA_ROOT')
+        parser.add_argument('--simular', action='store_true', help='Solo informa, no modifica archivos ni productos')
+        parser.add_argument('--recolectar', action='store_true', help='Borra además los archivos sin referencias')
+        parser.add_argument('--gracia', type=int, default=3600, help='Segundos que se conserva un archivo sin referencias')
+
+    def handle(self, *args, **options):
+        resumen = deduplicar(str(settings.MEDIA_ROOT), options['carpeta'], options['simular'])
+        self.stdout.write(
+            f"{resumen['archivos']} archivos revisados, {resumen['duplicados']} duplicados, "
+            f"{resumen['productos']} productos actualizados"
+        )
+
+        recuperados = resumen['bytes_recuperados']
+        if options['recolectar'] and not options['simular']:
+            liberados = recolectar_huerfanos(timedelta(seconds=options['gracia']))
+            self.stdout.write(f'{_legible(liberados)} liberados en archivos sin referencias')
+            recuperados += liberados
+
+        prefijo = 'Se recuperarían' if options['simular'] else 'Recuperados'
+        self.stdout.write(self.style.SUCCESS(f'{prefijo} {_legible(recuperados)} ({recuperados} bytes)'))
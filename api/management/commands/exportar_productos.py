@@ -0,0 +1,35 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.catalogo import FORMATOS, lineas_exportacion
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo de productos a CSV o JSONL sin cargarlo completo en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        filas = 0
+        salida = open(options['salida'], 'w', encoding='utf-8', newline='') if options['salida'] else sys.stdout
+        try:
+            for linea in lineas_exportacion(options['formato'], options['chunk_size']):
+                salida.write(linea)
+                filas += 1
+        finally:
+            if options['salida']:
+                salida.close()
+
+        if options['salida']:
+            if options['formato'] == 'csv':
+                filas -= 1  # encabezado
+            duracion = time.perf_counter() - inicio
+            self.stdout.write(self.style.SUCCESS(
+                f'{filas} productos exportados en {duracion:.2f}s ({filas / duracion if duracion else 0:.0f} filas/s)'
+            ))
@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.imagenes import es_derivado, generar_derivados
+from api.media import publicar_derivados
+from api.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas y versiones WebP de las imágenes de productos existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenera aunque el derivado ya exista')
+        parser.add_argument('--workers', type=int, default=settings.IMAGENES_WORKERS)
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        nombres = self._imagenes(media_root)
+        self.stdout.write(f'{len(nombres)} imágenes por revisar')
+
+        generados = errores = 0
+        publicados = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futuros = {
+                pool.submit(generar_derivados, media_root, nombre, options['forzar']): nombre
+                for nombre in nombres
+            }
+            for futuro in as_completed(futuros):
+                try:
+                    nuevos = futuro.result()
+                    generados += len(nuevos)
+                    if nuevos:
+                        publicados.append(futuros[futuro])
+                except Exception as e:
+                    errores += 1
+                    self.stderr.write(f'{futuros[futuro]}: {e}')
+
+        publicar_derivados(publicados)
+        self.stdout.write(self.style.SUCCESS(f'{generados} derivados generados, {errores} errores'))
+
+    def _imagenes(self, media_root):
+        # Imágenes referenciadas por productos más las que ya están en media/productos/
+        nombres = set(
+            Producto.objects.exclude(imagen='').values_list('imagen', flat=True).distinct()
+        )
+        carpeta = os.path.join(media_root, 'productos')
+        for raiz, _, archivos in os.walk(carpeta):
+            for archivo in archivos:
+                nombre = os.path.relpath(os.path.join(raiz, archivo), media_root).replace(os.sep, '/')
+                if archivo.lower().endswith(('.png', '.jpg', '.jpeg')):
+                    nombres.add(nombre)
+        return sorted(
+            nombre for nombre in nombres
+            if not es_derivado(nombre) and os.path.exists(os.path.join(media_root, nombre))
+        )
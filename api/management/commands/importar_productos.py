@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalogo import FORMATOS, FilaInvalida, finalizar_importacion, guardar_lote, leer_filas, mapa_categorias, validar_fila
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un archivo CSV o JSONL (inserta o actualiza por slug)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por upsert')
+        parser.add_argument('--actualizar-imagenes', action='store_true', help='Sobrescribe la imagen de los productos existentes')
+        parser.add_argument('--max-errores', type=int, default=50, help='Errores a mostrar')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        formato = options['formato'] or os.path.splitext(archivo)[1].lstrip('.').lower()
+        if formato not in FORMATOS:
+            raise CommandError(f'Formato no soportado: {formato!r} (use --formato csv|jsonl)')
+
+        categorias = mapa_categorias()
+        inicio = time.perf_counter()
+        leidas = guardadas = errores = 0
+        lote = []
+
+        with open(archivo, encoding='utf-8', newline='') as entrada:
+            for numero, fila in leer_filas(entrada, formato):
+                leidas += 1
+                try:
+                    lote.append(validar_fila(fila, categorias))
+                except FilaInvalida as e:
+                    errores += 1
+                    if errores <= options['max_errores']:
+                        self.stderr.write(f'Línea {numero}: {e}')
+                    continue
+
+                if len(lote) >= options['lote']:
+                    guardadas += guardar_lote(lote, options['actualizar_imagenes'])
+                    lote = []
+                    self._progreso(leidas, inicio)
+
+            if lote:
+                guardadas += guardar_lote(lote, options['actualizar_imagenes'])
+
+        finalizar_importacion()
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{leidas} filas leídas, {guardadas} guardadas, {errores} con errores '
+            f'en {duracion:.2f}s ({leidas / duracion if duracion else 0:.0f} filas/s)'
+        ))
+
+    def _progreso(self, leidas, inicio):
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(f'{leidas} filas ({leidas / duracion if duracion else 0:.0f} filas/s)')
@@ -0,0 +1,42 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.tareas import purgar_completadas, trabajar
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de tareas: reclama y ejecuta tareas pendientes con varios hilos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=settings.TAREAS_CONCURRENCIA)
+        parser.add_argument('--lote', type=int, default=1, help='Tareas reclamadas por consulta en cada hilo')
+        parser.add_argument('--espera', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Termina cuando no quedan tareas disponibles')
+
+    def handle(self, *args, **options):
+        detener = threading.Event()
+        # SIGTERM/SIGINT: se termina la tarea en curso y se sale
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(senal, lambda *_: detener.set())
+
+        purgadas = purgar_completadas()
+        if purgadas:
+            self.stdout.write(f'{purgadas} tareas completadas antiguas eliminadas')
+
+        def hilo():
+            try:
+                return trabajar(detener, options['lote'], options['espera'], options['una_vez'])
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            resultados = [futuro.result() for futuro in [pool.submit(hilo) for _ in range(options['concurrencia'])]]
+
+        completadas = sum(resultado[0] for resultado in resultados)
+        fallidas = sum(resultado[1] for resultado in resultados)
+        self.stdout.write(self.style.SUCCESS(f'{completadas} tareas completadas, {fallidas} fallidas'))
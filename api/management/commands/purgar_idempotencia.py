@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.idempotencia import purgar_claves_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Borra las respuestas guardadas por Idempotency-Key que ya vencieron'
+
+    def handle(self, *args, **options):
+        borradas = purgar_claves_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'{borradas} claves de idempotencia eliminadas'))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Borra por lotes los tokens vencidos (emitidos y en lista negra) sin bloqueos largos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument('--pausa', type=float, default=0.1, help='Segundos de espera entre lotes')
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        total_outstanding = total_blacklisted = 0
+
+        while True:
+            # Cada lote es una transacción corta sobre un rango de ids
+            with transaction.atomic():
+                ids = list(
+                    OutstandingToken.objects.filter(expires_at__lt=ahora)
+                    .order_by('id')
+                    .values_list('id', flat=True)[:options['lote']]
+                )
+                if not ids:
+                    break
+                blacklisted, _ = BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                outstanding, _ = OutstandingToken.objects.filter(id__in=ids).delete()
+
+            total_blacklisted += blacklisted
+            total_outstanding += outstanding
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Lote: {outstanding} emitidos, {blacklisted} en lista negra')
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_outstanding} tokens emitidos y {total_blacklisted} en lista negra eliminados'
+        ))
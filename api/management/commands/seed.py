@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.analitica import reconstruir_resumenes
+from api.semilla import CLAVE_SEMILLA, PREFIJO_SEMILLA, sembrar
+
+
+class Command(BaseCommand):
+    help = 'Genera usuarios, productos, carritos y compras históricas sintéticos con bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=100)
+        parser.add_argument('--productos', type=int, default=1000)
+        parser.add_argument('--carritos', type=int, default=50, help='Usuarios generados que tendrán carrito')
+        parser.add_argument('--compras', type=int, default=1000)
+        parser.add_argument('--dias', type=int, default=365, help='Antigüedad máxima de las compras')
+        parser.add_argument('--semilla', type=int, default=None, help='Semilla aleatoria para repetir los mismos datos')
+        parser.add_argument('--resumenes', action='store_true', help='Recalcula los resúmenes de ventas al terminar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        creados = sembrar(
+            usuarios=options['usuarios'], productos=options['productos'], carritos=options['carritos'],
+            compras=options['compras'], dias=options['dias'], semilla=options['semilla'],
+        )
+        if options['resumenes']:
+            reconstruir_resumenes()
+
+        duracion = time.perf_counter() - inicio
+        resumen = ', '.join(f'{cantidad} {nombre}' for nombre, cantidad in creados.items())
+        self.stdout.write(self.style.SUCCESS(f'Creados {resumen} en {duracion:.2f}s'))
+        self.stdout.write(f'Usuarios: {PREFIJO_SEMILLA}N@example.com / contraseña {CLAVE_SEMILLA}')
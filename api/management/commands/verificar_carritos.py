@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from api.carrito import snapshot_keys, actualizar_snapshot_carrito, snapshot_desde_bd
+from api.models import Carrito
+
+
+class Command(BaseCommand):
+    help = 'Compara los snapshots de carrito guardados en caché con la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Reescribe los snapshots que no coinciden')
+        parser.add_argument('--lote', type=int, default=500)
+
+    def handle(self, *args, **options):
+        usuario_ids = (
+            Carrito.objects.order_by('usuario_id').values_list('usuario_id', flat=True).distinct()
+        )
+
+        revisados = en_cache = inconsistentes = 0
+        lote = []
+        for usuario_id in usuario_ids.iterator(chunk_size=options['lote']):
+            lote.append(usuario_id)
+            if len(lote) >= options['lote']:
+                r, c, i = self._revisar(lote, options['reparar'])
+                revisados, en_cache, inconsistentes = revisados + r, en_cache + c, inconsistentes + i
+                lote = []
+        if lote:
+            r, c, i = self._revisar(lote, options['reparar'])
+            revisados, en_cache, inconsistentes = revisados + r, en_cache + c, inconsistentes + i
+
+        mensaje = f'{revisados} carritos revisados, {en_cache} en caché, {inconsistentes} inconsistentes'
+        if inconsistentes and not options['reparar']:
+            self.stdout.write(self.style.WARNING(mensaje))
+        else:
+            self.stdout.write(self.style.SUCCESS(mensaje))
+
+    def _revisar(self, usuario_ids, reparar):
+        keys = snapshot_keys(usuario_ids)
+        cacheados = cache.get_many(list(keys))
+
+        inconsistentes = 0
+        for key, snapshot in cacheados.items():
+            usuario_id = keys[key]
+            if snapshot != snapshot_desde_bd(usuario_id):
+                inconsistentes += 1
+                self.stderr.write(f'Carrito del usuario {usuario_id} desactualizado en caché')
+                if reparar:
+                    actualizar_snapshot_carrito(usuario_id)
+        return len(usuario_ids), len(cacheados), inconsistentes
@@ -0,0 +1,154 @@
+import os
+import shutil
+from datetime import timedelta
+
+from django.core.files import File
+from django.db.models import Count, F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .cache import incrementar_version_catalogo
+from .imagenes import ANCHOS_DERIVADOS, CARPETA_DERIVADOS, FORMATOS_DERIVADOS, ruta_derivado
+from .models import ArchivoMedia, Producto
+from .storage import es_inmutable, hash_contenido, nombre_por_contenido
+
+
+def _storage():
+    return Producto._meta.get_field('imagen').storage
+
+
+def _derivados(nombre):
+    return [ruta_derivado(nombre, ancho, formato) for ancho in ANCHOS_DERIVADOS for formato in FORMATOS_DERIVADOS]
+
+
+# Los productos con estas imágenes ya tienen derivados: se marcan como
+# modificados (ETag) y se invalida el catálogo cacheado, que los servía sin
+# las URLs de `imagenes`
+def publicar_derivados(nombres):
+    if Producto.objects.filter(imagen__in=nombres).update(actualizado=Now()):
+        incrementar_version_catalogo()
+
+
+# REFERENCIAS #
+
+# Un producto dejó de usar `anterior` y ahora usa `nuevo`
+def ajustar_referencias(anterior, nuevo):
+    if anterior == nuevo:
+        return
+    if es_inmutable(nuevo):
+        storage = _storage()
+        archivo, _ = ArchivoMedia.objects.get_or_create(
+            nombre=nuevo, defaults={'tamano': storage.size(nuevo) if storage.exists(nuevo) else 0}
+        )
+        ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + 1)
+    if es_inmutable(anterior):
+        ArchivoMedia.objects.filter(nombre=anterior, referencias__gt=0).update(referencias=F('referencias') - 1)
+
+
+# Recalcula las referencias desde la tabla de productos (bulk_create y
+# update() no disparan señales, p. ej. en importar_productos). También se
+# registran `nombres` sin referencias para que recolectar_huerfanos los vea.
+def recontar_referencias(nombres=()):
+    usados = dict(
+        Producto.objects.values('imagen').annotate(total=Count('id')).values_list('imagen', 'total')
+    )
+    usados = {nombre: total for nombre, total in usados.items() if es_inmutable(nombre)}
+    storage = _storage()
+    conocidos = usados.keys() | set(nombres)
+    existentes = set(ArchivoMedia.objects.filter(nombre__in=conocidos).values_list('nombre', flat=True))
+    ArchivoMedia.objects.bulk_create([
+        ArchivoMedia(nombre=nombre, tamano=storage.size(nombre) if storage.exists(nombre) else 0)
+        for nombre in conocidos - existentes
+    ])
+    for archivo in ArchivoMedia.objects.all():
+        total = usados.get(archivo.nombre, 0)
+        if archivo.referencias != total:
+            ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=total)
+
+
+# Borra los archivos sin referencias (y sus derivados) creados hace más de
+# `gracia`, para no tocar subidas cuyo producto aún no se ha guardado.
+# Devuelve los bytes liberados.
+def recolectar_huerfanos(gracia=timedelta(hours=1)):
+    storage = _storage()
+    liberados = 0
+    candidatos = ArchivoMedia.objects.filter(referencias=0, creado__lt=timezone.now() - gracia)
+    for archivo in candidatos:
+        # Se confirma contra los productos antes de borrar
+        if Producto.objects.filter(imagen=archivo.nombre).exists():
+            continue
+        if not ArchivoMedia.objects.filter(pk=archivo.pk, referencias=0).delete()[0]:
+            continue
+        for nombre in [archivo.nombre, *_derivados(archivo.nombre)]:
+            if storage.exists(nombre):
+                liberados += storage.size(nombre)
+                storage.delete(nombre)
+    return liberados
+
+
+# MIGRACIÓN DE ARCHIVOS EXISTENTES #
+
+def _archivos_por_migrar(media_root, carpeta):
+    raiz_carpeta = os.path.join(media_root, carpeta)
+    nombre_defecto = Producto._meta.get_field('imagen').default
+    for raiz, directorios, archivos in os.walk(raiz_carpeta):
+        directorios[:] = [directorio for directorio in directorios if directorio != CARPETA_DERIVADOS]
+        for archivo in sorted(archivos):
+            nombre = os.path.relpath(os.path.join(raiz, archivo), media_root).replace(os.sep, '/')
+            # La imagen por defecto la usa el modelo por nombre
+            if not es_inmutable(nombre) and nombre != nombre_defecto:
+                yield nombre
+
+
+# Crea `destino` con el contenido de `origen` (enlace duro si se puede).
+# Devuelve False si ya existía otro archivo con el mismo contenido.
+def _enlazar(origen, destino):
+    if os.path.exists(destino):
+        return False
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+    return True
+
+
+# Renombra las imágenes de `carpeta` por su hash, junta los duplicados y
+# apunta los productos al nuevo nombre. Los derivados ya generados se
+# renombran igual para no tener que regenerarlos.
+def deduplicar(media_root, carpeta='productos', simular=False):
+    resumen = {'archivos': 0, 'duplicados': 0, 'bytes_recuperados': 0, 'productos': 0}
+    vistos = set()
+    for nombre in list(_archivos_por_migrar(media_root, carpeta)):
+        ruta = os.path.join(media_root, nombre)
+        with open(ruta, 'rb') as contenido:
+            nuevo = nombre_por_contenido(nombre, hash_contenido(File(contenido)))
+
+        resumen['archivos'] += 1
+        duplicado = nuevo in vistos or os.path.exists(os.path.join(media_root, nuevo))
+        if duplicado:
+            resumen['duplicados'] += 1
+        vistos.add(nuevo)
+
+        if simular:
+            resumen['bytes_recuperados'] += os.path.getsize(ruta) if duplicado else 0
+            resumen['productos'] += Producto.objects.filter(imagen=nombre).count()
+            continue
+
+        # Primero el archivo nuevo, luego los productos y al final se borran los viejos
+        movidos = [(ruta, os.path.join(media_root, nuevo))]
+        for viejo, derivado in zip(_derivados(nombre), _derivados(nuevo)):
+            if os.path.exists(os.path.join(media_root, viejo)):
+                movidos.append((os.path.join(media_root, viejo), os.path.join(media_root, derivado)))
+        duplicados = [origen for origen, destino in movidos if not _enlazar(origen, destino)]
+
+        resumen['productos'] += Producto.objects.filter(imagen=nombre).update(imagen=nuevo, actualizado=Now())
+        resumen['bytes_recuperados'] += sum(os.path.getsize(origen) for origen in duplicados)
+        for origen, _ in movidos:
+            os.unlink(origen)
+
+    if not simular:
+        recontar_referencias(vistos)
+        if resumen['productos']:
+            incrementar_version_catalogo()
+    return resumen
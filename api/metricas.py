@@ -0,0 +1,218 @@
+import atexit
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin limpieza de archivos de workers muertos
+    fcntl = None
+
+
+# Límites (segundos) de los buckets del histograma de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# REGISTRO POR PROCESO #
+
+# Cada worker acumula sus métricas en memoria y cada METRICS_FLUSH_SEGUNDOS
+# las escribe completas en METRICS_DIR/metricas_<pid>_<id>.json. El id es
+# propio de cada proceso: un worker nuevo que reutiliza el pid de uno muerto
+# no pisa sus contadores. El endpoint suma los archivos de todos los workers
+# (ver metricas_agregadas).
+class _Registro:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rutas = {}
+        self.ultimo_flush = time.monotonic()
+        self.proceso = None
+
+    def observar(self, vista, metodo, estado, segundos, consultas, segundos_bd, tamano):
+        with self.lock:
+            ruta = self.rutas.get((vista, metodo))
+            if ruta is None:
+                ruta = self.rutas[(vista, metodo)] = {
+                    'buckets': [0] * len(BUCKETS_LATENCIA), 'count': 0, 'sum': 0.0,
+                    'estados': {}, 'consultas': 0, 'segundos_bd': 0.0, 'bytes': 0,
+                }
+            for i, limite in enumerate(BUCKETS_LATENCIA):
+                if segundos <= limite:
+                    ruta['buckets'][i] += 1
+                    break
+            ruta['count'] += 1
+            ruta['sum'] += segundos
+            ruta['estados'][str(estado)] = ruta['estados'].get(str(estado), 0) + 1
+            ruta['consultas'] += consultas
+            ruta['segundos_bd'] += segundos_bd
+            ruta['bytes'] += tamano
+
+        if time.monotonic() - self.ultimo_flush >= settings.METRICS_FLUSH_SEGUNDOS:
+            self.escribir()
+
+    def archivo(self):
+        # Los workers creados con fork heredan el registro: el id se genera por pid
+        pid = os.getpid()
+        if self.proceso is None or self.proceso[0] != pid:
+            self.proceso = (pid, uuid.uuid4().hex[:12])
+        return os.path.join(settings.METRICS_DIR, f'metricas_{pid}_{self.proceso[1]}.json')
+
+    def escribir(self):
+        with self.lock:
+            datos = [{'vista': vista, 'metodo': metodo, **ruta} for (vista, metodo), ruta in self.rutas.items()]
+            self.ultimo_flush = time.monotonic()
+        _escribir_json(self.archivo(), datos)
+
+
+registro = _Registro()
+
+
+@atexit.register
+def _escribir_al_salir():
+    if registro.rutas:
+        registro.escribir()
+
+
+# Se escribe en un temporal y se renombra para que nunca se lea un archivo a medias
+def _escribir_json(nombre, datos):
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as archivo:
+        json.dump(datos, archivo)
+    os.replace(temporal, nombre)
+
+
+def _leer_json(nombre):
+    try:
+        with open(nombre) as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _sumar(total, datos):
+    for ruta in datos:
+        clave = (ruta['vista'], ruta['metodo'])
+        acumulado = total.setdefault(clave, {
+            'buckets': [0] * len(BUCKETS_LATENCIA), 'count': 0, 'sum': 0.0,
+            'estados': {}, 'consultas': 0, 'segundos_bd': 0.0, 'bytes': 0,
+        })
+        acumulado['buckets'] = [a + b for a, b in zip(acumulado['buckets'], ruta['buckets'])]
+        for campo in ('count', 'sum', 'consultas', 'segundos_bd', 'bytes'):
+            acumulado[campo] += ruta[campo]
+        for estado, cantidad in ruta['estados'].items():
+            acumulado['estados'][estado] = acumulado['estados'].get(estado, 0) + cantidad
+    return total
+
+
+_archivo_worker = re.compile(r'metricas_(\d+)_\w+\.json$')
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        return True
+    return True
+
+
+# Suma las métricas de todos los workers. Los archivos de workers que ya
+# terminaron se funden en METRICS_DIR/acumuladas.json y se borran, así los
+# contadores nunca retroceden y el directorio no crece con cada reinicio.
+# Todo ocurre con un flock exclusivo: dos lecturas simultáneas no funden
+# dos veces el mismo archivo.
+def metricas_agregadas():
+    registro.escribir()
+    if fcntl is None:
+        return _agregar(limpiar=False)
+    with open(os.path.join(settings.METRICS_DIR, '.lock'), 'w') as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        try:
+            return _agregar(limpiar=True)
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+
+
+def _agregar(limpiar):
+    acumuladas = os.path.join(settings.METRICS_DIR, 'acumuladas.json')
+    total = _sumar({}, _leer_json(acumuladas) or [])
+    muertos = {}
+    for nombre in glob.glob(os.path.join(settings.METRICS_DIR, 'metricas_*.json')):
+        datos = _leer_json(nombre)
+        if datos is None:
+            continue
+        _sumar(total, datos)
+        coincidencia = _archivo_worker.search(nombre)
+        if limpiar and coincidencia and not _proceso_vivo(int(coincidencia.group(1))):
+            muertos[nombre] = datos
+
+    if muertos:
+        fundidas = _sumar({}, _leer_json(acumuladas) or [])
+        for datos in muertos.values():
+            _sumar(fundidas, datos)
+        # Primero se guarda lo fundido y después se borran los archivos: si el
+        # proceso muere entre medio, un contador puede contarse de más, nunca de menos
+        _escribir_json(acumuladas, [{'vista': vista, 'metodo': metodo, **ruta} for (vista, metodo), ruta in fundidas.items()])
+        for nombre in muertos:
+            os.remove(nombre)
+    return total
+
+
+# FORMATO DE TEXTO DE PROMETHEUS #
+
+def _etiquetas(**valores):
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def texto_prometheus(extras=None):
+    lineas = []
+
+    def metrica(nombre, tipo, ayuda):
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+
+    rutas = sorted(metricas_agregadas().items())
+
+    metrica('wm_http_request_duration_seconds', 'histogram', 'Latencia de las peticiones por vista.')
+    for (vista, metodo), ruta in rutas:
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_LATENCIA, ruta['buckets']):
+            acumulado += cantidad
+            lineas.append(f'wm_http_request_duration_seconds_bucket{_etiquetas(view=vista, method=metodo, le=limite)} {acumulado}')
+        lineas.append(f'wm_http_request_duration_seconds_bucket{_etiquetas(view=vista, method=metodo, le="+Inf")} {ruta["count"]}')
+        lineas.append(f'wm_http_request_duration_seconds_sum{_etiquetas(view=vista, method=metodo)} {ruta["sum"]:.6f}')
+        lineas.append(f'wm_http_request_duration_seconds_count{_etiquetas(view=vista, method=metodo)} {ruta["count"]}')
+
+    metrica('wm_http_responses_total', 'counter', 'Respuestas por vista y código de estado.')
+    for (vista, metodo), ruta in rutas:
+        for estado, cantidad in sorted(ruta['estados'].items()):
+            lineas.append(f'wm_http_responses_total{_etiquetas(view=vista, method=metodo, status=estado)} {cantidad}')
+
+    for nombre, campo, ayuda, formato in (
+        ('wm_db_queries_total', 'consultas', 'Consultas SQL ejecutadas por vista.', '{}'),
+        ('wm_db_duration_seconds_total', 'segundos_bd', 'Tiempo en la base de datos por vista.', '{:.6f}'),
+        ('wm_http_response_bytes_total', 'bytes', 'Bytes de respuesta serializados por vista.', '{}'),
+    ):
+        metrica(nombre, 'counter', ayuda)
+        for (vista, metodo), ruta in rutas:
+            lineas.append(f'{nombre}{_etiquetas(view=vista, method=metodo)} {formato.format(ruta[campo])}')
+
+    # Valores sueltos (caché del catálogo, lista negra de tokens, ...)
+    for nombre, (tipo, ayuda, valor) in (extras or {}).items():
+        metrica(nombre, tipo, ayuda)
+        lineas.append(f'{nombre} {valor}')
+
+    return '\n'.join(lineas) + '\n'
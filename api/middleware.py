@@ -0,0 +1,69 @@
+import time
+
+from django.db import connections
+
+from .db_routers import fijar_a_primario, replicas
+from .metricas import registro
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+# Tras una escritura exitosa de un usuario autenticado, sus lecturas
+# siguientes van al primario (ver api/db_routers.py)
+class FijarPrimarioMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replicas():
+            # DRF deja en el request original el usuario autenticado con JWT
+            usuario = getattr(request, 'user', None)
+            if usuario is not None and usuario.is_authenticated:
+                fijar_a_primario(usuario.id)
+        return response
+
+
+# Mide cada petición: latencia, código de estado, consultas y tiempo en la
+# base de datos (con execute_wrapper) y tamaño de la respuesta, por vista.
+# Debe ir primero en MIDDLEWARE para cubrir a los demás.
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = _MedicionBD()
+        # Equivale a connection.execute_wrapper() en cada base, sin el costo de los context managers
+        conexiones = connections.all()
+        for conexion in conexiones:
+            conexion.execute_wrappers.append(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            for conexion in conexiones:
+                conexion.execute_wrappers.remove(medicion)
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        tamano = 0 if response.streaming else len(response.content)
+        registro.observar(
+            vista, request.method, response.status_code, duracion, medicion.consultas, medicion.segundos, tamano
+        )
+        return response
+
+
+class _MedicionBD:
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos += time.perf_counter() - inicio
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_compra_total'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='producto_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'fecha_creacion', 'id'], name='producto_cat_fecha_id_idx'),
+        ),
+    ]
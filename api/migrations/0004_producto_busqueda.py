@@ -0,0 +1,109 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:18
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# PostgreSQL: columna tsvector con índice GIN, actualizada por un trigger
+# (nombre con peso A, descripción con peso B).
+POSTGRES_CREAR = [
+    """
+    CREATE FUNCTION api_producto_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('pg_catalog.spanish', coalesce(NEW.nombre, '')), 'A') ||
+            setweight(to_tsvector('pg_catalog.spanish', coalesce(NEW.descripcion, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER api_producto_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF nombre, descripcion ON api_producto
+    FOR EACH ROW EXECUTE FUNCTION api_producto_search_vector_update();
+    """,
+    "UPDATE api_producto SET nombre = nombre;",
+    "CREATE INDEX api_producto_search_gin ON api_producto USING gin (search_vector);",
+]
+
+POSTGRES_ELIMINAR = [
+    "DROP INDEX IF EXISTS api_producto_search_gin;",
+    "DROP TRIGGER IF EXISTS api_producto_search_vector_trigger ON api_producto;",
+    "DROP FUNCTION IF EXISTS api_producto_search_vector_update();",
+]
+
+# SQLite: tabla FTS5 de contenido externo sincronizada con triggers.
+SQLITE_CREAR = [
+    """
+    CREATE VIRTUAL TABLE api_producto_fts USING fts5(
+        nombre, descripcion,
+        content='api_producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    """,
+    """
+    CREATE TRIGGER api_producto_fts_ai AFTER INSERT ON api_producto BEGIN
+        INSERT INTO api_producto_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END;
+    """,
+    """
+    CREATE TRIGGER api_producto_fts_ad AFTER DELETE ON api_producto BEGIN
+        INSERT INTO api_producto_fts(api_producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END;
+    """,
+    """
+    CREATE TRIGGER api_producto_fts_au AFTER UPDATE OF nombre, descripcion ON api_producto BEGIN
+        INSERT INTO api_producto_fts(api_producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO api_producto_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END;
+    """,
+    "INSERT INTO api_producto_fts(api_producto_fts) VALUES ('rebuild');",
+]
+
+SQLITE_ELIMINAR = [
+    "DROP TRIGGER IF EXISTS api_producto_fts_au;",
+    "DROP TRIGGER IF EXISTS api_producto_fts_ad;",
+    "DROP TRIGGER IF EXISTS api_producto_fts_ai;",
+    "DROP TABLE IF EXISTS api_producto_fts;",
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_CREAR)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_CREAR)
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_ELIMINAR)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_ELIMINAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_producto_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
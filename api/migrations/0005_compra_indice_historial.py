@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='compra_cliente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:51
+
+from importlib import import_module
+
+import api.storage
+from django.db import migrations, models
+
+
+# En SQLite el AlterField rehace la tabla api_producto y se pierden los
+# triggers que mantienen el índice FTS de la búsqueda (ver 0004). Se
+# recrean después del AlterField, en los dos sentidos: al aplicar con la
+# operación que lo sigue y al revertir con la que lo precede.
+def recrear_triggers_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    busqueda = import_module('api.migrations.0004_producto_busqueda')
+    triggers = [sql for sql in busqueda.SQLITE_ELIMINAR if 'TRIGGER' in sql]
+    for sql in triggers + busqueda.SQLITE_CREAR[1:]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_producto_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('tamano', models.PositiveBigIntegerField(default=0)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_busqueda),
+        migrations.AlterField(
+            model_name='producto',
+            name='imagen',
+            field=models.ImageField(default='productos/default.jpg', storage=api.storage.ContenidoHashStorage(), upload_to='productos/'),
+        ),
+        migrations.RunPython(recrear_triggers_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:55
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# En SQLite el AddField (y al revertir, el RemoveField) rehace api_producto (ver 0008)
+def recrear_triggers_busqueda(apps, schema_editor):
+    import_module('api.migrations.0008_media_por_contenido').recrear_triggers_busqueda(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_media_por_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_busqueda),
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(recrear_triggers_busqueda, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['actualizado', 'stock'], name='producto_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'actualizado'], name='producto_cat_actualizado_idx'),
+        ),
+    ]
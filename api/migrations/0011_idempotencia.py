@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_tareas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255)),
+                ('huella', models.CharField(max_length=64)),
+                ('estado', models.CharField(choices=[('en_curso', 'En curso'), ('completada', 'Completada')], default='en_curso', max_length=20)),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('cuerpo', models.TextField(blank=True)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField()),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expira'], name='idempotencia_expira_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'clave'), name='idempotencia_usuario_clave_uniq')],
+            },
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.utils.text import slugify
 from django.conf import settings
+from django.utils import timezone
+
+from .storage import ContenidoHashStorage
 
 # Modelo ProductoEnCarrito (debe ser definido antes de Carrito)
 class ProductoEnCarrito(models.Model):
@@ -29,6 +33,8 @@ class Categoria(models.Model):
     
     nombre = models.CharField(max_length=255, choices=CATEGORIA_CHOICES)
     slug = models.SlugField(unique=True, null=True, blank=True)
+    # Para las validaciones condicionales (ETag / Last-Modified)
+    actualizado = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre
@@ -45,10 +51,34 @@ class Producto(models.Model):
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=3)
     stock = models.PositiveIntegerField()
-    imagen = models.ImageField(upload_to='productos/', null=False, default='productos/default.jpg')
+    # Se guarda con el hash del contenido como nombre (ver api/storage.py)
+    imagen = models.ImageField(upload_to='productos/', null=False, default='productos/default.jpg', storage=ContenidoHashStorage())
     slug = models.SlugField(unique=True, null=True, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Lo actualizan save() y las escrituras masivas (compras, importación); ver api/cache.py
+    actualizado = models.DateTimeField(auto_now=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, default=1)
+    # Documento de búsqueda (nombre + descripción); lo mantiene un trigger de la base de datos
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # Índices para la paginación por cursor sobre (fecha_creacion, id)
+        # y para cada ordenamiento del catálogo (?ordering=), con y sin ?categoria=
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id'], name='producto_fecha_id_idx'),
+            models.Index(fields=['categoria', 'fecha_creacion', 'id'], name='producto_cat_fecha_id_idx'),
+            models.Index(fields=['precio', 'id'], name='producto_precio_id_idx'),
+            models.Index(fields=['categoria', 'precio', 'id'], name='producto_cat_precio_id_idx'),
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_id_idx'),
+            models.Index(fields=['categoria', 'nombre', 'id'], name='producto_cat_nombre_id_idx'),
+            # Parciales para ?en_stock=true (solo productos disponibles)
+            models.Index(fields=['fecha_creacion', 'id'], name='producto_stock_fecha_idx', condition=models.Q(stock__gt=0)),
+            models.Index(fields=['precio', 'id'], name='producto_stock_precio_idx', condition=models.Q(stock__gt=0)),
+            # MAX(actualizado) y COUNT(*) de las validaciones condicionales, solo con el índice
+            # (stock incluido para ?en_stock=true)
+            models.Index(fields=['actualizado', 'stock'], name='producto_actualizado_idx'),
+            models.Index(fields=['categoria', 'actualizado'], name='producto_cat_actualizado_idx'),
+        ]
 
     def total_precio(self):
         # Suponiendo que la cantidad es 1 por defecto
@@ -110,7 +140,14 @@ class Carrito(models.Model):
 
     @property
     def total(self):
-        return sum([producto.total_precio() for producto in self.productos_en_carrito.all()])
+        # Suma de precio * cantidad calculada en la base de datos
+        total = self.productoencarrito_set.aggregate(
+            total=models.Sum(
+                models.F('producto__precio') * models.F('cantidad'),
+                output_field=models.DecimalField(max_digits=20, decimal_places=3),
+            )
+        )['total']
+        return total or 0
 
     def __str__(self):
         return f"Carrito de {self.usuario.email}"
@@ -121,9 +158,18 @@ class Compra(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Historial de compras por cliente, de la más reciente a la más antigua
+        indexes = [
+            models.Index(fields=['cliente', '-fecha', '-id'], name='compra_cliente_fecha_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.total:
-            self.total = sum([item.precio * item.cantidad for item in self.productos_comprados.all()])
+        # Una compra nueva aún no tiene productos; el total se calcula cuando ya existen
+        if self.total is None and self.pk:
+            self.total = self.productos_comprados.aggregate(
+                total=models.Sum(models.F('precio') * models.F('cantidad'))
+            )['total']
         super().save(*args, **kwargs)
 
 
@@ -139,3 +185,124 @@ class ProductoComprado(models.Model):
 
     def __str__(self):
         return f"{self.nombre} x{self.cantidad}"
+
+
+# RESÚMENES DE VENTAS #
+# Tablas diarias que mantiene el comando actualizar_resumenes a partir de
+# Compra/ProductoComprado, para que los reportes no recorran todo el historial.
+
+class VentaDiaria(models.Model):
+    fecha = models.DateField(unique=True)
+    pedidos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.fecha}: {self.pedidos} pedidos"
+
+class VentaDiariaProducto(models.Model):
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('fecha', 'producto')
+
+class VentaDiariaCategoria(models.Model):
+    fecha = models.DateField()
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('fecha', 'categoria')
+
+# Última compra ya incluida en los resúmenes
+class MarcaResumen(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    ultima_compra_id = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre}: compra {self.ultima_compra_id}"
+
+
+# MEDIA #
+
+# Archivo guardado por contenido (ver api/storage.py) y cuántos productos lo
+# usan. Un archivo sin referencias se puede borrar con deduplicar_media --recolectar.
+class ArchivoMedia(models.Model):
+    nombre = models.CharField(max_length=255, unique=True)
+    tamano = models.PositiveBigIntegerField(default=0)
+    referencias = models.PositiveIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} referencias)"
+
+
+# COLA DE TAREAS #
+
+# Trabajo secundario que se ejecuta fuera de la petición (ver api/tareas.py).
+# Una tarea en curso tiene en `disponible_en` el vencimiento de su reclamo:
+# si el worker muere, otro la retoma después de esa fecha.
+class Tarea(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+
+    tipo = models.CharField(max_length=100)
+    datos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=[(PENDIENTE, 'Pendiente'), (EN_CURSO, 'En curso'), (COMPLETADA, 'Completada'), (FALLIDA, 'Fallida')],
+        default=PENDIENTE,
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    disponible_en = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_estado_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} ({self.estado})"
+
+
+# IDEMPOTENCIA #
+
+# Primera respuesta de una petición con cabecera Idempotency-Key, para
+# repetirla en los reintentos del cliente (ver api/idempotencia.py)
+class ClaveIdempotencia(models.Model):
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='+')
+    clave = models.CharField(max_length=255)
+    # Hash del método, la ruta y el cuerpo: la misma clave con otra petición es un error
+    huella = models.CharField(max_length=64)
+    estado = models.CharField(
+        max_length=20, choices=[(EN_CURSO, 'En curso'), (COMPLETADA, 'Completada')], default=EN_CURSO,
+    )
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    cuerpo = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='idempotencia_usuario_clave_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expira'], name='idempotencia_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.estado})"
@@ -0,0 +1,154 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+# Paginación por llave compuesta (keyset).
+# A diferencia de CursorPagination, la posición del cursor guarda el valor de
+# todos los campos del ordering (el último siempre es único, p. ej. 'id'), así
+# que nunca se usa offset y la página N cuesta lo mismo que la primera.
+class KeysetPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*[_invertir(campo) for campo in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._filtro_posicion(current_position, reverse, queryset.model))
+
+        # Siempre se pide un elemento extra para saber si hay otra página
+        results = list(queryset[:self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _filtro_posicion(self, position, reverse, modelo):
+        try:
+            valores = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valores, list) or len(valores) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        valores = [self._convertir(modelo, campo, valor) for campo, valor in zip(self.ordering, valores)]
+
+        # (a, b) > (x, y)  <=>  a >= x AND (a > x OR (a = x AND b > y))
+        # La condición redundante sobre el primer campo permite recorrer el índice por rango.
+        filtro = Q()
+        iguales = {}
+        for campo, valor in zip(self.ordering, valores):
+            nombre = campo.lstrip('-')
+            lookup = 'lt' if reverse != campo.startswith('-') else 'gt'
+            filtro |= Q(**iguales, **{f'{nombre}__{lookup}': valor})
+            iguales[nombre] = valor
+
+        primero = self.ordering[0]
+        lookup = 'lte' if reverse != primero.startswith('-') else 'gte'
+        return Q(**{f'{primero.lstrip("-")}__{lookup}': valores[0]}) & filtro
+
+    # El cursor viene del cliente: cada valor debe ser válido para su campo
+    # (una fecha, un número...) o la consulta fallaría con un 500
+    def _convertir(self, modelo, campo, valor):
+        try:
+            campo_modelo = modelo._meta.get_field(campo.lstrip('-'))
+        except FieldDoesNotExist:
+            # Anotaciones: no hay campo con el que validar
+            return valor
+        try:
+            if isinstance(valor, (dict, list)):
+                raise TypeError(valor)
+            return campo_modelo.to_python(valor)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        valores = []
+        for campo in ordering:
+            nombre = campo.lstrip('-')
+            if isinstance(instance, dict):
+                valor = instance[nombre]
+            else:
+                valor = getattr(instance, nombre)
+            valores.append(valor if isinstance(valor, int) else str(valor))
+        return json.dumps(valores)
+
+
+def _invertir(campo):
+    return campo[1:] if campo.startswith('-') else '-' + campo
+
+
+# Ordenamiento por ?ordering= que siempre termina en 'id' (en el mismo sentido
+# que el último campo), para que la posición de KeysetPagination sea única.
+class OrdenamientoEstable(OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering = [*ordering, '-id' if ordering[-1].startswith('-') else 'id']
+        return ordering
+
+
+# Catálogo: los productos más recientes primero
+class ProductoCursorPagination(KeysetPagination):
+    ordering = ('-fecha_creacion', '-id')
+    page_size = settings.PRODUCTOS_PAGE_SIZE
+    max_page_size = settings.PRODUCTOS_MAX_PAGE_SIZE
+
+
+# Historial de compras: las más recientes primero
+class CompraCursorPagination(KeysetPagination):
+    ordering = ('-fecha', '-id')
+    page_size = settings.HISTORIAL_PAGE_SIZE
+    max_page_size = settings.PRODUCTOS_MAX_PAGE_SIZE
+
+
+# Búsqueda: los resultados van por relevancia, así que se paginan por posición
+class ProductoBusquedaPagination(LimitOffsetPagination):
+    default_limit = settings.PRODUCTOS_PAGE_SIZE
+    max_limit = settings.PRODUCTOS_MAX_PAGE_SIZE
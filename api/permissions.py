@@ -3,6 +3,6 @@ from rest_framework import permissions
 class ProductoPermission(permissions.BasePermission):
     def has_permission(self, request, view):
         # Permitir solo a los administradores
-        if request.user.rol == 'admin':
+        if getattr(request.user, 'rol', None) == 'admin':
             return True
         return False
@@ -0,0 +1,74 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+
+# Tamaño aproximado (bytes) de cada bloque que se entrega al servidor WSGI
+TAMANO_BLOQUE = 64 * 1024
+
+
+# Serializa los objetos uno por uno y produce el arreglo JSON por bloques.
+# El resultado es idéntico al de JSONRenderer (mismo encoder y separadores),
+# pero nunca existe en memoria la lista completa.
+def json_en_streaming(objetos, serializar):
+    dumps_kwargs = {
+        'cls': encoders.JSONEncoder,
+        'ensure_ascii': JSONRenderer.ensure_ascii,
+        'allow_nan': not api_settings.STRICT_JSON,
+        'separators': (',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+    }
+    separador = dumps_kwargs['separators'][0]
+
+    bloque = ['[']
+    tamano = 1
+    primero = True
+    for objeto in objetos:
+        elemento = json.dumps(serializar(objeto), **dumps_kwargs)
+        # Igual que JSONRenderer: estos separadores no son válidos dentro de JavaScript
+        elemento = elemento.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        if not primero:
+            bloque.append(separador)
+        bloque.append(elemento)
+        tamano += len(elemento) + 1
+        primero = False
+        if tamano >= TAMANO_BLOQUE:
+            yield ''.join(bloque).encode('utf-8')
+            bloque, tamano = [], 0
+    bloque.append(']')
+    yield ''.join(bloque).encode('utf-8')
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    def __init__(self, contenido, **kwargs):
+        kwargs.setdefault('content_type', JSONRenderer.media_type)
+        super().__init__(contenido, **kwargs)
+
+
+# Mixin para ViewSets: las acciones en `streaming_actions` responden con el
+# arreglo JSON transmitido elemento por elemento, leyendo el queryset con
+# .iterator() en lugar de cargarlo completo. Solo cuando la negociación eligió
+# JSON; los demás formatos (?format=api) siguen por el camino normal.
+class StreamingListMixin:
+    streaming_actions = ()
+    streaming_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        if self.action not in self.streaming_actions or not isinstance(request.accepted_renderer, JSONRenderer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if hasattr(self, 'get_lectura'):
+            # Con LecturaListMixin se transmiten filas .values() ya convertidas
+            lectura = self.get_lectura()
+            queryset = queryset.values(*lectura.columnas)
+            serializar = lectura.fila
+        else:
+            # Una sola instancia del serializer: los campos se construyen una vez
+            # y to_representation se reutiliza para cada objeto
+            serializar = self.get_serializer().to_representation
+
+        objetos = queryset.iterator(chunk_size=self.streaming_chunk_size)
+        return StreamingJSONResponse(json_en_streaming(objetos, serializar))
@@ -0,0 +1,59 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+CONFIG_BUSQUEDA = 'spanish'
+MAX_TERMINOS = 8
+
+_palabra = re.compile(r'\w+', re.UNICODE)
+
+
+def _terminos(texto):
+    return _palabra.findall(texto.lower())[:MAX_TERMINOS]
+
+
+# Filtra el queryset de productos por texto libre (nombre y descripción) y
+# anota la relevancia en 'relevancia' (mayor es mejor). Cada término se busca
+# como prefijo, así "zapa" encuentra "zapatos".
+def buscar_productos(queryset, texto):
+    terminos = _terminos(texto)
+    if not terminos:
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField())).none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        consulta = SearchQuery(
+            ' & '.join(f'{termino}:*' for termino in terminos),
+            config=CONFIG_BUSQUEDA,
+            search_type='raw',
+        )
+        return queryset.filter(search_vector=consulta).annotate(
+            relevancia=SearchRank(F('search_vector'), consulta)
+        )
+
+    if vendor == 'sqlite':
+        # Índice FTS5 (api_producto_fts); bm25 es menor cuanto más relevante
+        expresion = ' '.join(f'"{termino}"*' for termino in terminos)
+        return queryset.filter(
+            id__in=RawSQL(
+                'SELECT rowid FROM api_producto_fts WHERE api_producto_fts MATCH %s',
+                (expresion,),
+            )
+        ).annotate(
+            relevancia=RawSQL(
+                'SELECT -bm25(api_producto_fts, 10.0, 1.0) FROM api_producto_fts '
+                'WHERE api_producto_fts MATCH %s AND rowid = api_producto.id',
+                (expresion,),
+                output_field=FloatField(),
+            )
+        )
+
+    # Otros motores: sin índice de texto, solo coincidencia simple
+    filtro = Q()
+    for termino in terminos:
+        filtro &= Q(nombre__icontains=termino) | Q(descripcion__icontains=termino)
+    return queryset.filter(filtro).annotate(relevancia=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,136 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .cache import incrementar_version_catalogo
+from .carrito import invalidar_snapshots
+from .models import Carrito, Categoria, Compra, Producto, ProductoComprado, ProductoEnCarrito, Usuario
+
+
+# Datos sintéticos para reproducir localmente volúmenes de producción.
+# Todos los usuarios generados comparten esta contraseña (se calcula un solo hash).
+CLAVE_SEMILLA = 'semilla-wm-123'
+PREFIJO_SEMILLA = 'seed'
+TAMANO_LOTE = 2000
+
+ADJETIVOS = ('Clásico', 'Urbano', 'Deportivo', 'Elegante', 'Casual', 'Vintage', 'Premium', 'Básico')
+PRENDAS = {
+    'hombre': ('Camisa', 'Pantalón', 'Chaqueta', 'Buzo', 'Jean', 'Bermuda'),
+    'mujer': ('Blusa', 'Vestido', 'Falda', 'Chaqueta', 'Jean', 'Top'),
+    'accesorio': ('Gorra', 'Cinturón', 'Bolso', 'Reloj', 'Gafas', 'Bufanda'),
+}
+
+
+def asegurar_categorias():
+    categorias = {}
+    for nombre, _ in Categoria.CATEGORIA_CHOICES:
+        categorias[nombre], _ = Categoria.objects.get_or_create(slug=nombre, defaults={'nombre': nombre})
+    return categorias
+
+
+def crear_usuarios(cantidad, aleatorio):
+    clave = make_password(CLAVE_SEMILLA)
+    inicio = Usuario.objects.filter(username__startswith=PREFIJO_SEMILLA).count()
+    usuarios = [
+        Usuario(
+            email=f'{PREFIJO_SEMILLA}{i}@example.com', username=f'{PREFIJO_SEMILLA}{i}', password=clave,
+            first_name=aleatorio.choice(('Ana', 'Luis', 'Sofía', 'Carlos', 'Valentina', 'Andrés')),
+            last_name=aleatorio.choice(('Gómez', 'Rodríguez', 'Martínez', 'López', 'Sánchez')),
+        )
+        for i in range(inicio, inicio + cantidad)
+    ]
+    return Usuario.objects.bulk_create(usuarios, batch_size=TAMANO_LOTE)
+
+
+def crear_productos(cantidad, categorias, aleatorio):
+    inicio = Producto.objects.filter(slug__startswith=PREFIJO_SEMILLA).count()
+    productos = []
+    for i in range(inicio, inicio + cantidad):
+        categoria = aleatorio.choice(list(categorias))
+        nombre = f'{aleatorio.choice(PRENDAS[categoria])} {aleatorio.choice(ADJETIVOS)} {i}'
+        productos.append(Producto(
+            nombre=nombre,
+            slug=slugify(f'{PREFIJO_SEMILLA}-{nombre}'),
+            descripcion=f'{nombre} de la colección {categoria}.',
+            precio=Decimal(aleatorio.randrange(19900, 399900, 100)) / 100,
+            stock=aleatorio.randint(0, 500),
+            categoria=categorias[categoria],
+        ))
+    return Producto.objects.bulk_create(productos, batch_size=TAMANO_LOTE)
+
+
+def crear_carritos(usuarios, productos, aleatorio, lineas_maximas=5):
+    carritos = Carrito.objects.bulk_create([Carrito(usuario=usuario) for usuario in usuarios], batch_size=TAMANO_LOTE)
+    lineas = []
+    for carrito in carritos:
+        for producto in aleatorio.sample(productos, min(len(productos), aleatorio.randint(1, lineas_maximas))):
+            lineas.append(ProductoEnCarrito(carrito=carrito, producto=producto, cantidad=aleatorio.randint(1, 3)))
+    ProductoEnCarrito.objects.bulk_create(lineas, batch_size=TAMANO_LOTE)
+    return carritos
+
+
+# Compras repartidas en los últimos `dias` días. `fecha` es auto_now_add,
+# así que se fija después con bulk_update.
+def crear_compras(cantidad, usuarios, productos, aleatorio, dias=365, lineas_maximas=4):
+    ahora = timezone.now()
+    creadas = 0
+    for desde in range(0, cantidad, TAMANO_LOTE):
+        detalle = []
+        compras = []
+        for _ in range(min(TAMANO_LOTE, cantidad - desde)):
+            elegidos = aleatorio.sample(productos, min(len(productos), aleatorio.randint(1, lineas_maximas)))
+            lineas = [(producto, aleatorio.randint(1, 3)) for producto in elegidos]
+            total = sum(producto.precio * cantidad_linea for producto, cantidad_linea in lineas)
+            compras.append(Compra(cliente=aleatorio.choice(usuarios), total=total))
+            detalle.append(lineas)
+
+        compras = Compra.objects.bulk_create(compras)
+        for compra in compras:
+            compra.fecha = ahora - timedelta(seconds=aleatorio.randint(0, dias * 86400))
+        Compra.objects.bulk_update(compras, ['fecha'], batch_size=TAMANO_LOTE)
+
+        ProductoComprado.objects.bulk_create(
+            [
+                ProductoComprado(
+                    compra=compra, producto=producto, nombre=producto.nombre,
+                    precio=producto.precio, cantidad=cantidad_linea,
+                )
+                for compra, lineas in zip(compras, detalle)
+                for producto, cantidad_linea in lineas
+            ],
+            batch_size=TAMANO_LOTE,
+        )
+        creadas += len(compras)
+    return creadas
+
+
+def sembrar(usuarios=100, productos=1000, carritos=50, compras=1000, dias=365, semilla=None):
+    aleatorio = random.Random(semilla)
+    with transaction.atomic():
+        categorias = asegurar_categorias()
+        nuevos_usuarios = crear_usuarios(usuarios, aleatorio)
+        nuevos_productos = crear_productos(productos, categorias, aleatorio)
+
+        todos_usuarios = nuevos_usuarios or list(Usuario.objects.filter(username__startswith=PREFIJO_SEMILLA))
+        todos_productos = nuevos_productos or list(Producto.objects.filter(slug__startswith=PREFIJO_SEMILLA))
+
+        # Solo usuarios que aún no tienen carrito
+        con_carrito = set(Carrito.objects.filter(usuario__in=todos_usuarios).values_list('usuario_id', flat=True))
+        sin_carrito = [usuario for usuario in todos_usuarios if usuario.id not in con_carrito]
+        nuevos_carritos = crear_carritos(sin_carrito[:carritos], todos_productos, aleatorio) if todos_productos else []
+        nuevas_compras = crear_compras(compras, todos_usuarios, todos_productos, aleatorio, dias) if todos_productos and todos_usuarios else 0
+
+    # bulk_create no dispara señales
+    incrementar_version_catalogo()
+    invalidar_snapshots([carrito.usuario_id for carrito in nuevos_carritos])
+    return {
+        'usuarios': len(nuevos_usuarios),
+        'productos': len(nuevos_productos),
+        'carritos': len(nuevos_carritos),
+        'compras': nuevas_compras,
+    }
@@ -1,8 +1,16 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from .models import Categoria, Carrito, ProductoEnCarrito, Compra, Producto, ProductoComprado
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from .imagenes import urls_derivados
+from .tareas import TAREA_DERIVADOS, encolar
+from .carrito import ACCIONES, AGREGAR, ACTUALIZAR
+from .tokens import TokenRefresco
+from .authentication import agregar_claims
 
 Usuario = get_user_model()
 
@@ -13,9 +21,12 @@ class CategoriaSerializer(serializers.ModelSerializer):
         
 # Serializer para el modelo Producto
 class ProductoSerializer(serializers.ModelSerializer):
+    # URLs de las versiones reducidas (200/480/1024 px en JPEG y WebP)
+    imagenes = serializers.SerializerMethodField()
+
     class Meta:
         model = Producto
-        fields = ['id', 'nombre', 'descripcion', 'precio', 'imagen', 'stock']# Asegura incluir 'id'
+        fields = ['id', 'nombre', 'descripcion', 'precio', 'imagen', 'stock', 'imagenes']# Asegura incluir 'id'
 
     
     def create(self, validated_data):
@@ -26,8 +37,19 @@ class ProductoSerializer(serializers.ModelSerializer):
             # Aquí deberías manejar la lógica para guardar la imagen
             producto.imagen = imagen
             producto.save()
+            # Los derivados los genera el worker de la cola (manage.py procesar_tareas)
+            encolar(TAREA_DERIVADOS, nombre=producto.imagen.name)
+
+        return producto
 
+    def update(self, instance, validated_data):
+        producto = super().update(instance, validated_data)
+        if validated_data.get('imagen'):
+            encolar(TAREA_DERIVADOS, nombre=producto.imagen.name)
         return producto
+
+    def get_imagenes(self, obj):
+        return urls_derivados(obj.imagen.name if obj.imagen else None, self.context.get('request'))
     
     def validate_imagen(self, value):
         # Verifica si el archivo es una imagen
@@ -87,6 +109,22 @@ class ProductoEnCarritoSerializer(serializers.ModelSerializer):
         model = ProductoEnCarrito
         fields = ['producto', 'cantidad']
 
+# Operación de un lote de cambios al carrito
+class OperacionCarritoSerializer(serializers.Serializer):
+    accion = serializers.ChoiceField(choices=ACCIONES)
+    producto = serializers.IntegerField(min_value=1)
+    cantidad = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, data):
+        if data['accion'] == AGREGAR:
+            data.setdefault('cantidad', 1)
+        elif data['accion'] == ACTUALIZAR and 'cantidad' not in data:
+            raise serializers.ValidationError({'cantidad': 'La cantidad es requerida para actualizar.'})
+        return data
+
+class OperacionesCarritoSerializer(serializers.Serializer):
+    operaciones = OperacionCarritoSerializer(many=True, allow_empty=False, max_length=200)
+
 class ProductoCompradoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductoComprado
@@ -116,3 +154,30 @@ class CompraSerializer(serializers.ModelSerializer):
         compra.total = total  # Asignamos el total calculado
         compra.save()
         return compra
+
+# /api/token/refresh/: misma rotación y lista negra, revisada con el filtro de
+# api/tokens.py. Los claims de usuario se vuelven a tomar de la fila en cada
+# refresco (simplejwt los copiaría del token viejo): un admin degradado deja
+# de serlo cuando vence su access token.
+class TokenRefrescoSerializer(TokenRefreshSerializer):
+    token_class = TokenRefresco
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        usuario = get_user_model().objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh.payload.get(jwt_settings.USER_ID_CLAIM)}
+        ).first()
+        if usuario is None or not jwt_settings.USER_AUTHENTICATION_RULE(usuario):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        agregar_claims(refresh, usuario)
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import olvidar_usuario
+from .cache import incrementar_version_catalogo
+from .carrito import invalidar_snapshots
+from .media import ajustar_referencias
+from .models import Carrito, Categoria, Producto, ProductoEnCarrito, Usuario
+
+
+# Cualquier cambio en productos o categorías invalida las respuestas cacheadas del catálogo
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_catalogo(sender, **kwargs):
+    incrementar_version_catalogo()
+
+
+# Un cambio de precio (o nombre) de un producto deja obsoletos los carritos que lo contienen
+@receiver(post_save, sender=Producto)
+@receiver(pre_delete, sender=Producto)
+def invalidar_carritos_con_producto(sender, instance, **kwargs):
+    usuario_ids = list(
+        ProductoEnCarrito.objects.filter(producto=instance).values_list('carrito__usuario_id', flat=True)
+    )
+    if usuario_ids:
+        transaction.on_commit(lambda: invalidar_snapshots(usuario_ids))
+
+
+# Un carrito nuevo reemplaza el snapshot de "carrito no encontrado"
+@receiver(post_save, sender=Carrito)
+def invalidar_carrito_creado(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: invalidar_snapshots([instance.usuario_id]))
+
+
+# La caché local de usuarios no debe seguir sirviendo datos viejos en este proceso
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def olvidar_usuario_modificado(sender, instance, **kwargs):
+    olvidar_usuario(instance.pk)
+
+
+# Referencias de las imágenes guardadas por contenido (ver api/media.py)
+@receiver(pre_save, sender=Producto)
+def guardar_imagen_anterior(sender, instance, update_fields=None, **kwargs):
+    instance._imagen_anterior = None
+    if instance.pk and (update_fields is None or 'imagen' in update_fields):
+        instance._imagen_anterior = (
+            Producto.objects.filter(pk=instance.pk).values_list('imagen', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Producto)
+def contar_referencia_imagen(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'imagen' in update_fields:
+        ajustar_referencias(getattr(instance, '_imagen_anterior', None), instance.imagen.name)
+
+
+@receiver(post_delete, sender=Producto)
+def descontar_referencia_imagen(sender, instance, **kwargs):
+    ajustar_referencias(instance.imagen.name, None)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Los archivos guardados por contenido nunca cambian: se pueden cachear un año
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+# 'productos/3f/3fa9...e1.jpeg' y sus derivados 'productos/3f/derivados/3fa9...e1_480.webp'
+PATRON_INMUTABLE = r'(?:[\w-]+/)*[0-9a-f]{2}/(?:derivados/)?[0-9a-f]{64}(?:_\d+)?\.\w+'
+_inmutable = re.compile(PATRON_INMUTABLE)
+
+
+def es_inmutable(nombre):
+    return bool(nombre) and _inmutable.fullmatch(nombre) is not None
+
+
+def hash_contenido(content):
+    sha = hashlib.sha256()
+    for bloque in content.chunks():
+        sha.update(bloque)
+    return sha.hexdigest()
+
+
+# 'productos/foto.JPEG' + sha256 -> 'productos/3f/3fa9...e1.jpeg'
+def nombre_por_contenido(nombre, sha):
+    carpeta, archivo = posixpath.split(nombre)
+    extension = posixpath.splitext(archivo)[1].lower()
+    return posixpath.join(carpeta, sha[:2], f'{sha}{extension}')
+
+
+# Guarda cada archivo con el hash SHA-256 de su contenido como nombre. Dos
+# subidas iguales terminan en el mismo archivo (se escribe una sola vez) y la
+# URL de un archivo nunca cambia de contenido. Las referencias se cuentan en
+# ArchivoMedia (ver api/media.py).
+@deconstructible
+class ContenidoHashStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo depende del contenido y se decide en _save
+        return name
+
+    def _save(self, name, content):
+        nombre = nombre_por_contenido(name, hash_contenido(content))
+        destino = self.path(nombre)
+        if os.path.exists(destino):
+            return nombre
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Se escribe en un temporal y se renombra: dos subidas simultáneas del
+        # mismo archivo dejan el mismo contenido y nunca se sirve uno a medias
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino))
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                for bloque in content.chunks():
+                    archivo.write(bloque)
+            os.chmod(temporal, self.file_permissions_mode or 0o644)
+            os.replace(temporal, destino)
+        except Exception:
+            os.unlink(temporal)
+            raise
+        return nombre
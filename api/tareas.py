@@ -0,0 +1,167 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .analitica import actualizar_resumenes
+from .imagenes import es_derivado, generar_derivados
+from .media import publicar_derivados
+from .models import Tarea
+
+
+logger = logging.getLogger(__name__)
+
+TAREA_RESUMENES = 'resumenes_ventas'
+TAREA_DERIVADOS = 'derivados_imagen'
+
+
+# REGISTRO #
+
+# tipo -> (función, agrupar). Con agrupar=True una ejecución exitosa también
+# completa las demás tareas del mismo tipo que ya estaban disponibles (la
+# función procesa todo lo pendiente, no solo lo de su tarea).
+_registro = {}
+
+
+def tarea(tipo, agrupar=False):
+    def decorador(funcion):
+        _registro[tipo] = (funcion, agrupar)
+        return funcion
+    return decorador
+
+
+# Se guarda en la misma transacción que la petición: si esta se revierte,
+# la tarea tampoco existe
+def encolar(tipo, retraso=0, max_intentos=None, **datos):
+    if tipo not in _registro:
+        raise ValueError(f'Tipo de tarea desconocido: {tipo}')
+    return Tarea.objects.create(
+        tipo=tipo,
+        datos=datos,
+        disponible_en=timezone.now() + timedelta(seconds=retraso),
+        max_intentos=max_intentos or settings.TAREAS_MAX_INTENTOS,
+    )
+
+
+# WORKER #
+
+# Reclama hasta `cantidad` tareas disponibles. En PostgreSQL SKIP LOCKED
+# reparte las filas entre workers sin esperas; el UPDATE condicionado a
+# `intentos` evita además reclamar dos veces en bases sin FOR UPDATE (SQLite).
+def reclamar(cantidad=1):
+    ahora = timezone.now()
+    reclamadas = []
+    with transaction.atomic():
+        candidatas = list(
+            Tarea.objects.select_for_update(skip_locked=True)
+            .filter(estado__in=(Tarea.PENDIENTE, Tarea.EN_CURSO), disponible_en__lte=ahora)
+            .order_by('disponible_en', 'id')[:cantidad]
+        )
+        for candidata in candidatas:
+            # Reclamo vencido en el último intento: el worker murió (o tardó
+            # más que TAREAS_VISIBILIDAD) sin terminarla, no se vuelve a intentar
+            if candidata.estado == Tarea.EN_CURSO and candidata.intentos >= candidata.max_intentos:
+                fallida = Tarea.objects.filter(pk=candidata.pk, intentos=candidata.intentos, estado=Tarea.EN_CURSO).update(
+                    estado=Tarea.FALLIDA,
+                    error=f'El reclamo venció en el intento {candidata.intentos} sin que la tarea terminara',
+                    actualizada=ahora,
+                )
+                if fallida:
+                    logger.error('La tarea %s falló definitivamente tras %s intentos', candidata, candidata.intentos)
+                continue
+            reclamada = Tarea.objects.filter(pk=candidata.pk, intentos=candidata.intentos).update(
+                estado=Tarea.EN_CURSO,
+                intentos=F('intentos') + 1,
+                disponible_en=ahora + timedelta(seconds=settings.TAREAS_VISIBILIDAD),
+                actualizada=ahora,
+            )
+            if reclamada:
+                candidata.estado = Tarea.EN_CURSO
+                candidata.intentos += 1
+                reclamadas.append(candidata)
+    return reclamadas
+
+
+# Espera exponencial con ±20% de variación para no reintentar todas a la vez
+def espera_reintento(intentos):
+    espera = min(settings.TAREAS_BACKOFF_BASE * 2 ** (intentos - 1), settings.TAREAS_BACKOFF_MAX)
+    return espera * random.uniform(0.8, 1.2)
+
+
+def ejecutar(tarea):
+    inicio = timezone.now()
+    # Solo se actualiza si nadie más la retomó (p. ej. tras vencer el reclamo)
+    propia = Tarea.objects.filter(pk=tarea.pk, intentos=tarea.intentos, estado=Tarea.EN_CURSO)
+    try:
+        if tarea.tipo not in _registro:
+            raise LookupError(f'Tipo de tarea desconocido: {tarea.tipo}')
+        funcion, agrupar = _registro[tarea.tipo]
+        funcion(**tarea.datos)
+    except Exception:
+        error = traceback.format_exc()
+        if tarea.intentos >= tarea.max_intentos:
+            logger.error('La tarea %s falló definitivamente tras %s intentos', tarea, tarea.intentos)
+            propia.update(estado=Tarea.FALLIDA, error=error, actualizada=timezone.now())
+        else:
+            propia.update(
+                estado=Tarea.PENDIENTE,
+                disponible_en=timezone.now() + timedelta(seconds=espera_reintento(tarea.intentos)),
+                error=error,
+                actualizada=timezone.now(),
+            )
+        return False
+
+    propia.update(estado=Tarea.COMPLETADA, error='', actualizada=timezone.now())
+    if agrupar:
+        Tarea.objects.filter(tipo=tarea.tipo, estado=Tarea.PENDIENTE, disponible_en__lte=inicio).update(
+            estado=Tarea.COMPLETADA, actualizada=timezone.now(),
+        )
+    return True
+
+
+# Bucle de un worker: reclama y ejecuta hasta que se active `detener` (o,
+# con una_vez=True, hasta que no queden tareas disponibles).
+def trabajar(detener, lote=1, espera=1.0, una_vez=False):
+    completadas = fallidas = 0
+    while not detener.is_set():
+        tareas = reclamar(lote)
+        if not tareas:
+            if una_vez:
+                break
+            detener.wait(espera)
+            continue
+        for tarea in tareas:
+            if ejecutar(tarea):
+                completadas += 1
+            else:
+                fallidas += 1
+    return completadas, fallidas
+
+
+def purgar_completadas(dias=None):
+    dias = settings.TAREAS_CONSERVAR_DIAS if dias is None else dias
+    limite = timezone.now() - timedelta(days=dias)
+    return Tarea.objects.filter(estado=Tarea.COMPLETADA, actualizada__lt=limite).delete()[0]
+
+
+def estadisticas_tareas():
+    conteos = dict(Tarea.objects.values_list('estado').annotate(total=Count('id')).order_by())
+    return {estado: conteos.get(estado, 0) for estado in (Tarea.PENDIENTE, Tarea.EN_CURSO, Tarea.FALLIDA)}
+
+
+# TAREAS #
+
+@tarea(TAREA_RESUMENES, agrupar=True)
+def _actualizar_resumenes():
+    actualizar_resumenes()
+
+
+@tarea(TAREA_DERIVADOS)
+def _generar_derivados(nombre):
+    if nombre and not es_derivado(nombre) and generar_derivados(str(settings.MEDIA_ROOT), nombre):
+        publicar_derivados([nombre])
@@ -1,3 +1,1270 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from base64 import b64encode
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .analitica import actualizar_resumenes, reconstruir_resumenes, verificar_resumenes
+from .cache import CAMBIO_RECIENTE_KEY
+from .carrito import actualizar_snapshot_carrito, snapshot_desde_bd, snapshot_key, subir_version_carrito
+from .checks import verificar_cache_compartida
+from .compras import CarritoVacio, registrar_compra_carrito
+from .db_routers import ReplicaRouter, fijado_a_primario, lectura_en_primario, lectura_en_replica
+from .imagenes import ruta_derivado
+from .lectura import ProductoLectura, SerializadorLectura
+from .limites import VentanaDeslizanteThrottle, ranura_hash
+from .media import recolectar_huerfanos
+from .metricas import metricas_agregadas, registro
+from .models import ArchivoMedia, Carrito, Categoria, ClaveIdempotencia, Compra, Producto, ProductoEnCarrito, Tarea, Usuario, VentaDiaria
+from .semilla import CLAVE_SEMILLA
+from .serializers import CategoriaSerializer, ProductoSerializer, RegistroUsuarioSerializer
+from .tareas import TAREA_DERIVADOS, TAREA_RESUMENES, _registro, encolar, reclamar, tarea, trabajar
+from .tokens import VERSION_BLACKLIST_KEY, lista_negra
+from .views import media_inmutable
+
+
+class BaseAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            email='cliente@example.com', password='secreta123', username='cliente'
+        )
+        self.categoria = Categoria.objects.create(nombre='hombre')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def crear_productos(self, cantidad, precio='10.00', stock=5):
+        inicio = Producto.objects.count()
+        return [
+            Producto.objects.create(
+                nombre=f'Producto {i}', descripcion='Descripción', precio=Decimal(precio),
+                stock=stock, categoria=self.categoria,
+            )
+            for i in range(inicio, inicio + cantidad)
+        ]
+
+    def llenar_carrito(self, productos, cantidad=2):
+        carrito, _ = Carrito.objects.get_or_create(usuario=self.usuario)
+        ProductoEnCarrito.objects.bulk_create([
+            ProductoEnCarrito(carrito=carrito, producto=producto, cantidad=cantidad)
+            for producto in productos
+        ])
+        return carrito
+
+
+class PaginacionCatalogoTests(BaseAPITestCase):
+    def pagina(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_recorre_paginas_con_fechas_empatadas(self):
+        productos = self.crear_productos(7)
+        Producto.objects.update(fecha_creacion=timezone.now())
+
+        paginas = []
+        url = '/api/productos/?page_size=2'
+        while url:
+            datos = self.pagina(url)
+            paginas.append([fila['id'] for fila in datos['results']])
+            url = datos['next']
+
+        # Con la fecha empatada decide el id, sin repetir ni saltar productos
+        self.assertEqual(sum(paginas, []), sorted((p.id for p in productos), reverse=True))
+        self.assertEqual([len(ids) for ids in paginas], [2, 2, 2, 1])
+
+        # 'previous' desde la última página devuelve la anterior
+        self.assertEqual([fila['id'] for fila in self.pagina(datos['previous'])['results']], paginas[-2])
+
+    def test_cursor_invalido(self):
+        self.crear_productos(3)
+        for cursor in ('no-es-base64!', b64encode(b'p=no-es-json').decode(), b64encode(b'p=[1]').decode()):
+            response = self.client.get('/api/productos/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+        # Forma correcta pero valores que no son del tipo de cada campo
+        for posicion in (['no-es-fecha', 1], [{'a': 1}, 1], ['2020-01-01T00:00:00', 'x']):
+            cursor = b64encode(f'p={json.dumps(posicion)}'.encode()).decode()
+            response = self.client.get('/api/productos/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, posicion)
+
+
+class CacheCatalogoTests(BaseAPITestCase):
+    def test_acierto_fallo_e_invalidacion(self):
+        producto, _ = self.crear_productos(2)
+        self.assertEqual(self.client.get('/api/productos/')['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/productos/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual((response['X-Cache'], response['Content-Encoding'], len(consultas)), ('HIT', 'gzip', 0))
+
+        # Un cambio en el catálogo sube la versión y la respuesta se regenera
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.nombre = 'Renombrado'
+            producto.save()
+        response = self.client.get('/api/productos/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Renombrado', [fila['nombre'] for fila in json.loads(response.content)['results']])
+
+    def test_llave_por_host(self):
+        self.crear_productos(3)
+        self.client.get('/api/productos/?page_size=1')
+        response = self.client.get('/api/productos/?page_size=1', HTTP_HOST='wmsiteweb.xyz')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(json.loads(response.content)['next'].startswith('http://wmsiteweb.xyz/'))
+
+    def test_aviso_sin_cache_compartida(self):
+        self.assertEqual([aviso.id for aviso in verificar_cache_compartida(None)], ['api.W001'])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(verificar_cache_compartida(None), [])
+
+
+class BusquedaRelevanciaTests(BaseAPITestCase):
+    def test_prefijos_acentos_y_relevancia(self):
+        en_nombre, en_descripcion, sin_relacion = self.crear_productos(3)
+        Producto.objects.filter(pk=en_nombre.pk).update(nombre='Zapatos de cuero', descripcion='Clásicos')
+        Producto.objects.filter(pk=en_descripcion.pk).update(nombre='Cinturón', descripcion='Combina con zapatos')
+        Producto.objects.filter(pk=sin_relacion.pk).update(nombre='Gorra', descripcion='Algodón')
+
+        def buscar(texto):
+            datos = json.loads(self.client.get('/api/productos/', {'q': texto}).content)
+            return [fila['id'] for fila in datos['results']]
+
+        # Prefijo, y el nombre pesa más que la descripción
+        self.assertEqual(buscar('zapa'), [en_nombre.id, en_descripcion.id])
+        # Sin distinguir acentos ni mayúsculas; todos los términos deben aparecer
+        self.assertEqual(buscar('CLASICOS cuero'), [en_nombre.id])
+        self.assertEqual(buscar('algodon'), [sin_relacion.id])
+        self.assertEqual(buscar('zapatos gorra'), [])
+
+
+class ImagenesDerivadasTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=self.media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_genera_derivados_y_publica_sus_urls(self):
+        # PNG con la mitad izquierda transparente
+        png = Image.new('RGBA', (600, 300), (200, 30, 30, 255))
+        png.paste((0, 0, 0, 0), (0, 0, 300, 300))
+        contenido = BytesIO()
+        png.save(contenido, format='PNG')
+        producto, sin_imagen = self.crear_productos(2)
+        producto.imagen.save('logo.png', ContentFile(contenido.getvalue()))
+
+        def imagenes():
+            datos = json.loads(self.client.get('/api/productos/').content)
+            return {fila['id']: fila['imagenes'] for fila in datos['results']}
+
+        # Mientras no existan los derivados no se anuncian
+        self.assertEqual(imagenes(), {producto.id: None, sin_imagen.id: None})
+
+        encolar(TAREA_DERIVADOS, nombre=producto.imagen.name)
+        trabajar(threading.Event(), una_vez=True)
+
+        urls = imagenes()
+        self.assertIsNone(urls[sin_imagen.id])
+        self.assertTrue(urls[producto.id]['480']['webp'].endswith(ruta_derivado(producto.imagen.name, 480, 'webp')))
+        detalle = json.loads(self.client.get(f'/api/productos/{producto.id}/').content)
+        self.assertEqual(detalle['imagenes'], urls[producto.id])
+
+        def ruta(formato):
+            return os.path.join(self.media.name, ruta_derivado(producto.imagen.name, 200, formato))
+        with Image.open(ruta('jpeg')) as jpeg, Image.open(ruta('webp')) as webp:
+            self.assertEqual(jpeg.size, (200, 100))
+            # La parte transparente queda blanca en JPEG y transparente en WebP
+            self.assertGreater(min(jpeg.convert('RGB').getpixel((10, 50))), 240)
+            self.assertEqual(webp.convert('RGBA').getpixel((10, 50))[3], 0)
+
+
+class RegistrarCompraTests(BaseAPITestCase):
+    def test_crea_compra_y_descuenta_stock(self):
+        productos = self.crear_productos(3, precio='12.50', stock=5)
+        self.llenar_carrito(productos, cantidad=2)
+
+        response = self.client.post('/api/registrar-compra/')
+
+        self.assertEqual(response.status_code, 201)
+        compra = Compra.objects.get(cliente=self.usuario)
+        self.assertEqual(compra.total, Decimal('75.00'))
+        self.assertEqual(compra.productos_comprados.count(), 3)
+        self.assertEqual(
+            list(Producto.objects.values_list('stock', flat=True).distinct()), [3]
+        )
+        self.assertFalse(ProductoEnCarrito.objects.exists())
+
+    def test_stock_insuficiente_no_modifica_nada(self):
+        productos = self.crear_productos(2, stock=1)
+        self.llenar_carrito(productos, cantidad=2)
+
+        response = self.client.post('/api/registrar-compra/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data['productos']), 2)
+        self.assertFalse(Compra.objects.exists())
+        self.assertEqual(ProductoEnCarrito.objects.count(), 2)
+        self.assertEqual(list(Producto.objects.values_list('stock', flat=True).distinct()), [1])
+
+    def test_consultas_constantes(self):
+        def contar_consultas(cantidad_productos):
+            ProductoEnCarrito.objects.all().delete()
+            self.llenar_carrito(self.crear_productos(cantidad_productos))
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.post('/api/registrar-compra/')
+            self.assertEqual(response.status_code, 201)
+            return len(consultas)
+
+        self.assertEqual(contar_consultas(1), contar_consultas(15))
+
+    def test_compra_repetida_encuentra_el_carrito_vacio(self):
+        productos = self.crear_productos(2, stock=10)
+        self.llenar_carrito(productos, cantidad=2)
+        carrito = Carrito.objects.get(usuario=self.usuario)
+
+        # El carrito se bloquea antes de leer las líneas
+        with CaptureQueriesContext(connection) as consultas:
+            registrar_compra_carrito(carrito)
+        tablas = [q['sql'].split(' FROM ')[1].split()[0].strip('"') for q in consultas if q['sql'].startswith('SELECT')]
+        self.assertEqual(tablas[:2], ['api_carrito', 'api_productoencarrito'])
+
+        # El segundo clic llega con la misma instancia del carrito
+        with self.assertRaises(CarritoVacio):
+            registrar_compra_carrito(carrito)
+        self.assertEqual(Compra.objects.count(), 1)
+        self.assertEqual(list(Producto.objects.values_list('stock', flat=True).distinct()), [8])
+
+
+class OperacionesCarritoTests(BaseAPITestCase):
+    def cantidades(self):
+        return dict(ProductoEnCarrito.objects.values_list('producto_id', 'cantidad'))
+
+    def test_aplica_lote_de_operaciones(self):
+        a, b, c = self.crear_productos(3)
+        self.llenar_carrito([a, c], cantidad=1)
+
+        response = self.client.post('/api/carrito/operaciones/', {'operaciones': [
+            {'accion': 'agregar', 'producto': a.id, 'cantidad': 2},
+            {'accion': 'agregar', 'producto': b.id},
+            {'accion': 'actualizar', 'producto': b.id, 'cantidad': 4},
+            {'accion': 'agregar', 'producto': b.id},
+            {'accion': 'eliminar', 'producto': c.id},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cantidades(), {a.id: 3, b.id: 5})
+
+    def test_agregar_dos_veces_incrementa(self):
+        producto, = self.crear_productos(1)
+        self.client.post(f'/api/agregar_al_carrito/{producto.id}/')
+        response = self.client.post(f'/api/agregar_al_carrito/{producto.id}/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.cantidades(), {producto.id: 2})
+
+    def test_producto_inexistente_no_aplica_nada(self):
+        producto, = self.crear_productos(1)
+
+        response = self.client.post('/api/carrito/operaciones/', {'operaciones': [
+            {'accion': 'agregar', 'producto': producto.id},
+            {'accion': 'agregar', 'producto': 9999},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['productos'], [9999])
+        self.assertEqual(self.cantidades(), {})
+
+
+class VerCarritoTests(BaseAPITestCase):
+    def test_totales_con_cantidades(self):
+        productos = self.crear_productos(2, precio='12.50')
+        self.llenar_carrito(productos, cantidad=3)
+
+        response = self.client.get('/api/ver-carrito/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], Decimal('75.000'))
+        self.assertEqual(
+            [linea['total_precio'] for linea in response.data['productos']],
+            [Decimal('37.500'), Decimal('37.500')],
+        )
+        carrito = Carrito.objects.get(usuario=self.usuario)
+        self.assertEqual(carrito.total, Decimal('75.000'))
+
+    def test_una_consulta_sin_importar_el_tamano(self):
+        self.llenar_carrito(self.crear_productos(1))
+        with self.assertNumQueries(1):
+            self.client.get('/api/ver-carrito/')
+
+        self.llenar_carrito(self.crear_productos(20))
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(len(response.data['productos']), 21)
+
+    def test_lecturas_desde_cache_con_escritura_directa(self):
+        producto, = self.crear_productos(1, precio='10.00')
+        self.llenar_carrito([producto], cantidad=1)
+        self.client.get('/api/ver-carrito/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.data['total'], Decimal('10.000'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/agregar_al_carrito/{producto.id}/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.data['productos'][0]['cantidad'], 2)
+
+        # Un cambio de precio invalida el snapshot
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.precio = Decimal('15.00')
+            producto.save()
+        response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.data['total'], Decimal('30.000'))
+
+    def test_lectura_no_pisa_una_escritura_mas_nueva(self):
+        producto, = self.crear_productos(1)
+        self.llenar_carrito([producto], cantidad=1)
+        viejo = snapshot_desde_bd(self.usuario.id)
+        ProductoEnCarrito.objects.update(cantidad=5)
+        nuevo = snapshot_desde_bd(self.usuario.id)
+
+        # Mientras esta lectura consultaba la base, otra petición cambió el
+        # carrito y escribió su snapshot
+        def lectura_lenta(usuario_id):
+            cache.set(snapshot_key(usuario_id, subir_version_carrito(usuario_id)), nuevo)
+            return viejo
+        with mock.patch('api.carrito.snapshot_desde_bd', side_effect=lectura_lenta):
+            self.client.get('/api/ver-carrito/')
+
+        response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.data['productos'][0]['cantidad'], 5)
+
+    def test_escritura_lenta_no_pisa_una_escritura_mas_nueva(self):
+        producto, = self.crear_productos(1)
+        self.llenar_carrito([producto], cantidad=1)
+        viejo = snapshot_desde_bd(self.usuario.id)
+
+        # La primera escritura leyó la base antes de que se confirmara la
+        # segunda, pero guarda su snapshot después
+        def lectura_lenta(usuario_id):
+            if lectura_lenta.llamadas:
+                return snapshot_desde_bd(usuario_id)
+            lectura_lenta.llamadas += 1
+            ProductoEnCarrito.objects.update(cantidad=5)
+            actualizar_snapshot_carrito(usuario_id)
+            return viejo
+        lectura_lenta.llamadas = 0
+        with mock.patch('api.carrito.snapshot_desde_bd', side_effect=lectura_lenta):
+            actualizar_snapshot_carrito(self.usuario.id)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.data['productos'][0]['cantidad'], 5)
+
+    def test_carrito_vacio_y_carrito_inexistente(self):
+        response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Carrito.objects.create(usuario=self.usuario)
+        response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'productos': [], 'total': 0})
+
+
+class HistorialComprasTests(BaseAPITestCase):
+    def crear_compras(self, cantidad, productos_por_compra=3):
+        productos = self.crear_productos(productos_por_compra)
+        compras = []
+        for _ in range(cantidad):
+            compra = Compra.objects.create(cliente=self.usuario, total=Decimal('30.00'))
+            for producto in productos:
+                compra.productos_comprados.create(
+                    producto=producto, nombre=producto.nombre, precio=producto.precio, cantidad=1
+                )
+            compras.append(compra)
+        return compras
+
+    def test_paginas_con_dos_consultas(self):
+        compras = self.crear_compras(5)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/historial-compras/', {'page_size': 2})
+        self.assertEqual([c['id'] for c in response.data['results']], [compras[4].id, compras[3].id])
+        self.assertEqual(len(response.data['results'][0]['productos']), 3)
+
+        ids = [c['id'] for c in response.data['results']]
+        siguiente = response.data['next']
+        while siguiente:
+            response = self.client.get(siguiente)
+            ids += [c['id'] for c in response.data['results']]
+            siguiente = response.data['next']
+        self.assertEqual(ids, [compra.id for compra in reversed(compras)])
+
+    def test_filtro_por_fechas(self):
+        antigua, reciente = self.crear_compras(2)
+        Compra.objects.filter(pk=antigua.pk).update(fecha='2024-01-15T10:00:00Z')
+
+        response = self.client.get('/api/historial-compras/', {'desde': '2024-01-01', 'hasta': '2024-01-15'})
+        self.assertEqual([c['id'] for c in response.data['results']], [antigua.id])
+
+        response = self.client.get('/api/historial-compras/', {'desde': 'ayer'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sin_compras(self):
+        response = self.client.get('/api/historial-compras/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(RESUMENES_MARGEN_SEGUNDOS=0)
+class ResumenesVentasTests(BaseAPITestCase):
+    def comprar(self, productos, cantidad):
+        self.llenar_carrito(productos, cantidad=cantidad)
+        self.client.post('/api/registrar-compra/')
+
+    def test_actualizacion_incremental(self):
+        productos = self.crear_productos(2, precio='10.00', stock=50)
+        self.comprar(productos, 1)
+        self.assertEqual(actualizar_resumenes(), 1)
+
+        self.comprar(productos, 2)
+        self.comprar(productos[:1], 3)
+        self.assertEqual(actualizar_resumenes(), 2)
+        self.assertEqual(actualizar_resumenes(), 0)
+
+        dia = VentaDiaria.objects.get()
+        self.assertEqual((dia.pedidos, dia.unidades, dia.ingresos), (3, 9, Decimal('90.00')))
+        self.assertEqual(verificar_resumenes(), [])
+
+        reconstruir_resumenes()
+        self.assertEqual(VentaDiaria.objects.get().unidades, 9)
+        self.assertEqual(verificar_resumenes(), [])
+
+    def test_reportes_solo_admin(self):
+        response = self.client.get('/api/analitica/ventas/')
+        self.assertEqual(response.status_code, 403)
+
+        self.usuario.rol = 'admin'
+        self.usuario.save()
+        self.comprar(self.crear_productos(1, stock=10), 2)
+        actualizar_resumenes()
+
+        response = self.client.get('/api/analitica/productos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['unidades'], 2)
+
+
+class ImportarExportarProductosTests(BaseAPITestCase):
+    def importar(self, contenido, extension='csv'):
+        with tempfile.NamedTemporaryFile('w', suffix=f'.{extension}', delete=False, encoding='utf-8') as archivo:
+            archivo.write(contenido)
+        self.addCleanup(os.unlink, archivo.name)
+        salida, errores = StringIO(), StringIO()
+        call_command('importar_productos', archivo.name, '--lote', '2', stdout=salida, stderr=errores)
+        return errores.getvalue()
+
+    def test_upsert_por_slug_y_errores(self):
+        existente, = self.crear_productos(1, precio='5.00')
+        errores = self.importar(
+            'slug,nombre,descripcion,precio,stock,categoria\n'
+            f'{existente.slug},Renombrado,d,7.50,4,hombre\n'
+            'nuevo,Nuevo,d,3,2,hombre\n'
+            'malo,Malo,d,abc,2,hombre\n'
+            'otro,Otro,d,3,2,mujer\n'
+        )
+
+        existente.refresh_from_db()
+        self.assertEqual((existente.nombre, existente.precio, existente.stock), ('Renombrado', Decimal('7.500'), 4))
+        self.assertTrue(Producto.objects.filter(slug='nuevo').exists())
+        self.assertIn('Línea 4', errores)
+        self.assertIn("Categoría desconocida: 'mujer'", errores)
+        self.assertEqual(Producto.objects.count(), 2)
+
+    def test_slug_y_stock_validados_por_fila(self):
+        errores = self.importar(
+            'slug,nombre,descripcion,precio,stock,categoria\n'
+            f'{"a" * 51},Largo,d,3,2,hombre\n'
+            f',{"Nombre muy largo " * 4},d,3,2,hombre\n'
+            'con espacios,Espacios,d,3,2,hombre\n'
+            ',¡¡¡!!!,d,3,2,hombre\n'
+            ',???,d,3,2,hombre\n'
+            'mucho,Mucho,d,3,2147483648,hombre\n'
+            'valido,Válido,d,3,2147483647,hombre\n'
+        )
+
+        for linea in range(2, 8):
+            self.assertIn(f'Línea {linea}:', errores)
+        self.assertNotIn('Línea 8:', errores)
+        self.assertEqual(list(Producto.objects.values_list('slug', flat=True)), ['valido'])
+
+    def test_exportacion_en_streaming(self):
+        self.crear_productos(3)
+        self.usuario.rol = 'admin'
+        self.usuario.save()
+
+        response = self.client.get('/api/catalogo/exportar/', {'formato': 'jsonl'})
+
+        self.assertTrue(response.streaming)
+        lineas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 3)
+
+
+class ListaUsuariosStreamingTests(BaseAPITestCase):
+    def test_lista_transmitida_igual_al_render_completo(self):
+        Usuario.objects.bulk_create([
+            Usuario(email=f'u{i}@example.com', username=f'u{i}', first_name='Ñandú ')
+            for i in range(30)
+        ])
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_staff=True)
+        self.usuario.refresh_from_db()
+
+        response = self.client.get('/api/usuarios/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content)
+        esperado = JSONRenderer().render(
+            RegistroUsuarioSerializer(Usuario.objects.order_by('id'), many=True).data
+        )
+        self.assertEqual(contenido, esperado)
+
+        # La API navegable no se transmite
+        response = self.client.get('/api/usuarios/?format=api')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertIn('text/html', response['Content-Type'])
+
+
+class SerializadoresLecturaTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = APIRequestFactory().get('/api/productos/')
+        productos = self.crear_productos(3, precio='19.995')
+        productos[0].nombre = 'Línea  “especial”'
+        productos[0].imagen = 'productos/foto con espacios.png'
+        productos[0].save()
+        productos[1].imagen = ''
+        productos[1].save()
+
+    def assertMismoJSON(self, serializer_class, lectura_class, queryset):
+        lectura = lectura_class(serializer_class, self.request)
+        rapido = JSONRenderer().render(lectura.filas(queryset.values(*lectura.columnas)))
+        completo = JSONRenderer().render(
+            serializer_class(queryset, many=True, context={'request': self.request}).data
+        )
+        self.assertEqual(rapido, completo)
+
+    def test_productos(self):
+        self.assertMismoJSON(ProductoSerializer, ProductoLectura, Producto.objects.order_by('id'))
+
+    def test_categorias(self):
+        Categoria.objects.create(nombre='accesorio', slug='accesorio')
+        self.assertMismoJSON(CategoriaSerializer, SerializadorLectura, Categoria.objects.order_by('id'))
+
+    def test_usuarios(self):
+        Usuario.objects.create_user(email='admin@example.com', password='x', username='admin', rol='admin')
+        self.assertMismoJSON(RegistroUsuarioSerializer, SerializadorLectura, Usuario.objects.order_by('id'))
+
+    def test_lista_de_productos_de_la_vista(self):
+        response = self.client.get('/api/productos/', {'page_size': 2})
+        siguiente = self.client.get(json.loads(response.content)['next'])
+
+        esperado = Producto.objects.order_by('-fecha_creacion', '-id')
+        for pagina, productos in ((response, esperado[:2]), (siguiente, esperado[2:])):
+            resultados = JSONRenderer().render(json.loads(pagina.content)['results'])
+            self.assertEqual(resultados, JSONRenderer().render(ProductoSerializer(
+                productos, many=True, context={'request': pagina.wsgi_request}
+            ).data))
+
+
+class AutenticacionSinConsultaTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        response = self.client.post('/api/token/', {'email': 'cliente@example.com', 'password': 'secreta123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_ver_carrito_sin_consultar_usuarios(self):
+        self.llenar_carrito(self.crear_productos(2))
+        self.client.get('/api/ver-carrito/')
+
+        # Snapshot en caché + usuario armado desde el token: ninguna consulta
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ver-carrito/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_datos_fuera_del_token_y_permisos(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/usuario_detalle/')
+        self.assertEqual(response.data['email'], 'cliente@example.com')
+
+        # El rol viene en el token: un cliente no puede crear productos
+        response = self.client.post('/api/productos/', {'nombre': 'x'})
+        self.assertEqual(response.status_code, 403)
+
+
+class ListaNegraTokensTests(BaseAPITestCase):
+    def obtener_refresh(self):
+        response = self.client.post('/api/token/', {'email': 'cliente@example.com', 'password': 'secreta123'})
+        return response.data['refresh']
+
+    def rotar(self, refresh):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/token/refresh/', {'refresh': refresh})
+
+    def test_rotacion_y_logout(self):
+        refresh = self.obtener_refresh()
+        response = self.rotar(refresh)
+        self.assertEqual(response.status_code, 200)
+        nuevo = response.data['refresh']
+
+        # El token rotado quedó en la lista negra
+        self.assertEqual(self.rotar(refresh).status_code, 401)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/logout/', {'refresh': nuevo})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rotar(nuevo).status_code, 401)
+
+    def test_refresco_toma_el_rol_actual(self):
+        Usuario.objects.filter(pk=self.usuario.pk).update(rol=Usuario.ADMINISTRADOR, is_staff=True)
+        refresh = self.obtener_refresh()
+        self.assertEqual(RefreshToken(refresh)['rol'], Usuario.ADMINISTRADOR)
+
+        # Degradado: el refresco no arrastra los claims del token viejo
+        Usuario.objects.filter(pk=self.usuario.pk).update(rol=Usuario.CLIENTE, is_staff=False)
+        response = self.rotar(refresh)
+        access = AccessToken(response.data['access'])
+        self.assertEqual(access['rol'], Usuario.CLIENTE)
+        self.assertFalse(access['is_staff'])
+        self.assertEqual(RefreshToken(response.data['refresh'])['rol'], Usuario.CLIENTE)
+
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(cliente.post('/api/productos/', {'nombre': 'x'}).status_code, 403)
+
+    def test_filtro_evita_la_consulta_y_confirma_en_bd(self):
+        cache.set(VERSION_BLACKLIST_KEY, 1, None)
+        refresh = self.obtener_refresh()
+        otro = self.obtener_refresh()
+        with mock.patch.object(lista_negra, 'habilitada', return_value=True):
+            lista_negra.filtro = None
+            self.assertEqual(self.rotar(refresh).status_code, 200)
+
+            descartes = lista_negra.descartes_filtro
+            self.assertEqual(self.rotar(otro).status_code, 200)
+            self.assertEqual(lista_negra.descartes_filtro, descartes + 1)
+
+            # El revocado está en el filtro y la base de datos lo confirma
+            self.assertEqual(self.rotar(refresh).status_code, 401)
+
+    def test_sincroniza_por_id_lo_revocado_en_otros_procesos(self):
+        cache.set(VERSION_BLACKLIST_KEY, 1, None)
+        refresh, otro = self.obtener_refresh(), self.obtener_refresh()
+        with mock.patch.object(lista_negra, 'habilitada', return_value=True):
+            lista_negra.filtro = None
+            self.assertEqual(self.rotar(refresh).status_code, 200)
+            filtro, elementos = lista_negra.filtro, lista_negra.filtro.elementos
+
+            # Otro proceso revoca un token y sube la versión
+            jti = RefreshToken(otro)['jti']
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=jti))
+            cache.incr(VERSION_BLACKLIST_KEY)
+
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertTrue(lista_negra.revocado(jti))
+            self.assertIs(lista_negra.filtro, filtro)
+            self.assertIn('"token_blacklist_blacklistedtoken"."id" >', consultas[0]['sql'])
+            # El token ya visto en el margen no se cuenta dos veces
+            self.assertEqual(filtro.elementos, elementos + 1)
+            self.assertEqual(lista_negra.ultimo_id, BlacklistedToken.objects.latest('id').id)
+
+    def test_purgar_tokens_vencidos(self):
+        self.obtener_refresh()
+        self.rotar(self.obtener_refresh())
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        self.obtener_refresh()
+
+        call_command('purgar_tokens', lote=1, pausa=0, stdout=StringIO())
+
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@mock.patch('api.middleware.replicas', return_value=['replica1'])
+@mock.patch('api.db_routers.replicas', return_value=['replica1'])
+class ReplicaRouterTests(BaseAPITestCase):
+    def base_de_lectura(self, en_transaccion=False):
+        # TestCase envuelve todo en una transacción; aquí se simula el modo autocommit
+        with mock.patch.object(connections['default'], 'in_atomic_block', en_transaccion):
+            return ReplicaRouter().db_for_read(Producto)
+
+    def test_solo_lecturas_marcadas_van_a_la_replica(self, *mocks):
+        self.assertEqual(self.base_de_lectura(), 'default')
+        with lectura_en_replica(self.usuario.id):
+            self.assertEqual(self.base_de_lectura(), 'replica1')
+            self.assertEqual(self.base_de_lectura(en_transaccion=True), 'default')
+            self.assertEqual(ReplicaRouter().db_for_write(Producto), 'default')
+        self.assertEqual(self.base_de_lectura(), 'default')
+
+    def test_escritura_fija_al_usuario_en_el_primario(self, *mocks):
+        producto, = self.crear_productos(1)
+        self.assertFalse(fijado_a_primario(self.usuario.id))
+
+        self.client.post(f'/api/agregar_al_carrito/{producto.id}/')
+
+        self.assertTrue(fijado_a_primario(self.usuario.id))
+        with lectura_en_replica(self.usuario.id):
+            self.assertEqual(self.base_de_lectura(), 'default')
+        with lectura_en_replica(None):
+            self.assertEqual(self.base_de_lectura(), 'replica1')
+
+
+    def test_catalogo_se_llena_desde_el_primario_tras_un_cambio(self, *mocks):
+        with lectura_en_replica(None), lectura_en_primario():
+            self.assertEqual(self.base_de_lectura(), 'default')
+
+        with mock.patch('api.cache.replicas', return_value=['replica1']):
+            self.crear_productos(2)
+        # La réplica puede no tener el cambio: el llenado de la caché lee del primario
+        with mock.patch('api.cache.lectura_en_primario', wraps=lectura_en_primario) as primario:
+            response = self.client.get('/api/productos/')
+            self.assertEqual(response['X-Cache'], 'MISS')
+            self.assertEqual(primario.call_count, 1)
+
+            cache.delete(CAMBIO_RECIENTE_KEY)
+            self.client.get('/api/productos/?page_size=1')
+            self.assertEqual(primario.call_count, 1)
+
+class MetricasTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(METRICS_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        registro.rutas.clear()
+
+    def test_endpoint_prometheus(self):
+        self.crear_productos(2)
+        self.client.get('/api/productos/')
+        self.client.get('/api/productos/')
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+
+        Usuario.objects.filter(pk=self.usuario.pk).update(rol='admin')
+        self.usuario.refresh_from_db()
+        response = self.client.get('/api/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = response.content.decode()
+        self.assertIn('wm_http_request_duration_seconds_count{view="producto-list",method="GET"} 2', texto)
+        self.assertIn('wm_http_responses_total{view="metrics",method="GET",status="403"} 1', texto)
+        self.assertIn('wm_db_queries_total{view="producto-list",method="GET"}', texto)
+        self.assertIn('wm_tokens_blacklisted 0', texto)
+
+    def copiar_como_worker(self, nombre):
+        registro.escribir()
+        with open(registro.archivo()) as archivo, open(os.path.join(settings.METRICS_DIR, nombre), 'w') as copia:
+            copia.write(archivo.read())
+
+    def test_suma_los_archivos_de_otros_workers(self):
+        self.client.get('/api/productos/')
+        # Copia del archivo de este proceso como si fuera otro worker (vivo: pid 1)
+        self.copiar_como_worker('metricas_1_otro.json')
+
+        self.assertEqual(metricas_agregadas()[('producto-list', 'GET')]['count'], 2)
+
+    def test_funde_los_archivos_de_workers_muertos(self):
+        self.client.get('/api/productos/')
+        muerto = os.path.join(settings.METRICS_DIR, 'metricas_99999999_muerto.json')
+        self.copiar_como_worker(os.path.basename(muerto))
+
+        self.assertEqual(metricas_agregadas()[('producto-list', 'GET')]['count'], 2)
+        self.assertFalse(os.path.exists(muerto))
+        # Lo del worker muerto sigue contando desde acumuladas.json
+        self.assertEqual(metricas_agregadas()[('producto-list', 'GET')]['count'], 2)
+
+
+class SemillaTests(BaseAPITestCase):
+    def test_genera_datos_historicos(self):
+        call_command('seed', usuarios=5, productos=20, carritos=3, compras=30, dias=30, semilla=1, stdout=StringIO())
+
+        self.assertEqual(Usuario.objects.filter(username__startswith='seed').count(), 5)
+        self.assertEqual(Producto.objects.filter(slug__startswith='seed').count(), 20)
+        self.assertEqual(Carrito.objects.count(), 3)
+        self.assertEqual(Compra.objects.count(), 30)
+        self.assertTrue(Compra.objects.filter(fecha__lt=timezone.now() - timedelta(days=1)).exists())
+        for compra in Compra.objects.prefetch_related('productos_comprados'):
+            self.assertEqual(compra.total, sum(linea.precio * linea.cantidad for linea in compra.productos_comprados.all()))
+
+        # Los usuarios generados pueden iniciar sesión con la contraseña compartida
+        response = self.client.post('/api/token/', {'email': 'seed0@example.com', 'password': CLAVE_SEMILLA})
+        self.assertEqual(response.status_code, 200)
+
+
+class FacetasCatalogoTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.crear_productos(2, precio='120.00')
+        self.crear_productos(1, precio='480.00', stock=0)
+        self.mujer = Categoria.objects.create(nombre='mujer')
+        Producto.objects.create(nombre='Blusa', descripcion='Azul', precio=Decimal('1250.00'), stock=3, categoria=self.mujer)
+
+    def test_facetas_en_una_consulta_y_cacheadas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/productos/facetas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in consultas if 'api_producto' in q['sql']]), 1)
+
+        datos = json.loads(response.content)
+        self.assertEqual((datos['total'], datos['en_stock']), (4, 3))
+        self.assertEqual(
+            [(c['nombre'], c['productos'], c['en_stock']) for c in datos['categorias']],
+            [('hombre', 3, 2), ('mujer', 1, 1)],
+        )
+        self.assertEqual((datos['precio']['min'], datos['precio']['max']), ('120.000', '1250.000'))
+        self.assertEqual([tramo['productos'] for tramo in datos['precio']['histograma']], [3, 0, 1])
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/api/productos/facetas/')
+        self.assertFalse([q for q in consultas if 'api_producto' in q['sql']])
+
+        # Un cambio en el catálogo invalida las facetas
+        self.crear_productos(1, precio='90.00')
+        datos = json.loads(self.client.get('/api/productos/facetas/').content)
+        self.assertEqual(datos['total'], 5)
+
+    def test_facetas_respetan_filtros(self):
+        datos = json.loads(self.client.get(f'/api/productos/facetas/?categoria={self.mujer.id}&ancho_precio=1000').content)
+        self.assertEqual(datos['total'], 1)
+        self.assertEqual(datos['precio']['histograma'], [{'desde': '1000', 'hasta': '2000', 'productos': 1}])
+
+        self.assertEqual(self.client.get('/api/productos/facetas/?ancho_precio=0').status_code, 400)
+
+    def test_ancho_normalizado_y_tramos_acotados(self):
+        # Un ancho diminuto no genera un tramo por cada centésima del rango
+        datos = json.loads(self.client.get('/api/productos/facetas/?ancho_precio=0.000001').content)
+        histograma = datos['precio']['histograma']
+        self.assertLessEqual(len(histograma), settings.FACETAS_MAX_TRAMOS)
+        self.assertEqual(sum(tramo['productos'] for tramo in histograma), 4)
+        self.assertEqual(Decimal(histograma[0]['hasta']) - Decimal(histograma[0]['desde']), Decimal(datos['precio']['ancho']))
+
+        # Anchos que se redondean igual (300 -> 500) comparten la entrada de la caché
+        datos = json.loads(self.client.get('/api/productos/facetas/?ancho_precio=300').content)
+        self.assertEqual(datos['precio']['ancho'], '500')
+        self.assertEqual(self.client.get('/api/productos/facetas/?ancho_precio=450')['X-Cache'], 'HIT')
+
+
+class FiltrosCatalogoTests(BaseAPITestCase):
+    def test_filtros_y_ordenamiento_paginados(self):
+        for i, (precio, stock) in enumerate([('50.00', 0), ('150.00', 4), ('150.00', 2), ('300.00', 1), ('900.00', 7)]):
+            Producto.objects.create(nombre=f'Prenda {4 - i}', descripcion='x', precio=Decimal(precio), stock=stock, categoria=self.categoria)
+
+        ids = []
+        url = '/api/productos/?min_precio=100&max_precio=500&en_stock=true&ordering=-precio&page_size=2'
+        while url:
+            datos = json.loads(self.client.get(url).content)
+            ids += [producto['id'] for producto in datos['results']]
+            url = datos['next']
+        esperados = list(
+            Producto.objects.filter(precio__gte=100, precio__lte=500, stock__gt=0).order_by('-precio', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, esperados)
+
+        datos = json.loads(self.client.get('/api/productos/?ordering=nombre').content)
+        self.assertEqual([producto['nombre'] for producto in datos['results']][:2], ['Prenda 0', 'Prenda 1'])
+        self.assertEqual(self.client.get('/api/productos/?min_precio=abc').status_code, 400)
+
+
+# Cada combinación de filtros y ordenamiento del catálogo debe resolverse con
+# un índice sobre api_producto, sin recorrer la tabla completa.
+class PlanesConsultaCatalogoTests(BaseAPITestCase):
+    FILTROS = ('', 'en_stock=true', 'min_precio=500&max_precio=1500', 'en_stock=true&min_precio=500', 'categoria={categoria}')
+    ORDENES = ('', 'ordering=precio', 'ordering=-precio', 'ordering=nombre', 'ordering=-fecha_creacion')
+
+    def setUp(self):
+        super().setUp()
+        call_command('seed', usuarios=0, productos=5000, carritos=0, compras=0, semilla=7, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN ' + sql)
+                return [fila[0] for fila in cursor.fetchall()]
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [fila[-1] for fila in cursor.fetchall()]
+
+    def _recorre_tabla(self, plan):
+        if connection.vendor == 'postgresql':
+            return any('Seq Scan on api_producto' in paso for paso in plan)
+        return any(paso.startswith('SCAN api_producto') and 'INDEX' not in paso for paso in plan)
+
+    def test_sin_recorridos_secuenciales(self):
+        categoria = Categoria.objects.get(slug='hombre')
+        for filtro in self.FILTROS:
+            for orden in self.ORDENES:
+                consulta = '&'.join(parte for parte in (filtro.format(categoria=categoria.id), orden) if parte)
+                with self.subTest(consulta=consulta):
+                    with CaptureQueriesContext(connection) as consultas:
+                        response = self.client.get(f'/api/productos/?{consulta}')
+                    self.assertEqual(response.status_code, 200)
+                    # Validadores condicionales y página de resultados
+                    sqls = [q['sql'] for q in consultas if 'FROM "api_producto"' in q['sql']]
+                    self.assertTrue(sqls)
+                    for sql in sqls:
+                        plan = self._plan(sql)
+                        self.assertFalse(self._recorre_tabla(plan), (sql, plan))
+
+
+class MediaPorContenidoTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=self.media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_subidas_iguales_comparten_archivo(self):
+        primero, segundo = self.crear_productos(2)
+        primero.imagen.save('foto.JPG', ContentFile(b'contenido'))
+        segundo.imagen.save('Copia_de_foto.jpg', ContentFile(b'contenido'))
+
+        self.assertEqual(primero.imagen.name, segundo.imagen.name)
+        self.assertRegex(primero.imagen.name, r'^productos/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(ArchivoMedia.objects.get(nombre=primero.imagen.name).referencias, 2)
+
+        response = media_inmutable(APIRequestFactory().get('/media/' + primero.imagen.name), primero.imagen.name)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), b'contenido')
+        # Sin DEBUG Django no sirve MEDIA_ROOT: lo hace el servidor web
+        with self.assertRaises(Resolver404):
+            resolve('/media/' + primero.imagen.name)
+
+        # El archivo solo se borra cuando ningún producto lo usa
+        primero.delete()
+        self.assertEqual(recolectar_huerfanos(gracia=timedelta(0)), 0)
+        segundo.delete()
+        self.assertEqual(recolectar_huerfanos(gracia=timedelta(0)), len(b'contenido'))
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, primero.imagen.name)))
+
+    def test_comando_deduplica_media_existente(self):
+        carpeta = os.path.join(self.media.name, 'productos')
+        os.makedirs(os.path.join(carpeta, 'derivados'))
+        for nombre, contenido in (('a.jpeg', b'igual'), ('Copia_de_a.jpeg', b'igual'), ('b.jpeg', b'distinto')):
+            with open(os.path.join(carpeta, nombre), 'wb') as archivo:
+                archivo.write(contenido)
+        with open(os.path.join(carpeta, 'derivados', 'a_200.webp'), 'wb') as archivo:
+            archivo.write(b'miniatura')
+        copia, original = self.crear_productos(2)
+        Producto.objects.filter(pk=copia.pk).update(imagen='productos/Copia_de_a.jpeg')
+        Producto.objects.filter(pk=original.pk).update(imagen='productos/a.jpeg')
+
+        salida = StringIO()
+        call_command('deduplicar_media', stdout=salida)
+
+        self.assertIn(f"({len(b'igual')} bytes)", salida.getvalue())
+        copia.refresh_from_db()
+        original.refresh_from_db()
+        self.assertEqual(copia.imagen.name, original.imagen.name)
+        self.assertTrue(os.path.exists(os.path.join(self.media.name, original.imagen.name)))
+        self.assertEqual(
+            sorted(n for n in os.listdir(carpeta) if os.path.isfile(os.path.join(carpeta, n))), []
+        )
+        self.assertEqual(ArchivoMedia.objects.get(nombre=original.imagen.name).referencias, 2)
+        self.assertEqual(ArchivoMedia.objects.filter(referencias=0).count(), 1)
+        # El derivado ya generado se conserva con el nombre nuevo
+        self.assertTrue(os.path.exists(os.path.join(self.media.name, ruta_derivado(original.imagen.name, 200, 'webp'))))
+
+
+class BusquedaProductosTests(BaseAPITestCase):
+    def test_busqueda_encuentra_productos_nuevos_y_editados(self):
+        producto, otro = self.crear_productos(2)
+        Producto.objects.filter(pk=otro.pk).update(nombre='Chaqueta impermeable')
+        producto.nombre = 'Camisa de lino'
+        producto.save()
+
+        for termino, esperado in (('lino', producto.id), ('impermeable', otro.id)):
+            datos = json.loads(self.client.get(f'/api/productos/?q={termino}').content)
+            self.assertEqual([fila['id'] for fila in datos['results']], [esperado])
+
+
+class ValidacionCondicionalTests(BaseAPITestCase):
+    def test_listado_responde_304_con_una_consulta(self):
+        producto, _ = self.crear_productos(2)
+        response = self.client.get('/api/productos/')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+
+        # Desde la caché: el ETag guardado con la entrada evita la base de datos
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertFalse([q for q in consultas if 'api_producto' in q['sql']])
+
+        # Sin caché: solo la consulta de validadores, sin serializar
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len([q for q in consultas if 'api_producto' in q['sql']]), 1)
+
+        # Un borrado cambia el conteo aunque no cambie MAX(actualizado)
+        producto.delete()
+        response = self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detalle_y_categorias(self):
+        producto = self.crear_productos(1)[0]
+        response = self.client.get(f'/api/productos/{producto.id}/')
+        ultima = response['Last-Modified']
+        self.assertEqual(
+            self.client.get(f'/api/productos/{producto.id}/', HTTP_IF_MODIFIED_SINCE=ultima).status_code, 304
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.stock = 0
+            producto.save()
+        response = self.client.get(f'/api/productos/{producto.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['stock'], 0)
+
+        response = self.client.get('/api/categorias/')
+        self.assertEqual(self.client.get('/api/categorias/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_compra_actualiza_la_fecha_de_modificacion(self):
+        producto = self.crear_productos(1)[0]
+        antes = producto.actualizado
+        self.llenar_carrito([producto])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/registrar-compra/').status_code, 201)
+        producto.refresh_from_db()
+        self.assertGreater(producto.actualizado, antes)
+
+
+class ColaTareasTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.llamadas = []
+        tarea('prueba')(lambda **datos: self.llamadas.append(datos))
+        self.addCleanup(_registro.pop, 'prueba')
+
+    def test_compra_encola_los_resumenes(self):
+        self.llenar_carrito(self.crear_productos(2, precio='10.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/registrar-compra/')
+        self.llenar_carrito(self.crear_productos(1, precio='5.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/registrar-compra/')
+
+        # Las tareas esperan el margen de actualizar_resumenes
+        self.assertEqual(Tarea.objects.filter(tipo=TAREA_RESUMENES).count(), 2)
+        self.assertEqual(reclamar(), [])
+
+        Tarea.objects.update(disponible_en=timezone.now())
+        with override_settings(RESUMENES_MARGEN_SEGUNDOS=0):
+            # Una sola ejecución cubre todas las compras pendientes
+            self.assertEqual(trabajar(threading.Event(), lote=1, una_vez=True), (1, 0))
+        resumen = VentaDiaria.objects.get()
+        self.assertEqual((resumen.pedidos, resumen.ingresos), (2, Decimal('50.00')))
+        self.assertFalse(Tarea.objects.exclude(estado=Tarea.COMPLETADA).exists())
+
+    def test_reintentos_con_espera_y_fallo_definitivo(self):
+        def falla(**datos):
+            raise RuntimeError('sin conexión')
+        _registro['prueba'] = (falla, False)
+        pendiente = encolar('prueba', max_intentos=2)
+
+        self.assertEqual(trabajar(threading.Event(), una_vez=True), (0, 1))
+        pendiente.refresh_from_db()
+        self.assertEqual((pendiente.estado, pendiente.intentos), (Tarea.PENDIENTE, 1))
+        self.assertGreater(pendiente.disponible_en, timezone.now())
+        self.assertIn('sin conexión', pendiente.error)
+
+        Tarea.objects.update(disponible_en=timezone.now())
+        with self.assertLogs('api.tareas', 'ERROR'):
+            trabajar(threading.Event(), una_vez=True)
+        pendiente.refresh_from_db()
+        self.assertEqual((pendiente.estado, pendiente.intentos), (Tarea.FALLIDA, 2))
+
+    def test_reclamo_vencido_se_retoma(self):
+        encolar('prueba', producto=7)
+        perdida, = reclamar()
+        # El worker que la reclamó murió: nadie más la ve hasta que vence el reclamo
+        self.assertEqual(reclamar(), [])
+        Tarea.objects.update(disponible_en=timezone.now())
+
+        self.assertEqual(trabajar(threading.Event(), una_vez=True), (1, 0))
+        self.assertEqual(self.llamadas, [{'producto': 7}])
+        self.assertEqual(Tarea.objects.get().intentos, 2)
+        with self.assertRaises(ValueError):
+            encolar('desconocida')
+
+    def test_reclamo_vencido_en_el_ultimo_intento_falla(self):
+        perdida = encolar('prueba', max_intentos=1)
+        reclamar()
+        Tarea.objects.update(disponible_en=timezone.now())
+
+        with self.assertLogs('api.tareas', 'ERROR'):
+            self.assertEqual(reclamar(), [])
+        perdida.refresh_from_db()
+        self.assertEqual((perdida.estado, perdida.intentos), (Tarea.FALLIDA, 1))
+        self.assertIn('venció', perdida.error)
+        self.assertEqual(self.llamadas, [])
+
+
+class IdempotenciaTests(BaseAPITestCase):
+    def test_reintento_de_compra_repite_la_respuesta(self):
+        self.llenar_carrito(self.crear_productos(2))
+        with self.captureOnCommitCallbacks(execute=True):
+            primera = self.client.post('/api/registrar-compra/', HTTP_IDEMPOTENCY_KEY='compra-1')
+
+        with CaptureQueriesContext(connection) as consultas:
+            repetida = self.client.post('/api/registrar-compra/', HTTP_IDEMPOTENCY_KEY='compra-1')
+
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual((repetida.status_code, repetida.content), (201, primera.content))
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(Compra.objects.count(), 1)
+        # El reintento no toca el carrito
+        self.assertEqual(len(consultas), 1)
+
+    def test_incrementos_no_se_duplican(self):
+        producto, = self.crear_productos(1)
+        for _ in range(3):
+            self.client.post(f'/api/agregar_al_carrito/{producto.id}/', HTTP_IDEMPOTENCY_KEY='agregar-1')
+        self.assertEqual(ProductoEnCarrito.objects.get().cantidad, 1)
+
+        url = f'/api/actualizar-cantidad-producto/{producto.id}/'
+        self.client.put(url, {'cantidad': 4}, format='json', HTTP_IDEMPOTENCY_KEY='cantidad-1')
+        response = self.client.put(url, {'cantidad': 9}, format='json', HTTP_IDEMPOTENCY_KEY='cantidad-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ProductoEnCarrito.objects.get().cantidad, 4)
+
+        # Sin la cabecera todo sigue igual
+        self.client.post(f'/api/agregar_al_carrito/{producto.id}/')
+        self.assertEqual(ProductoEnCarrito.objects.get().cantidad, 5)
+
+    def test_duplicado_espera_a_la_peticion_en_curso(self):
+        self.llenar_carrito(self.crear_productos(1))
+        en_curso = ClaveIdempotencia.objects.create(
+            usuario=self.usuario, clave='compra-2', expira=timezone.now() + timedelta(hours=1),
+            huella=hashlib.sha256(b'POST /api/registrar-compra/\n').hexdigest(),
+        )
+
+        # Espera corta y con intervalos crecientes; después, 409 sin ocupar el worker
+        with mock.patch('api.idempotencia.time.sleep') as dormir:
+            response = self.client.post('/api/registrar-compra/', HTTP_IDEMPOTENCY_KEY='compra-2')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+        pausas = [llamada.args[0] for llamada in dormir.call_args_list]
+        self.assertAlmostEqual(sum(pausas), settings.IDEMPOTENCIA_ESPERA)
+        self.assertLess(len(pausas), 10)
+        self.assertLess(pausas[0], pausas[1])
+
+        # La original termina mientras el duplicado espera
+        def terminar(segundos):
+            ClaveIdempotencia.objects.filter(pk=en_curso.pk).update(
+                estado=ClaveIdempotencia.COMPLETADA, status=201, cuerpo='{"compra": 7}',
+            )
+        with mock.patch('api.idempotencia.time.sleep', side_effect=terminar):
+            response = self.client.post('/api/registrar-compra/', HTTP_IDEMPOTENCY_KEY='compra-2')
+        self.assertEqual((response.status_code, json.loads(response.content)), (201, {'compra': 7}))
+        self.assertFalse(Compra.objects.exists())
+
+
+class LimitesAutenticacionTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        tasas = mock.patch.dict(VentanaDeslizanteThrottle.THROTTLE_RATES, {
+            'login_ip': '100/min', 'login_email': '2/min', 'registro_ip': '1/min', 'registro_email': '100/min',
+        })
+        tasas.start()
+        self.addCleanup(tasas.stop)
+
+    def login(self, email='cliente@example.com', password='incorrecta', ip='198.51.100.1'):
+        return self.client.post('/api/token/', {'email': email, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_rechazo_antes_del_hash(self):
+        self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+        with mock.patch.object(Usuario, 'check_password') as check_password:
+            # Aunque cambie de IP o de mayúsculas, el correo ya no tiene tokens
+            response = self.login(email=' Cliente@Example.com', ip='198.51.100.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        check_password.assert_not_called()
+
+        datos = {'password': 'otra-clave-123', 'first_name': 'Ana', 'last_name': 'Díaz'}
+        response = self.client.post('/api/registro/', {**datos, 'email': 'nuevo@example.com', 'username': 'nuevo'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/registro/', {**datos, 'email': 'otro@example.com', 'username': 'otro'})
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(Usuario.objects.filter(email='otro@example.com').exists())
+
+    def test_ip_no_se_toma_de_cabeceras_inventadas(self):
+        VentanaDeslizanteThrottle.THROTTLE_RATES.update({'login_ip': '2/min', 'login_email': '100/min'})
+        respuestas = [
+            self.client.post('/api/token/', {'email': f'{i}@example.com'}, REMOTE_ADDR='198.51.100.1', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            for i in range(3)
+        ]
+        self.assertEqual([response.status_code for response in respuestas], [401, 401, 429])
+
+        # Detrás de un proxy de confianza cuenta la IP que este agrega
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            response = self.client.post(
+                '/api/token/', {'email': 'x@example.com'}, REMOTE_ADDR='198.51.100.1', HTTP_X_FORWARDED_FOR='203.0.113.9',
+            )
+        self.assertEqual(response.status_code, 401)
+
+    def test_la_ventana_anterior_pesa_segun_lo_que_falta(self):
+        VentanaDeslizanteThrottle.THROTTLE_RATES.update({'login_ip': '100/min', 'login_email': '4/min'})
+        with mock.patch.object(VentanaDeslizanteThrottle, 'timer', return_value=6000.0):
+            self.assertEqual([self.login().status_code for _ in range(5)], [401] * 4 + [429])
+        # Media ventana después las 4 de la anterior pesan 2: entran 2 más
+        with mock.patch.object(VentanaDeslizanteThrottle, 'timer', return_value=6090.0):
+            respuestas = [self.login() for _ in range(3)]
+        self.assertEqual([response.status_code for response in respuestas], [401, 401, 429])
+        # A los 45 s las de la anterior pesan 1: cabe una más
+        self.assertEqual(respuestas[-1]['Retry-After'], '15')
+
+    @override_settings(HASH_CONCURRENCIA=1)
+    def test_hashes_simultaneos_limitados(self):
+        with ranura_hash():
+            response = self.login(password='secreta123')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+
+        response = self.login(password='secreta123')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,184 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+VERSION_BLACKLIST_KEY = 'tokens:blacklist:version'
+
+# Al sincronizar se leen las filas de la lista negra con id mayor al último
+# visto (rango sobre la llave primaria), menos este margen de ids: cubre
+# transacciones que tomaron su id antes que otras pero se confirmaron después.
+MARGEN_SINCRONIZACION = 1000
+
+
+class FiltroBloom:
+    def __init__(self, capacidad, error):
+        self.capacidad = capacidad
+        self.bits = max(8, int(-capacidad * math.log(error) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacidad * math.log(2)))
+        self.arreglo = bytearray((self.bits + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, valor):
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], 'little')
+        b = int.from_bytes(digest[8:], 'little') | 1
+        return ((a + i * b) % self.bits for i in range(self.hashes))
+
+    def agregar(self, valor):
+        # Un valor que ya está (p. ej. releído en el margen) no se cuenta dos veces
+        if valor in self:
+            return
+        for posicion in self._posiciones(valor):
+            self.arreglo[posicion >> 3] |= 1 << (posicion & 7)
+        self.elementos += 1
+
+    def __contains__(self, valor):
+        return all(self.arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(valor))
+
+
+# LISTA NEGRA #
+
+# Cada proceso mantiene un filtro de Bloom con los jti revocados y vigentes.
+# Si el filtro dice que un jti no está, no está (no se consulta la base de
+# datos); si dice que sí, se confirma con la consulta exacta. Los procesos se
+# enteran de las revocaciones de los demás por una versión en la caché
+# compartida; sin caché compartida (LocMem/Dummy) siempre se consulta la base.
+class _ListaNegra:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filtro = None
+        self.version = None
+        self.ultimo_id = 0
+        self.construido = 0.0
+        self.consultas = 0
+        self.segundos = 0.0
+        self.descartes_filtro = 0
+        self.confirmaciones_bd = 0
+
+    def habilitada(self):
+        return settings.BLACKLIST_FILTRO and not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+    def _reconstruir(self, version):
+        ultimo_id = BlacklistedToken.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+        vigentes = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        capacidad = max(settings.BLACKLIST_FILTRO_CAPACIDAD, vigentes.count() * 2)
+        filtro = FiltroBloom(capacidad, settings.BLACKLIST_FILTRO_ERROR)
+        for jti in vigentes.values_list('token__jti', flat=True).iterator(chunk_size=5000):
+            filtro.agregar(jti)
+        self.filtro, self.version, self.ultimo_id = filtro, version, ultimo_id
+        self.construido = time.monotonic()
+
+    def _sincronizar(self, version):
+        nuevos = (
+            BlacklistedToken.objects.filter(id__gt=self.ultimo_id - MARGEN_SINCRONIZACION)
+            .order_by('id')
+            .values_list('id', 'token__jti')
+        )
+        for id_fila, jti in nuevos:
+            self.filtro.agregar(jti)
+            self.ultimo_id = max(self.ultimo_id, id_fila)
+        self.version = version
+
+    # Devuelve el filtro al día o None si hay que ir a la base de datos
+    def _filtro_actual(self):
+        version = cache.get(VERSION_BLACKLIST_KEY)
+        if version is None:
+            # Sin versión compartida no se sabe qué se revocó en otros procesos
+            cache.add(VERSION_BLACKLIST_KEY, int(time.time() * 1000), None)
+            return None
+        with self.lock:
+            vencido = time.monotonic() - self.construido > settings.BLACKLIST_FILTRO_RECONSTRUIR
+            if self.filtro is None or vencido or self.filtro.elementos > self.filtro.capacidad:
+                self._reconstruir(version)
+            elif version != self.version:
+                self._sincronizar(version)
+            return self.filtro
+
+    def revocado(self, jti):
+        inicio = time.perf_counter()
+        try:
+            filtro = self._filtro_actual() if self.habilitada() else None
+            if filtro is not None and jti not in filtro:
+                self.descartes_filtro += 1
+                return False
+            self.confirmaciones_bd += 1
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+        finally:
+            self.consultas += 1
+            self.segundos += time.perf_counter() - inicio
+
+    def registrar(self, jti):
+        with self.lock:
+            if self.filtro is not None:
+                self.filtro.agregar(jti)
+        if self.habilitada():
+            try:
+                version = cache.incr(VERSION_BLACKLIST_KEY)
+            except ValueError:
+                cache.add(VERSION_BLACKLIST_KEY, int(time.time() * 1000), None)
+                return
+            with self.lock:
+                # Si nadie más revocó tokens entretanto, este proceso sigue al día
+                if self.version is not None and version == self.version + 1:
+                    self.version = version
+
+
+lista_negra = _ListaNegra()
+
+
+# Token de refresco que revisa la lista negra a través del filtro
+class TokenRefresco(RefreshToken):
+    def check_blacklist(self):
+        if lista_negra.revocado(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        resultado = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        # Los demás procesos se enteran cuando la fila ya es visible
+        transaction.on_commit(lambda: lista_negra.registrar(jti))
+        return resultado
+
+
+# MÉTRICAS #
+
+def _filas(modelo):
+    # En PostgreSQL un COUNT(*) sobre tablas grandes es lento: se usa la estimación del planificador
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [modelo._meta.db_table])
+            fila = cursor.fetchone()
+        if fila and fila[0] >= 0:
+            return fila[0]
+    return modelo.objects.count()
+
+
+def estadisticas_blacklist():
+    filtro = lista_negra.filtro
+    consultas = lista_negra.consultas
+    return {
+        'outstanding': _filas(OutstandingToken),
+        'blacklisted': _filas(BlacklistedToken),
+        'filtro_habilitado': lista_negra.habilitada(),
+        'filtro_elementos': filtro.elementos if filtro else 0,
+        'filtro_bytes': len(filtro.arreglo) if filtro else 0,
+        'consultas': consultas,
+        'descartes_filtro': lista_negra.descartes_filtro,
+        'confirmaciones_bd': lista_negra.confirmaciones_bd,
+        'latencia_promedio_ms': round(lista_negra.segundos / consultas * 1000, 4) if consultas else 0.0,
+    }
@@ -5,7 +5,8 @@ from .views import RegistroUsuarioView, ProductoViewSet, LogoutView
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import  TokenRefreshView
 from . import views
-from .views import CustomTokenObtainPairView,historial_compras,registrar_compra,vaciar_carrito, ver_carrito, eliminar_del_carrito , CategoriaListView,EnviarCarritoView, UsuarioViewSet,CategoriaViewSet, UsuarioDetalleView
+from .views import CustomTokenObtainPairView,historial_compras,registrar_compra,vaciar_carrito, ver_carrito, eliminar_del_carrito , CategoriaListView,EnviarCarritoView, UsuarioViewSet,CategoriaViewSet, UsuarioDetalleView, EstadisticasCacheView, EstadisticasTokensView, MetricasView
+from .views import VentasDiariasView, VentasProductosView, VentasCategoriasView, ExportarProductosView
 
 router = DefaultRouter()
 router.register('productos', ProductoViewSet)
@@ -19,6 +20,7 @@ urlpatterns = [
     # Rutas para autenticación JWT
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/blacklist/', EstadisticasTokensView.as_view(), name='token_blacklist'),
 
     # Ruta para registro de usuarios
     path('registro/', RegistroUsuarioView.as_view(), name='registro_usuario'),
@@ -29,11 +31,18 @@ urlpatterns = [
     path('enviar-carrito/', EnviarCarritoView.as_view(), name='enviar_carrito'),
     path('agregar_al_carrito/<int:product_id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
     path('ver-carrito/', views.ver_carrito, name='ver_carrito'),
+    path('carrito/operaciones/', views.actualizar_carrito, name='actualizar_carrito'),
     path('eliminar_del_carrito/<int:product_id>/', eliminar_del_carrito, name='eliminar_del_carrito'),
     path('actualizar-cantidad-producto/<int:product_id>/', views.actualizar_cantidad_producto, name='actualizar_cantidad_producto'),
     path('registrar-compra/', registrar_compra, name='registrar_compra'),
     path('vaciar-carrito/', vaciar_carrito, name='vaciar_carrito'),
     path('historial-compras/', views.historial_compras, name='historial_compras'),
+    path('catalogo/cache/', EstadisticasCacheView.as_view(), name='catalogo_cache'),
+    path('catalogo/exportar/', ExportarProductosView.as_view(), name='catalogo_exportar'),
+    path('metrics', MetricasView.as_view(), name='metrics'),
+    path('analitica/ventas/', VentasDiariasView.as_view(), name='analitica_ventas'),
+    path('analitica/productos/', VentasProductosView.as_view(), name='analitica_productos'),
+    path('analitica/categorias/', VentasCategoriasView.as_view(), name='analitica_categorias'),
 ]
 
 if settings.DEBUG:
@@ -1,7 +1,8 @@
 from rest_framework import viewsets, permissions
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, BasePermission
-from .models import ProductoEnCarrito, Producto,Compra, Carrito, Usuario, Categoria
-from .serializers import ProductoSerializer, CarritoSerializer, RegistroUsuarioSerializer, CategoriaSerializer, CompraSerializer
+from .models import ProductoEnCarrito, Producto,Compra, Carrito, Usuario, Categoria, ProductoComprado
+from .models import VentaDiaria, VentaDiariaProducto, VentaDiariaCategoria
+from .serializers import ProductoSerializer, CarritoSerializer, RegistroUsuarioSerializer, CategoriaSerializer, CompraSerializer, OperacionesCarritoSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -9,13 +10,38 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from urllib.parse import quote
 from django.contrib.auth.decorators import login_required
-from rest_framework.exceptions import NotFound, AuthenticationFailed
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound, AuthenticationFailed, ValidationError
+from rest_framework.decorators import action, api_view, permission_classes
 from django.core.exceptions import ObjectDoesNotExist
 from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from .pagination import OrdenamientoEstable, ProductoCursorPagination, ProductoBusquedaPagination, CompraCursorPagination
+from .search import buscar_productos
+from .compras import registrar_compra_carrito, CarritoVacio, StockInsuficiente
+from .carrito import aplicar_operaciones, snapshot_carrito, programar_actualizacion_snapshot, ProductosNoEncontrados, AGREGAR
+from .cache import CatalogoCacheMixin, CondicionalMixin, estadisticas_cache, etag_para, marcar_validadores, respuesta_no_modificada, validadores_lista
+from .catalogo import FORMATOS, lineas_exportacion
+from .authentication import agregar_claims
+from .db_routers import LecturaReplicaMixin, leer_de_replica
+from .tokens import TokenRefresco, estadisticas_blacklist
+from .metricas import texto_prometheus
+from .renderers import StreamingListMixin
+from .lectura import LecturaListMixin, ProductoLectura, SerializadorLectura
+from .facetas import calcular_facetas, normalizar_ancho
+from .storage import CACHE_INMUTABLE
+from .tareas import estadisticas_tareas
+from .idempotencia import idempotente
+from .limites import LoginEmailThrottle, LoginIPThrottle, RegistroEmailThrottle, RegistroIPThrottle, ranura_hash
+from django.utils.decorators import method_decorator
+from django.views.static import serve
 
 
 Usuario = get_user_model()
@@ -26,19 +52,16 @@ Usuario = get_user_model()
 # Vista para agregar al carrito
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotente
 def agregar_al_carrito(request, product_id):
     try:
         producto = Producto.objects.get(id=product_id)
         
         # Obtener o crear el carrito del usuario
-        carrito, created = Carrito.objects.get_or_create(usuario=request.user)
+        carrito, created = Carrito.objects.get_or_create(usuario_id=request.user.id)
         
-        # Agregar el producto al carrito
-        ProductoEnCarrito.objects.create(
-            carrito=carrito,
-            producto=producto,
-            cantidad=1
-        )
+        # Agregar el producto al carrito (si ya estaba, se incrementa la cantidad)
+        aplicar_operaciones(carrito, [{'accion': AGREGAR, 'producto': producto.id, 'cantidad': 1}])
         
         return Response({"message": "Producto agregado al carrito"}, status=status.HTTP_201_CREATED)
 
@@ -47,40 +70,43 @@ def agregar_al_carrito(request, product_id):
     except Exception as e:
         return Response({"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
+# Vista para aplicar varias operaciones al carrito en una sola petición
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def ver_carrito(request):
+@idempotente
+def actualizar_carrito(request):
+    serializer = OperacionesCarritoSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     try:
-        # Obtener el carrito del usuario
-        carrito = Carrito.objects.get(usuario=request.user)
-        
-        # Obtener todos los productos en el carrito
-        productos_en_carrito = ProductoEnCarrito.objects.filter(carrito=carrito)
+        carrito, created = Carrito.objects.get_or_create(usuario_id=request.user.id)
+        aplicadas = aplicar_operaciones(carrito, serializer.validated_data['operaciones'])
 
-        # Preparar la respuesta
-        productos = []
-        total = 0
-        for producto_en_carrito in productos_en_carrito:
-            total += producto_en_carrito.total_precio()
-            productos.append({
-                'id': producto_en_carrito.producto.id,  # Incluir el id
-                'producto': producto_en_carrito.producto.nombre,
-                'precio': producto_en_carrito.producto.precio,
-                'cantidad': producto_en_carrito.cantidad,
-                'total_precio': producto_en_carrito.total_precio()
-            })
-
-        return Response({'productos': productos, 'total': total})
+        return Response({'message': 'Carrito actualizado', 'productos': aplicadas}, status=status.HTTP_200_OK)
 
-    except Carrito.DoesNotExist:
+    except ProductosNoEncontrados as e:
+        return Response({'message': 'Producto no encontrado', 'productos': e.ids}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ver_carrito(request):
+    # Se sirve desde la caché; las vistas que modifican el carrito la mantienen al día
+    snapshot = snapshot_carrito(request.user.id)
+    if not snapshot['existe']:
         return Response({'error': 'Carrito no encontrado'}, status=404)
 
+    return Response({'productos': snapshot['productos'], 'total': snapshot['total']})
+
 # Vista para actualizar la cantidad de un producto en el carrito
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
+@idempotente
 def actualizar_cantidad_producto(request, product_id):
     try:
-        carrito = Carrito.objects.get(usuario=request.user)
+        carrito = Carrito.objects.get(usuario_id=request.user.id)
         producto_en_carrito = ProductoEnCarrito.objects.get(carrito=carrito, producto__id=product_id)
         
         # Obtener la nueva cantidad desde el cuerpo de la solicitud
@@ -90,6 +116,7 @@ def actualizar_cantidad_producto(request, product_id):
 
         producto_en_carrito.cantidad = cantidad
         producto_en_carrito.save()
+        programar_actualizacion_snapshot(request.user.id)
         
         return Response({'message': 'Cantidad del producto actualizada con éxito'}, status=status.HTTP_200_OK)
 
@@ -106,12 +133,13 @@ def actualizar_cantidad_producto(request, product_id):
 @permission_classes([IsAuthenticated])
 def eliminar_del_carrito(request, product_id):
     try:
-        carrito = Carrito.objects.get(usuario=request.user)
+        carrito = Carrito.objects.get(usuario_id=request.user.id)
         productos_en_carrito = ProductoEnCarrito.objects.filter(carrito=carrito, producto__id=product_id)
 
         if productos_en_carrito.exists():
             # Eliminar todos los productos que coinciden (si es lo que deseas)
             productos_en_carrito.delete()
+            programar_actualizacion_snapshot(request.user.id)
 
         return Response({'message': 'Producto eliminado del carrito'}, status=status.HTTP_200_OK)
 
@@ -124,7 +152,7 @@ def eliminar_del_carrito(request, product_id):
     
 # Vista para obtener los tokens del usuario
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
+    refresh = agregar_claims(RefreshToken.for_user(user), user)
     access = refresh.access_token
     access['id'] = user.id  # Add the user ID to the token
     return str(access), str(refresh)
@@ -133,6 +161,7 @@ def get_tokens_for_user(user):
 class AgregarAlCarritoView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(idempotente)
     def post(self, request, product_id):
         try:
             user = request.user
@@ -142,14 +171,10 @@ class AgregarAlCarritoView(APIView):
                 return Response({'message': 'Producto fuera de stock'}, status=status.HTTP_400_BAD_REQUEST)
 
             # Obtener o crear el carrito del usuario
-            carrito, created = Carrito.objects.get_or_create(usuario=user)
-
-            # Agregar el producto al carrito (creando o actualizando la cantidad)
-            producto_en_carrito, created = ProductoEnCarrito.objects.get_or_create(carrito=carrito, producto=product)
+            carrito, created = Carrito.objects.get_or_create(usuario_id=user.id)
 
-            if not created:
-                producto_en_carrito.cantidad += 1  # Si el producto ya está en el carrito, incrementa la cantidad
-                producto_en_carrito.save()
+            # Agregar el producto al carrito (creando o incrementando la cantidad)
+            aplicar_operaciones(carrito, [{'accion': AGREGAR, 'producto': product.id, 'cantidad': 1}])
 
             return Response({'message': 'Producto agregado al carrito'}, status=status.HTTP_200_OK)
 
@@ -167,18 +192,18 @@ class UsuarioDetalleView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 # Vista para obtener todos los usuarios (solo admin)
-class UsuarioViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Usuario.objects.all()
+class UsuarioViewSet(StreamingListMixin, LecturaListMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Usuario.objects.order_by('id')
     permission_classes = [IsAdminUser]
     serializer_class = RegistroUsuarioSerializer
-
-    def list(self, request, *args, **kwargs):
-        usuarios = self.get_queryset()
-        serializer = self.get_serializer(usuarios, many=True)
-        return Response(serializer.data)
+    # La lista completa se transmite por partes en lugar de armarse en memoria
+    streaming_actions = ('list',)
 
 # Vista personalizada para obtener el token de acceso (JWT)
 class CustomTokenObtainPairView(TokenObtainPairView):
+    # Se rechaza con 429 antes de calcular ningún hash (ver api/limites.py)
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
+
     def post(self, request, *args, **kwargs):
         email = request.data.get('email')
         password = request.data.get('password')
@@ -188,17 +213,15 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         except Usuario.DoesNotExist:
             raise AuthenticationFailed('Correo electrónico no encontrado')
 
-        if not user.check_password(password):
+        with ranura_hash():
+            correcta = user.check_password(password)
+        if not correcta:
             raise AuthenticationFailed('Contraseña incorrecta')
 
-        refresh = RefreshToken.for_user(user)
+        # rol, username e is_staff viajan en el token (ver api/authentication.py)
+        refresh = agregar_claims(RefreshToken.for_user(user), user)
         access_token = refresh.access_token
 
-        refresh['rol'] = user.rol
-        access_token['rol'] = user.rol
-        refresh['username'] = user.username
-        access_token['username'] = user.username
-
         response_data = {
             'access': str(access_token),
             'refresh': str(refresh),
@@ -209,36 +232,207 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         return Response(response_data)
 
 # Vista para obtener y crear categorías
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(CatalogoCacheMixin, CondicionalMixin, LecturaListMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
 
 # Vista para obtener lista de categorías
-class CategoriaListView(APIView):
+class CategoriaListView(CatalogoCacheMixin, LecturaReplicaMixin, APIView):
+    cache_actions = None
+    replica_actions = None
+
     def get(self, request):
-        categorias = Categoria.objects.all()
-        serializer = CategoriaSerializer(categorias, many=True)
-        return Response(serializer.data)
+        ultimo, total = validadores_lista(Categoria.objects.all())
+        etag = etag_para(request, ultimo, total)
+        response = respuesta_no_modificada(request, etag, ultimo)
+        if response is not None:
+            return response
+
+        lectura = SerializadorLectura(CategoriaSerializer, request)
+        return marcar_validadores(Response(lectura.filas(Categoria.objects.values(*lectura.columnas))), etag, ultimo)
 
 # Permiso personalizado para verificar si el usuario es admin
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
-        if request.user and request.user.rol == 'admin':
+        if request.user and getattr(request.user, 'rol', None) == 'admin':
             return True
         return False
 
+# Vista con los contadores de la caché del catálogo (solo admin)
+class EstadisticasCacheView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(estadisticas_cache())
+
+# Estado de la lista negra de tokens (solo admin)
+class EstadisticasTokensView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(estadisticas_blacklist())
+
+# Métricas en formato de texto de Prometheus (solo admin)
+class MetricasView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        cache_catalogo = estadisticas_cache()
+        tokens = estadisticas_blacklist()
+        tareas = estadisticas_tareas()
+        extras = {
+            'wm_catalogo_cache_hits_total': ('counter', 'Aciertos de la caché del catálogo.', cache_catalogo['hits']),
+            'wm_catalogo_cache_misses_total': ('counter', 'Fallos de la caché del catálogo.', cache_catalogo['misses']),
+            'wm_tokens_outstanding': ('gauge', 'Tokens de refresco emitidos guardados.', tokens['outstanding']),
+            'wm_tokens_blacklisted': ('gauge', 'Tokens de refresco en la lista negra.', tokens['blacklisted']),
+            'wm_blacklist_consultas_total': ('counter', 'Consultas a la lista negra (este worker).', tokens['consultas']),
+            'wm_blacklist_latencia_promedio_ms': ('gauge', 'Latencia promedio de la lista negra (este worker).', tokens['latencia_promedio_ms']),
+            'wm_tareas_pendientes': ('gauge', 'Tareas en cola esperando un worker.', tareas['pendiente']),
+            'wm_tareas_en_curso': ('gauge', 'Tareas reclamadas por un worker.', tareas['en_curso']),
+            'wm_tareas_fallidas': ('gauge', 'Tareas que agotaron sus reintentos.', tareas['fallida']),
+        }
+        return HttpResponse(texto_prometheus(extras), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# REPORTES DE VENTAS (solo admin) #
+# Se leen de los resúmenes diarios, nunca de las tablas de compras.
+
+def _rango_resumenes(request, queryset):
+    for parametro, lookup in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+        valor = request.query_params.get(parametro)
+        if valor:
+            try:
+                fecha = parse_date(valor)
+            except ValueError:
+                fecha = None
+            if fecha is None:
+                raise ValidationError({parametro: 'Fecha inválida, use AAAA-MM-DD.'})
+            queryset = queryset.filter(**{lookup: fecha})
+    return queryset
+
+class VentasDiariasView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        ventas = _rango_resumenes(request, VentaDiaria.objects.order_by('fecha'))
+        return Response(list(ventas.values('fecha', 'pedidos', 'unidades', 'ingresos')))
+
+class VentasProductosView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        limite = request.query_params.get('limite', '20')
+        limite = min(int(limite), 200) if limite.isdigit() else 20
+        ventas = (
+            _rango_resumenes(request, VentaDiariaProducto.objects.all())
+            .values('producto_id', 'producto__nombre')
+            .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+            .order_by('-ingresos')[:limite]
+        )
+        return Response([
+            {'producto': v['producto_id'], 'nombre': v['producto__nombre'], 'unidades': v['unidades'], 'ingresos': v['ingresos']}
+            for v in ventas
+        ])
+
+class VentasCategoriasView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        ventas = (
+            _rango_resumenes(request, VentaDiariaCategoria.objects.all())
+            .values('categoria_id', 'categoria__nombre')
+            .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+            .order_by('-ingresos')
+        )
+        return Response([
+            {'categoria': v['categoria_id'], 'nombre': v['categoria__nombre'], 'unidades': v['unidades'], 'ingresos': v['ingresos']}
+            for v in ventas
+        ])
+
+# Vista para descargar el catálogo completo (solo admin); se transmite por partes
+class ExportarProductosView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({'message': 'Formato no soportado'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(lineas_exportacion(formato), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="productos.{formato}"'
+        return response
+
 # Vista para productos (CRUD)
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CatalogoCacheMixin, LecturaReplicaMixin, CondicionalMixin, LecturaListMixin, viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
-    
+    lectura_class = ProductoLectura
+    pagination_class = ProductoCursorPagination
+    cache_actions = ('list', 'retrieve', 'facetas')
+    filter_backends = [OrdenamientoEstable]
+    ordering_fields = ['precio', 'fecha_creacion', 'nombre']
+
     def get_queryset(self):
         queryset = super().get_queryset()
         categoria_id = self.request.query_params.get('categoria', None)
         if categoria_id:
             queryset = queryset.filter(categoria__id=categoria_id)
+
+        # Rango de precio (?min_precio=, ?max_precio=)
+        for parametro, lookup in (('min_precio', 'precio__gte'), ('max_precio', 'precio__lte')):
+            valor = self.request.query_params.get(parametro)
+            if valor:
+                try:
+                    valor = Decimal(valor)
+                except InvalidOperation:
+                    valor = None
+                if valor is None or not valor.is_finite():
+                    raise ValidationError({parametro: 'Debe ser un número.'})
+                queryset = queryset.filter(**{lookup: valor})
+
+        # Solo productos disponibles (?en_stock=true); usa los índices parciales stock > 0
+        if self.request.query_params.get('en_stock', '').lower() in ('1', 'true'):
+            queryset = queryset.filter(stock__gt=0)
+
+        # Búsqueda de texto (?q=) ordenada por relevancia
+        texto = self.request.query_params.get('q', None)
+        if texto:
+            queryset = buscar_productos(queryset, texto).order_by('-relevancia', '-id')
         return queryset
 
+    @property
+    def paginator(self):
+        if self.request.query_params.get('q'):
+            self.pagination_class = ProductoBusquedaPagination
+        return super().paginator
+
+    # Facetas del catálogo con los mismos filtros del listado (?categoria=, ?q=).
+    # Se cachean con la versión del catálogo como el resto de lecturas.
+    @action(detail=False, methods=['get'])
+    def facetas(self, request):
+        ancho = self._ancho_precio(request)
+        if ancho is None:
+            raise ValidationError({'ancho_precio': 'Debe ser un número mayor que cero.'})
+        return Response(calcular_facetas(self.filter_queryset(self.get_queryset()), ancho))
+
+    def _ancho_precio(self, request):
+        try:
+            ancho = Decimal(request.GET.get('ancho_precio', settings.FACETAS_ANCHO_PRECIO))
+        except InvalidOperation:
+            return None
+        if not ancho.is_finite() or ancho <= 0:
+            return None
+        return normalizar_ancho(ancho, Producto)
+
+    # Los anchos que se redondean al mismo valor comparten la entrada de la caché
+    def _parametros_cache(self, request):
+        parametros = super()._parametros_cache(request)
+        es_facetas = self.action_map.get('get') == 'facetas'
+        ancho = self._ancho_precio(request) if es_facetas and 'ancho_precio' in request.GET else None
+        if ancho is None:
+            return parametros
+        return [(nombre, [str(ancho)] if nombre == 'ancho_precio' else valores) for nombre, valores in parametros]
+
     def perform_create(self, serializer):
         categoria_id = self.request.data.get('categoria')
         try:
@@ -255,10 +449,13 @@ class ProductoViewSet(viewsets.ModelViewSet):
 
 # Vista para registrar usuario
 class RegistroUsuarioView(APIView):
+    throttle_classes = [RegistroIPThrottle, RegistroEmailThrottle]
+
     def post(self, request):
         serializer = RegistroUsuarioSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
+            with ranura_hash():
+                user = serializer.save()
             tokens = get_tokens_for_user(user)
             return Response(tokens, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -271,7 +468,7 @@ class LogoutView(APIView):
             if not refresh_token:
                 return Response({"error": "Token de refresco es requerido"}, status=status.HTTP_400_BAD_REQUEST)
             
-            token = RefreshToken(refresh_token)
+            token = TokenRefresco(refresh_token)
             token.blacklist()
 
             return Response({"message": "Logout exitoso"}, status=status.HTTP_200_OK)
@@ -284,7 +481,7 @@ class EnviarCarritoView(APIView):
 
     def get(self, request):
         # Buscar el carrito del usuario autenticado
-        carrito = Carrito.objects.filter(usuario=request.user).first()
+        carrito = Carrito.objects.filter(usuario_id=request.user.id).first()
         if not carrito:
             return JsonResponse({"error": "No tienes productos en tu carrito."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -311,23 +508,23 @@ class EnviarCarritoView(APIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotente
 def registrar_compra(request):
     try:
-        carrito = Carrito.objects.get(usuario=request.user)
-        productos_en_carrito = ProductoEnCarrito.objects.filter(carrito=carrito)
-
-        if not productos_en_carrito.exists():
-            return Response({'message': 'El carrito está vacío'}, status=status.HTTP_400_BAD_REQUEST)
+        carrito = Carrito.objects.get(usuario_id=request.user.id)
+        compra = registrar_compra_carrito(carrito)
 
-        # Aquí podrías registrar la compra en una tabla de pedidos si lo deseas
-
-        # Vaciar el carrito después de la compra
-        productos_en_carrito.delete()
-
-        return Response({'message': 'Compra registrada con éxito'}, status=status.HTTP_201_CREATED)
+        return Response(
+            {'message': 'Compra registrada con éxito', 'compra': compra.id, 'total': compra.total},
+            status=status.HTTP_201_CREATED,
+        )
 
     except Carrito.DoesNotExist:
         return Response({'message': 'Carrito no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    except CarritoVacio:
+        return Response({'message': 'El carrito está vacío'}, status=status.HTTP_400_BAD_REQUEST)
+    except StockInsuficiente as e:
+        return Response({'message': 'Stock insuficiente', 'productos': e.productos}, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         return Response({'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -336,8 +533,9 @@ def registrar_compra(request):
 @permission_classes([IsAuthenticated])
 def vaciar_carrito(request):
     try:
-        carrito = Carrito.objects.get(usuario=request.user)
+        carrito = Carrito.objects.get(usuario_id=request.user.id)
         ProductoEnCarrito.objects.filter(carrito=carrito).delete()
+        programar_actualizacion_snapshot(request.user.id)
 
         return Response({'message': 'Carrito vaciado correctamente'}, status=status.HTTP_200_OK)
 
@@ -348,24 +546,62 @@ def vaciar_carrito(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@leer_de_replica
 def historial_compras(request):
-    try:
-        # Obtener las compras del usuario autenticado
-        compras = Compra.objects.filter(usuario=request.user)
-
-        if not compras.exists():
-            return Response({'message': 'No tienes compras registradas'}, status=status.HTTP_404_NOT_FOUND)
-
-        historial = []
-        for compra in compras:
-            historial.append({
-                'id': compra.id,
-                'fecha': compra.fecha,
-                'total': compra.total,
-                'productos': [producto.nombre for producto in compra.productos.all()],
-            })
-
-        return Response(historial, status=status.HTTP_200_OK)
-    
-    except Exception as e:
-        return Response({'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+    # Filtro opcional por rango de fechas (?desde=AAAA-MM-DD&hasta=AAAA-MM-DD, ambos incluidos)
+    rango = {}
+    for parametro, lookup, dias in (('desde', 'fecha__gte', 0), ('hasta', 'fecha__lt', 1)):
+        valor = request.query_params.get(parametro)
+        if not valor:
+            continue
+        try:
+            fecha = parse_date(valor)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            return Response({'message': f'Fecha inválida en "{parametro}"'}, status=status.HTTP_400_BAD_REQUEST)
+        # Se compara contra el inicio del día para poder usar el índice (cliente, fecha)
+        rango[lookup] = timezone.make_aware(datetime.combine(fecha + timedelta(days=dias), time.min))
+
+    compras = Compra.objects.filter(cliente_id=request.user.id, **rango).prefetch_related(
+        Prefetch(
+            'productos_comprados',
+            queryset=ProductoComprado.objects.only('id', 'compra_id', 'producto_id', 'nombre', 'precio', 'cantidad'),
+        )
+    )
+
+    # Paginado por cursor: una consulta para las compras y otra para sus productos
+    paginator = CompraCursorPagination()
+    pagina = paginator.paginate_queryset(compras, request)
+
+    if not pagina and 'cursor' not in request.query_params:
+        return Response({'message': 'No tienes compras registradas'}, status=status.HTTP_404_NOT_FOUND)
+
+    historial = [
+        {
+            'id': compra.id,
+            'fecha': compra.fecha,
+            'total': compra.total,
+            'productos': [
+                {
+                    'producto': item.producto_id,
+                    'nombre': item.nombre,
+                    'precio': item.precio,
+                    'cantidad': item.cantidad,
+                }
+                for item in compra.productos_comprados.all()
+            ],
+        }
+        for compra in pagina
+    ]
+
+    return paginator.get_paginated_response(historial)
+
+
+# Imágenes guardadas por contenido (ver api/storage.py): la ruta solo acepta
+# nombres con hash, que nunca cambian, así que se cachean sin revalidar. Solo
+# con DEBUG (ver ecommerce/urls.py); en producción las sirve el servidor web.
+def media_inmutable(request, ruta):
+    response = serve(request, ruta, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = CACHE_INMUTABLE
+    return response
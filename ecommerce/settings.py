@@ -13,7 +13,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 from decouple import  config
+from corsheaders.defaults import default_headers
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -57,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -65,6 +68,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.FijarPrimarioMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce.urls'
@@ -102,6 +106,26 @@ DATABASES = {
     }
 }
 
+# Réplicas de lectura: DB_REPLICAS="host1,host2:5433" (mismas credenciales que la principal).
+# En las pruebas apuntan a la base principal.
+for numero, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{numero}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+
+# Segundos que las lecturas de un usuario van al primario después de que modifica algo
+REPLICA_FIJAR_SEGUNDOS = config('REPLICA_FIJAR_SEGUNDOS', default=10, cast=int)
+
+# Métricas: cada worker vuelca las suyas en este directorio (compartido por los workers del servidor)
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'wm_metricas'))
+METRICS_FLUSH_SEGUNDOS = config('METRICS_FLUSH_SEGUNDOS', default=5, cast=int)
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:4200",
     "https://wm-siteweb.vercel.app",
@@ -109,12 +133,37 @@ CORS_ALLOWED_ORIGINS = [
     "https://www.wmsiteweb.xyz",
 ]
 
+# Los reintentos de carrito y compra envían Idempotency-Key (ver api/idempotencia.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 CSRF_TRUSTED_ORIGINS = [
     "https://wmsiteweb.xyz",
     "https://www.wmsiteweb.xyz",
     "https://wm-siteweb.vercel.app",
 ]
 
+# Caché
+# Por defecto en memoria local, solo apta para desarrollo (un proceso). En
+# producción debe ser compartida entre workers (check api.W001):
+# 'django.core.cache.backends.redis.RedisCache' (LOCATION = redis://127.0.0.1:6379/1)
+# o 'django.core.cache.backends.memcached.PyMemcacheCache' (LOCATION = 127.0.0.1:11211).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='wm-tienda'),
+    }
+}
+
+# Segundos que vive una respuesta cacheada del catálogo
+CATALOGO_CACHE_TIMEOUT = config('CATALOGO_CACHE_TIMEOUT', default=600, cast=int)
+
+# Segundos que vive el snapshot del carrito de cada usuario (se reescribe en cada cambio)
+CARRITO_CACHE_TIMEOUT = config('CARRITO_CACHE_TIMEOUT', default=300, cast=int)
+
+# Las compras más recientes que esto (segundos) esperan a la siguiente
+# ejecución de actualizar_resumenes, por si su transacción aún no terminó
+RESUMENES_MARGEN_SEGUNDOS = config('RESUMENES_MARGEN_SEGUNDOS', default=60, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -156,6 +205,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Procesos de manage.py generar_derivados (las subidas nuevas pasan por la cola de tareas)
+IMAGENES_WORKERS = config('IMAGENES_WORKERS', default=2, cast=int)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -166,10 +218,59 @@ AUTH_USER_MODEL = 'api.Usuario'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # El usuario se arma con los claims del token, sin consultar la base de datos
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     ),
+    # Límites de login y registro (api/limites.py): peticiones/periodo
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('LIMITE_LOGIN_IP', default='20/min'),
+        'login_email': config('LIMITE_LOGIN_EMAIL', default='5/min'),
+        'registro_ip': config('LIMITE_REGISTRO_IP', default='5/min'),
+        'registro_email': config('LIMITE_REGISTRO_EMAIL', default='3/min'),
+    },
+    # Proxies de confianza delante de la aplicación (nginx: 1). Con 0 la IP de
+    # los límites es REMOTE_ADDR y X-Forwarded-For, que el cliente puede
+    # inventar, se ignora.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
+# Hashes de contraseña simultáneos (login y registro); el resto recibe 503 con
+# Retry-After. Con una caché compartida el límite es para todos los workers.
+HASH_CONCURRENCIA = config('HASH_CONCURRENCIA', default=2, cast=int)
+HASH_RANURA_TTL = config('HASH_RANURA_TTL', default=10, cast=int)
+HASH_RETRY_AFTER = config('HASH_RETRY_AFTER', default=1, cast=int)
+
+# Caché local de usuarios para los datos que no vienen en el token
+USUARIOS_CACHE_TAMANO = config('USUARIOS_CACHE_TAMANO', default=1024, cast=int)
+USUARIOS_CACHE_TTL = config('USUARIOS_CACHE_TTL', default=60, cast=int)
+
+# Cola de tareas en segundo plano (api/tareas.py, manage.py procesar_tareas)
+TAREAS_MAX_INTENTOS = config('TAREAS_MAX_INTENTOS', default=5, cast=int)
+TAREAS_BACKOFF_BASE = config('TAREAS_BACKOFF_BASE', default=5, cast=int)
+TAREAS_BACKOFF_MAX = config('TAREAS_BACKOFF_MAX', default=3600, cast=int)
+# Segundos que una tarea reclamada queda reservada antes de que otro worker la retome
+TAREAS_VISIBILIDAD = config('TAREAS_VISIBILIDAD', default=300, cast=int)
+TAREAS_CONCURRENCIA = config('TAREAS_CONCURRENCIA', default=2, cast=int)
+TAREAS_CONSERVAR_DIAS = config('TAREAS_CONSERVAR_DIAS', default=7, cast=int)
+
+# Idempotency-Key: segundos que se guarda la primera respuesta, que espera un
+# duplicado a la petición en curso y tras los que una reserva en curso se da por abandonada
+IDEMPOTENCIA_TTL = config('IDEMPOTENCIA_TTL', default=86400, cast=int)
+IDEMPOTENCIA_ESPERA = config('IDEMPOTENCIA_ESPERA', default=0.5, cast=float)
+IDEMPOTENCIA_ABANDONO = config('IDEMPOTENCIA_ABANDONO', default=300, cast=int)
+
+# Paginación del catálogo de productos
+PRODUCTOS_PAGE_SIZE = config('PRODUCTOS_PAGE_SIZE', default=24, cast=int)
+PRODUCTOS_MAX_PAGE_SIZE = config('PRODUCTOS_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Ancho por defecto de los tramos del histograma de precios en /productos/facetas/
+# (se redondea a la serie 1-2-5) y máximo de tramos del histograma
+FACETAS_ANCHO_PRECIO = config('FACETAS_ANCHO_PRECIO', default='500')
+FACETAS_MAX_TRAMOS = config('FACETAS_MAX_TRAMOS', default=100, cast=int)
+
+# Paginación del historial de compras
+HISTORIAL_PAGE_SIZE = config('HISTORIAL_PAGE_SIZE', default=20, cast=int)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -178,4 +279,12 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_BLACKLIST": True,
+    "TOKEN_USER_CLASS": "api.authentication.UsuarioToken",
+    "TOKEN_REFRESH_SERIALIZER": "api.serializers.TokenRefrescoSerializer",
 }
+
+# Filtro de Bloom de la lista negra de tokens (solo con una caché compartida)
+BLACKLIST_FILTRO = config('BLACKLIST_FILTRO', default=True, cast=bool)
+BLACKLIST_FILTRO_CAPACIDAD = config('BLACKLIST_FILTRO_CAPACIDAD', default=100000, cast=int)
+BLACKLIST_FILTRO_ERROR = config('BLACKLIST_FILTRO_ERROR', default=0.001, cast=float)
+BLACKLIST_FILTRO_RECONSTRUIR = config('BLACKLIST_FILTRO_RECONSTRUIR', default=3600, cast=int)
@@ -15,14 +15,26 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api.storage import PATRON_INMUTABLE
+from api.views import media_inmutable
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
 
+# En desarrollo Django sirve los archivos de MEDIA_ROOT; las imágenes con
+# nombre por contenido van con Cache-Control: immutable. En producción las
+# sirve el servidor web con la misma cabecera, p. ej. en nginx:
+#   location ~ "^/media/(.+/)?[0-9a-f]{2}/(derivados/)?[0-9a-f]{64}(_\d+)?\.\w+$" {
+#       root /ruta/al/proyecto;
+#       add_header Cache-Control "public, max-age=31536000, immutable";
+#   }
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<ruta>{PATRON_INMUTABLE})$', media_inmutable, name='media_inmutable'),
+    ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)